@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Per-date attribution table written at capture time.
+
+Each vendor's attribution.py normalizes the payload it just captured into
+MM_DD_YYYY/attribution.csv:
+
+  ip,hostname,protocols,role
+
+  ip         server IP; empty for hostname-only rows (vendors whose IPs only
+             come from the nslookup logs, before those logs are complete)
+  hostname   server name from the payload or the logs, if any
+  protocols  sorted protocol names, comma separated (see protocols.py)
+  role       the IP's role in the payload: entry/exit for multi-hop servers,
+             premium/non_premium for tiered lists, the list the row comes
+             from where one payload restricts another (Bitdefender's
+             allowed/full); empty otherwise
+
+Rows are unique per (ip, hostname, role) and sorted. The ip_to_protocol.py
+scripts read the table instead of re-parsing the raw payloads when it is
+present, so the table must be derived with the same normalizers they use.
+
+For those vendors a table either has no IP rows or holds every logged IP:
+the logged IPs are only added once findServerIP.log ends with the line
+findServerIP.sh prints after the last lookup (see logs_complete()), so a
+table built while the logs are still being written stays hostname-only and
+the readers keep scanning the logs themselves.
+
+Writing tables for existing captures (also run by capture.sh):
+
+  python3 <vendor>/attribution.py <date_dir | vendor_dir> [...]
+
+The date directory's manifest is refreshed when it has one.
+"""
+import csv
+import sys
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from manifest import DATE_DIR_RE, MANIFEST_NAME, CaptureDir, list_capture_dirs, write_manifest
+from protocols import IPKey, format_mask, pack_ip, parse_mask
+from row_writer import RowWriter
+
+ATTRIBUTION_CSV = "attribution.csv"
+HEADER = ("ip", "hostname", "protocols", "role")
+
+# Output of utils/findServerIP.sh in the capture directory, and its last line
+FIND_SERVER_IP_LOG = "findServerIP.log"
+LOGS_COMPLETE_LINE = "All DNS tracking completed."
+
+# (ip, hostname, role)
+RowKey = Tuple[str, str, str]
+
+
+def first_str(obj: Dict[str, Any], *keys: str) -> str:
+    """The first non-empty string value among keys, stripped; '' if none."""
+    for key in keys:
+        value = obj.get(key)
+        if isinstance(value, str) and value.strip():
+            return value.strip()
+    return ""
+
+
+def logs_complete(date_dir: Path) -> bool:
+    """Whether findServerIP.sh finished the nslookup logs of date_dir."""
+    try:
+        with (date_dir / FIND_SERVER_IP_LOG).open("rb") as f:
+            f.seek(0, 2)
+            f.seek(max(0, f.tell() - 4096))
+            tail = f.read().decode("utf-8", "replace")
+    except OSError:
+        return False
+    return LOGS_COMPLETE_LINE in tail
+
+
+class AttributionTable:
+    """(ip, hostname, role) -> protocol mask for one capture."""
+
+    def __init__(self) -> None:
+        self.rows: Dict[RowKey, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def add(self, ip: str, prots: int, hostname: str = "", role: str = "") -> None:
+        """Add one row; protocols of a repeated (ip, hostname, role) are unioned."""
+        key = (ip, hostname, role)
+        self.rows[key] = self.rows.get(key, 0) | prots
+
+    @property
+    def has_ips(self) -> bool:
+        return any(ip for ip, _, _ in self.rows)
+
+    def iter_rows(self) -> Iterator[Tuple[str, str, int, str]]:
+        """(ip, hostname, protocols, role), sorted."""
+        for ip, hostname, role in sorted(self.rows):
+            yield ip, hostname, self.rows[(ip, hostname, role)], role
+
+    def ip_masks(self, role: Optional[str] = None) -> Dict[IPKey, int]:
+        """
+        Packed ip -> protocol mask over the rows with an ip (and the given
+        role), unioned across hostnames and roles. IPs without protocols
+        are left out, as the ip_to_protocol loaders do.
+        """
+        out: Dict[IPKey, int] = {}
+        for (ip, _, row_role), prots in self.rows.items():
+            if not ip or not prots or (role is not None and row_role != role):
+                continue
+            key = pack_ip(ip)
+            out[key] = out.get(key, 0) | prots
+        return out
+
+    def ips(self, role: Optional[str] = None) -> Set[IPKey]:
+        """Packed IPs of the rows with an ip (and the given role), with or without protocols."""
+        return {pack_ip(ip) for ip, _, row_role in self.rows if ip and (role is None or row_role == role)}
+
+    def ip_hosts(self) -> Dict[str, str]:
+        """ip -> hostname over the rows that have both."""
+        return {ip: hostname for ip, hostname, _ in self.rows if ip and hostname}
+
+    def host_masks(self) -> Dict[str, int]:
+        """hostname -> protocol mask over the rows with an ip."""
+        out: Dict[str, int] = {}
+        for (ip, hostname, _), prots in self.rows.items():
+            if ip and hostname:
+                out[hostname] = out.get(hostname, 0) | prots
+        return out
+
+    def write(self, date_dir: Path) -> Path:
+        path = date_dir / ATTRIBUTION_CSV
+        with RowWriter(path, HEADER) as out:
+            for ip, hostname, prots, role in self.iter_rows():
+                out.write((ip, hostname, format_mask(prots), role))
+        return path
+
+    @classmethod
+    def read(cls, path: Path) -> "AttributionTable":
+        table = cls()
+        with path.open("r", encoding="utf-8", newline="") as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            for row in reader:
+                if len(row) < 4:
+                    continue
+                ip, hostname, prots, role = row[:4]
+                table.add(ip, parse_mask(prots), hostname, role)
+        return table
+
+
+def load_attribution(date_dir: Path, cap: Optional[CaptureDir] = None) -> Optional[AttributionTable]:
+    """The capture-time table of a date directory, or None if it has none."""
+    cap = cap or CaptureDir(date_dir)
+    if not cap.exists(ATTRIBUTION_CSV):
+        return None
+    try:
+        return AttributionTable.read(date_dir / ATTRIBUTION_CSV)
+    except (OSError, csv.Error) as e:
+        print(f"WARN: could not read {date_dir / ATTRIBUTION_CSV}: {e}")
+        return None
+
+
+def write_attribution(date_dir: Path, build: Callable[[Path], Optional[AttributionTable]]) -> None:
+    """Write the table build() derives for date_dir; None means there is no payload to attribute."""
+    table = build(date_dir)
+    if table is None:
+        print(f"WARN: no payload to attribute in {date_dir}")
+        return
+    path = table.write(date_dir)
+    if (date_dir / MANIFEST_NAME).exists():
+        write_manifest(date_dir)
+    print(f"Wrote {len(table)} rows to {path}")
+
+
+def attribution_main(build: Callable[[Path], Optional[AttributionTable]], argv: Optional[List[str]] = None) -> None:
+    """CLI shared by the vendor attribution.py scripts."""
+    args = sys.argv[1:] if argv is None else argv
+    if not args:
+        print(f"Usage: python3 {sys.argv[0]} <date_dir | vendor_dir> [...]")
+        sys.exit(1)
+    for arg in args:
+        path = Path(arg)
+        if DATE_DIR_RE.match(path.name):
+            write_attribution(path, build)
+            continue
+        dirs = list_capture_dirs(path)
+        for name in sorted(dirs):
+            write_attribution(dirs[name], build)
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Write attribution.csv for ProtonVPN captures: one entry row and one exit
+row per physical server of servers.json and the tier0/tier2 lists, with the
+server domain as hostname.
+Servers that publish an X25519 public key are marked wireguard; the payload
+lists no other protocols.
+
+Usage: python3 attribution.py <date_dir | vendor_dir> [...]
+"""
+import sys
+from pathlib import Path
+from typing import List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from capture_attribution import AttributionTable, attribution_main, first_str
+from json_stream import iter_items_or_warn
+from parallel_load import file_size, load_files
+from protocols import format_mask, parse_mask, protocol_bit
+
+SERVERS_JSON = "servers.json"
+# per-tier logical server lists, same shape as servers.json; get_servers.py
+# leaves them empty when the tier request failed
+TIER_FILES = ("tier0.json", "tier2.json")
+SERVERS_PATH = "LogicalServers.item.Servers.item"
+
+# (ip, protocol names, domain, role)
+Row = Tuple[str, str, str, str]
+
+
+def load_rows(json_path: Path) -> List[Row]:
+    """One entry and one exit row per physical server of one payload; runs in a worker process."""
+    rows: List[Row] = []
+    if file_size(json_path) == 0:
+        return rows
+    for server in iter_items_or_warn(json_path, SERVERS_PATH):
+        if not isinstance(server, dict):
+            continue
+        domain = first_str(server, "Domain")
+        prots = format_mask(protocol_bit("wireguard") if first_str(server, "X25519PublicKey") else 0)
+        for key, role in (("EntryIP", "entry"), ("ExitIP", "exit")):
+            ip = first_str(server, key)
+            if ip:
+                rows.append((ip, prots, domain, role))
+    return rows
+
+
+def build_table(date_dir: Path) -> AttributionTable:
+    table = AttributionTable()
+    # servers.json and the tier lists are decoded concurrently; repeated
+    # servers collapse into one row
+    for rows in load_files([date_dir / fname for fname in (SERVERS_JSON,) + TIER_FILES], load_rows):
+        for ip, prots, domain, role in rows:
+            table.add(ip, parse_mask(prots), domain, role)
+    return table
+
+
+if __name__ == "__main__":
+    attribution_main(build_table)
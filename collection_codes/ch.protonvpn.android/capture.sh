@@ -18,4 +18,10 @@ script_dir=$(dirname "$0")
 
 python3 "$script_dir/get_servers.py" "$out_dir"
 
-python3 "$script_dir/parse_servers.py" "$out_dir/servers.json" "$out_dir" 
\ No newline at end of file
+python3 "$script_dir/parse_servers.py" "$out_dir/servers.json" "$out_dir" 
+
+# Normalize the payload into attribution.csv
+python3 "$script_dir/attribution.py" "$out_dir"
+
+# List the captured files for the readers
+python3 "$script_dir/../manifest.py" "$out_dir"
\ No newline at end of file
@@ -1,5 +1,8 @@
-import json
 import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from json_stream import iter_items
 
 if len(sys.argv) != 3:
     print("Usage: python script.py <json_file> <out_dir>")
@@ -8,27 +11,11 @@ if len(sys.argv) != 3:
 json_file = sys.argv[1]
 outdir = sys.argv[2]
 
-with open(json_file, "r") as f:
-    data = json.load(f)
-
-entry_ips = []
-exit_ips = []
-domains = []
-
-for log_server in data['LogicalServers']:
-    for server in log_server['Servers']:
-        entry_ips.append(server['EntryIP'])
-        exit_ips.append(server['ExitIP'])
-        domains.append(server['Domain'])
-
-with open(f"{outdir}/entry_ips.txt", "w") as f:
-    for ip in entry_ips:
-        f.write(f"{ip}\n")
-
-with open(f"{outdir}/exit_ips.txt", "w") as f:
-    for ip in exit_ips:
-        f.write(f"{ip}\n")
-        
-with open(f"{outdir}/domains.txt", "w") as f:
-    for domain in domains:
-        f.write(f"{domain}\n")
+# the three lists are written in one pass over LogicalServers[].Servers[]
+with open(f"{outdir}/entry_ips.txt", "w") as entry_f, \
+        open(f"{outdir}/exit_ips.txt", "w") as exit_f, \
+        open(f"{outdir}/domains.txt", "w") as domain_f:
+    for server in iter_items(Path(json_file), "LogicalServers.item.Servers.item"):
+        entry_f.write(f"{server['EntryIP']}\n")
+        exit_f.write(f"{server['ExitIP']}\n")
+        domain_f.write(f"{server['Domain']}\n")
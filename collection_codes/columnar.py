@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Columnar (date, ip) join for the attribution scripts.
+
+The scripts used to walk the input CSV as (date, ip) tuples and do one dict
+lookup per row. Here the CSV is read into two parallel columns, each distinct
+date and IP is converted once, and each date's ip table is stored as a sorted
+key column. A date's rows are then matched in one batched call:
+  - with numpy installed, np.searchsorted over the IPv4 keys,
+  - otherwise a merge join: the query keys are sorted once and the table is
+    walked forward with bisect, so each step only searches what is left.
+
+Keys that pack_ip() leaves as strings are looked up in a small side dict, so
+the result is exactly what the per-row dict lookups returned.
+"""
+import csv
+from array import array
+from bisect import bisect_left
+from pathlib import Path
+from typing import Callable, Dict, Generic, Iterator, List, Optional, Sequence, Tuple, TypeVar
+
+from date_cache import date_to_dirname, dirname_sort_key
+from protocols import IPKey, pack_ip
+
+try:
+    import numpy as np
+except ImportError:  # optional: the stdlib merge join is used instead
+    np = None
+
+V = TypeVar("V")
+
+IPV4_LIMIT = 1 << 32
+
+
+def read_ip_date_columns(csv_path: Path, unique: bool = False,
+                         keep_date: Optional[Callable[[str], bool]] = None) -> Tuple[List[str], List[str]]:
+    """
+    Read an ip,date CSV into (ips, dates) columns, skipping the first line
+    (e.g. ",0") and rows with an empty ip or date. With unique=True repeated
+    (date, ip) pairs are kept only once; keep_date(date_str) can drop rows
+    as they are read (e.g. Partition.wants_date).
+    """
+    ips: List[str] = []
+    dates: List[str] = []
+    seen = set()
+    with csv_path.open("r", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        for row in reader:
+            if not row or len(row) < 2:
+                continue
+            ip = (row[0] or "").strip()
+            date_str = (row[1] or "").strip()
+            if not ip or not date_str:
+                continue
+            if keep_date is not None and not keep_date(date_str):
+                continue
+            if unique:
+                if (date_str, ip) in seen:
+                    continue
+                seen.add((date_str, ip))
+            ips.append(ip)
+            dates.append(date_str)
+    return ips, dates
+
+
+def pack_column(ips: Sequence[str]) -> List[IPKey]:
+    """pack_ip() for a whole column, converting each distinct IP once."""
+    packed: Dict[str, IPKey] = {}
+    out: List[IPKey] = []
+    for ip in ips:
+        key = packed.get(ip)
+        if key is None:
+            key = packed[ip] = pack_ip(ip)
+        out.append(key)
+    return out
+
+
+def group_indices_by_date(dates: Sequence[str]) -> Tuple[Dict[str, array], array]:
+    """
+    Group row indices by date directory name.
+
+    Returns:
+      - by_dir: dir_name -> array of row indices, in chronological order
+      - bad: indices of rows whose date could not be parsed
+
+    Each distinct date string is parsed only once.
+    """
+    dir_names: Dict[str, str] = {}
+    by_dir: Dict[str, array] = {}
+    bad = array("L")
+    for i, date_str in enumerate(dates):
+        dir_name = dir_names.get(date_str)
+        if dir_name is None:
+            try:
+                dir_name = date_to_dirname(date_str)
+            except ValueError:
+                dir_name = ""
+            dir_names[date_str] = dir_name
+        if not dir_name:
+            bad.append(i)
+            continue
+        idx = by_dir.get(dir_name)
+        if idx is None:
+            idx = by_dir[dir_name] = array("L")
+        idx.append(i)
+
+    ordered = {d: by_dir[d] for d in sorted(by_dir, key=dirname_sort_key)}
+    return ordered, bad
+
+
+class SortedTable(Generic[V]):
+    """
+    Read-only ip key -> value table stored as a sorted key column and a
+    parallel value column, with a batched lookup_many().
+    """
+
+    def __init__(self, mapping: Dict[IPKey, V]) -> None:
+        int_keys = sorted(k for k in mapping if isinstance(k, int))
+        self.keys: List[int] = int_keys
+        self.values: List[V] = [mapping[k] for k in int_keys]
+        self.other: Dict[str, V] = {k: v for k, v in mapping.items() if isinstance(k, str)}
+        self._np_keys = None
+        if np is not None and int_keys and int_keys[-1] < IPV4_LIMIT:
+            self._np_keys = np.fromiter(int_keys, dtype=np.uint32, count=len(int_keys))
+
+    def __len__(self) -> int:
+        return len(self.keys) + len(self.other)
+
+    def items(self) -> Iterator[Tuple[IPKey, V]]:
+        yield from zip(self.keys, self.values)
+        yield from self.other.items()
+
+    def get(self, key: IPKey, default: V) -> V:
+        if isinstance(key, str):
+            return self.other.get(key, default)
+        i = bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            return self.values[i]
+        return default
+
+    def lookup_many(self, keys: Sequence[IPKey], default: V) -> List[V]:
+        """Values for every key, in the same order; missing keys get default."""
+        out: List[V] = [default] * len(keys)
+        int_pos: List[int] = []
+        for i, key in enumerate(keys):
+            if isinstance(key, str):
+                if key in self.other:
+                    out[i] = self.other[key]
+            else:
+                int_pos.append(i)
+        if not int_pos or not self.keys:
+            return out
+
+        if self._np_keys is not None:
+            self._lookup_numpy(keys, int_pos, out)
+        else:
+            self._lookup_merge(keys, int_pos, out)
+        return out
+
+    def _lookup_numpy(self, keys: Sequence[IPKey], int_pos: List[int], out: List[V]) -> None:
+        # the table only holds IPv4 keys, so larger (IPv6) queries cannot match
+        pos = [i for i in int_pos if keys[i] < IPV4_LIMIT]
+        if not pos:
+            return
+        query = np.fromiter((keys[i] for i in pos), dtype=np.uint32, count=len(pos))
+        found = np.searchsorted(self._np_keys, query)
+        found[found == len(self._np_keys)] = 0
+        hit = self._np_keys[found] == query
+        values = self.values
+        for j in np.flatnonzero(hit).tolist():
+            out[pos[j]] = values[found[j]]
+
+    def _lookup_merge(self, keys: Sequence[IPKey], int_pos: List[int], out: List[V]) -> None:
+        table_keys = self.keys
+        n = len(table_keys)
+        j = 0
+        for i in sorted(int_pos, key=keys.__getitem__):
+            key = keys[i]
+            j = bisect_left(table_keys, key, j)
+            if j == n:
+                break
+            if table_keys[j] == key:
+                out[i] = self.values[j]
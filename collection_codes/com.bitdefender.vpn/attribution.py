@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Write attribution.csv for Bitdefender VPN captures: one row per server IP of
+servers.json (role "allowed", no protocols) and of servers_full.json (role
+"full", with the protocol names listed there). ip_to_protocol.py keeps the
+two apart: servers.json restricts which IPs get the servers_full.json
+protocols.
+
+Usage: python3 attribution.py <date_dir | vendor_dir> [...]
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from capture_attribution import AttributionTable, attribution_main, first_str
+from ip_to_protocol import (ALLOWED_ROLE, FULL_ROLE, SERVERS_FULL_JSON, SERVERS_JSON, iter_servers,
+                            normalize_protocol_name)
+from protocols import protocol_bit
+
+
+def build_table(date_dir: Path) -> AttributionTable:
+    table = AttributionTable()
+    for fname, role in ((SERVERS_JSON, ALLOWED_ROLE), (SERVERS_FULL_JSON, FULL_ROLE)):
+        for s in iter_servers(date_dir / fname):
+            if not isinstance(s, dict):
+                continue
+            ip = first_str(s, "ip_address")
+            if not ip:
+                continue
+            prots = 0
+            prot_list = s.get("protocols", [])
+            if fname == SERVERS_FULL_JSON and isinstance(prot_list, list):
+                for p in prot_list:
+                    if isinstance(p, dict):
+                        prots |= protocol_bit(normalize_protocol_name(p.get("name")))
+            table.add(ip, prots, first_str(s, "hostname", "name"), role)
+    return table
+
+
+if __name__ == "__main__":
+    attribution_main(build_table)
@@ -1,9 +1,19 @@
 #!/usr/bin/env python3
 import csv
-import json
+import sys
 from pathlib import Path
-from typing import Dict, Set, Tuple, Any, Optional, List
-from datetime import datetime
+from typing import Dict, Set, Tuple, Any, Iterator, Optional, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from date_cache import group_rows_by_date
+from capture_attribution import load_attribution
+from json_stream import iter_items_or_warn
+from manifest import CaptureDir, list_capture_dirs
+from parallel_load import load_files
+from partition import parse_partition_args
+from prefetch import Prefetcher
+from protocols import IPKey, format_mask, mask_names, name_masks, pack_ip, protocol_bit
+from row_writer import RowWriter
 
 BASE_DIR = Path("../../data/com.bitdefender.vpn")
 IN_CSV = Path("com.bitdefender.vpn.csv")
@@ -11,26 +21,17 @@ OUT_CSV = Path("bitdefender_vpn_servers_protocols.csv")
 
 SERVERS_JSON = "servers.json"
 SERVERS_FULL_JSON = "servers_full.json"
+# attribution.csv roles of the servers.json and servers_full.json rows
+ALLOWED_ROLE = "allowed"
+FULL_ROLE = "full"
 
+# Dates loaded in the background while the current one is joined
+PREFETCH_DEPTH = 2
 
-def date_to_dirname(date_str: str) -> str:
-    dt = datetime.strptime(date_str, "%m/%d/%Y")
-    return f"{dt.month:02d}_{dt.day:02d}_{dt.year:04d}"
 
-
-def load_json(path: Path) -> Optional[Dict[str, Any]]:
-    try:
-        with path.open("r", encoding="utf-8") as f:
-            data = json.load(f)
-        return data if isinstance(data, dict) else None
-    except FileNotFoundError:
-        return None
-    except json.JSONDecodeError as e:
-        print(f"WARN: JSON parse error: {path} ({e})")
-        return None
-    except Exception as e:
-        print(f"WARN: error reading {path}: {e}")
-        return None
+def iter_servers(path: Path) -> Iterator[Dict[str, Any]]:
+    """Entries of {"servers": [...]}, one at a time; nothing on errors."""
+    return iter_items_or_warn(path, "servers.item")
 
 
 def normalize_protocol_name(name: Any) -> Optional[str]:
@@ -40,36 +41,20 @@ def normalize_protocol_name(name: Any) -> Optional[str]:
     return s if s else None
 
 
-def load_ip_set_from_servers(servers_path: Path) -> Set[str]:
-    data = load_json(servers_path)
-    if not data:
-        return set()
-
-    servers = data.get("servers", [])
-    if not isinstance(servers, list):
-        return set()
-
-    out: Set[str] = set()
-    for s in servers:
+def load_ip_set_from_servers(servers_path: Path) -> Set[IPKey]:
+    out: Set[IPKey] = set()
+    for s in iter_servers(servers_path):
         if not isinstance(s, dict):
             continue
         ip = s.get("ip_address")
         if isinstance(ip, str) and ip.strip():
-            out.add(ip.strip())
+            out.add(pack_ip(ip.strip()))
     return out
 
 
-def load_ip_to_protocols_from_full(full_path: Path) -> Dict[str, Set[str]]:
-    data = load_json(full_path)
-    if not data:
-        return {}
-
-    servers = data.get("servers", [])
-    if not isinstance(servers, list):
-        return {}
-
-    ip_map: Dict[str, Set[str]] = {}
-    for s in servers:
+def load_ip_to_protocols_from_full(full_path: Path) -> Dict[IPKey, int]:
+    ip_map: Dict[IPKey, int] = {}
+    for s in iter_servers(full_path):
         if not isinstance(s, dict):
             continue
 
@@ -78,46 +63,57 @@ def load_ip_to_protocols_from_full(full_path: Path) -> Dict[str, Set[str]]:
             continue
         ip = ip.strip()
 
-        prots: Set[str] = set()
+        prots = 0
         prot_list = s.get("protocols", [])
         if isinstance(prot_list, list):
             for p in prot_list:
                 if not isinstance(p, dict):
                     continue
-                pname = normalize_protocol_name(p.get("name"))
-                if pname:
-                    prots.add(pname)
+                prots |= protocol_bit(normalize_protocol_name(p.get("name")))
 
         if prots:
-            ip_map.setdefault(ip, set()).update(prots)
+            key = pack_ip(ip)
+            ip_map[key] = ip_map.get(key, 0) | prots
 
     return ip_map
 
 
+def load_payload(path: Path) -> Any:
+    """
+    load_ip_to_protocols_from_full() for servers_full.json, with protocol
+    names instead of masks (see mask_names()), load_ip_set_from_servers()
+    otherwise. Runs in a worker process.
+    """
+    if path.name == SERVERS_FULL_JSON:
+        return mask_names(load_ip_to_protocols_from_full(path))
+    return load_ip_set_from_servers(path)
+
+
 def list_date_dirs(base_dir: Path) -> List[Path]:
     # date dirs look like 11_05_2025
-    return sorted([p for p in base_dir.iterdir() if p.is_dir()])
+    dirs = list_capture_dirs(base_dir)
+    return [dirs[name] for name in sorted(dirs)]
 
 
-def build_global_ip_to_protocols(base_dir: Path) -> Dict[str, Set[str]]:
+def build_global_ip_to_protocols(base_dir: Path) -> Dict[IPKey, int]:
     """
     Scan all date dirs that have servers_full.json and build:
-      ip -> {protocols}
+      packed ip -> protocol mask
     """
-    global_map: Dict[str, Set[str]] = {}
+    global_map: Dict[IPKey, int] = {}
     date_dirs = list_date_dirs(base_dir)
 
     scanned = 0
     for d in date_dirs:
         full_path = d / SERVERS_FULL_JSON
-        if not full_path.exists():
+        if not CaptureDir(d).exists(SERVERS_FULL_JSON):
             continue
         ip_map = load_ip_to_protocols_from_full(full_path)
         if not ip_map:
             continue
 
         for ip, prots in ip_map.items():
-            global_map.setdefault(ip, set()).update(prots)
+            global_map[ip] = global_map.get(ip, 0) | prots
 
         scanned += 1
         if scanned % 25 == 0:
@@ -127,13 +123,38 @@ def build_global_ip_to_protocols(base_dir: Path) -> Dict[str, Set[str]]:
     return global_map
 
 
+def load_date_maps(date_dir: Path) -> Tuple[Set[IPKey], Optional[Dict[IPKey, int]]]:
+    """
+    Parse one date directory into (servers.json ip-set, servers_full.json ip map).
+    The map is None when the date has no servers_full.json. The capture-time
+    attribution.csv is used when present.
+    """
+    cap = CaptureDir(date_dir)
+    table = load_attribution(date_dir, cap)
+    if table is not None:
+        full = table.ip_masks(FULL_ROLE) if cap.exists(SERVERS_FULL_JSON) else None
+        return table.ips(ALLOWED_ROLE), full
+    if not cap.exists(SERVERS_FULL_JSON):
+        return load_ip_set_from_servers(date_dir / SERVERS_JSON), None
+    # both payloads are decoded concurrently
+    allowed, full = load_files([date_dir / SERVERS_JSON, date_dir / SERVERS_FULL_JSON], load_payload)
+    return allowed, name_masks(full)
+
+
 def main() -> None:
+    partition = parse_partition_args(f"Attribute {BASE_DIR.name} server IPs to protocols.")
+    if not partition.wants_vendor(BASE_DIR.name):
+        print(f"Skipping {BASE_DIR.name}: not selected by --vendor")
+        return
+    if partition.has_window:
+        print(f"Partition: {partition.describe()}")
+
     if not BASE_DIR.is_dir():
         raise SystemExit(f"Base dir not found: {BASE_DIR.resolve()}")
     if not IN_CSV.exists():
         raise SystemExit(f"Input CSV not found: {IN_CSV.resolve()}")
 
-    # Read all rows (we keep them to write in original order)
+    # Read all rows (duplicates are kept, one output row per input row)
     rows: List[Tuple[str, str]] = []
     with IN_CSV.open("r", encoding="utf-8", newline="") as fin:
         reader = csv.reader(fin)
@@ -143,15 +164,13 @@ def main() -> None:
                 continue
             ip = (r[0] or "").strip()
             date_str = (r[1] or "").strip()
-            if ip and date_str:
+            if ip and date_str and partition.wants_date(date_str):
                 rows.append((date_str, ip))
 
     print(f"Loaded {len(rows)} rows from {IN_CSV.resolve()}")
 
-    # Per-date cache
-    cache_allowed_ips: Dict[str, Set[str]] = {}
-    cache_ip_to_prots: Dict[str, Dict[str, Set[str]]] = {}
-    cache_has_full: Dict[str, bool] = {}
+    # Group rows by date so each date is parsed once, in chronological order
+    by_dir, bad_date_rows = group_rows_by_date(rows)
 
     bad_date = 0
     missing_dir = 0
@@ -160,68 +179,62 @@ def main() -> None:
     used_fallback = 0
     still_missing_protocols = 0
 
-    # Build fallback index once (only used when a date has no servers_full.json)
+    # Build fallback index once (only used when a date has no servers_full.json).
+    # It spans all dates on purpose, so a --since/--until run fills the same rows as a full run.
     global_ip_to_prots = build_global_ip_to_protocols(BASE_DIR)
 
-    with OUT_CSV.open("w", encoding="utf-8", newline="") as fout:
-        writer = csv.writer(fout)
-        writer.writerow(["date", "ip", "protocols"])
+    # one listing of BASE_DIR instead of an is_dir() probe per date
+    present = list_capture_dirs(BASE_DIR)
+    date_dirs = [present[d] for d in by_dir if d in present]
+    with RowWriter(OUT_CSV, ["date", "ip", "protocols"]) as out, \
+         Prefetcher(date_dirs, load_date_maps, PREFETCH_DEPTH) as prefetcher:
 
-        for i, (date_str, ip) in enumerate(rows, start=1):
-            try:
-                dir_name = date_to_dirname(date_str)
-            except ValueError:
-                bad_date += 1
-                writer.writerow([date_str, ip, ""])
-                continue
+        for date_str, ip in bad_date_rows:
+            bad_date += 1
+            out.write((date_str, ip, ""))
 
+        done = bad_date
+        for dir_name, date_rows in by_dir.items():
             date_dir = BASE_DIR / dir_name
-            if not date_dir.is_dir():
-                missing_dir += 1
-                writer.writerow([date_str, ip, ""])
+            if dir_name not in present:
+                missing_dir += len(date_rows)
+                for date_str, ip in date_rows:
+                    out.write((date_str, ip, ""))
+                done += len(date_rows)
                 continue
 
-            # Load servers.json ip-set once per date
-            if dir_name not in cache_allowed_ips:
-                allowed = load_ip_set_from_servers(date_dir / SERVERS_JSON)
-                cache_allowed_ips[dir_name] = allowed
-                if not allowed:
-                    missing_servers += 1
-
-            # Load servers_full.json mapping once per date (if present)
-            if dir_name not in cache_has_full:
-                full_path = date_dir / SERVERS_FULL_JSON
-                if full_path.exists():
-                    cache_has_full[dir_name] = True
-                    cache_ip_to_prots[dir_name] = load_ip_to_protocols_from_full(full_path)
-                else:
-                    cache_has_full[dir_name] = False
-                    cache_ip_to_prots[dir_name] = {}
-                    missing_full_dates += 1
-
-            # Optional: enforce membership in servers.json
-            allowed_ips = cache_allowed_ips[dir_name]
-            if allowed_ips and ip not in allowed_ips:
-                # if it's not in servers.json, still write blank (your earlier logic)
-                writer.writerow([date_str, ip, ""])
-                continue
+            allowed_ips, ip_to_prots = prefetcher.get(date_dir)
+            if not allowed_ips:
+                missing_servers += 1
+            has_full = ip_to_prots is not None
+            if not has_full:
+                missing_full_dates += 1
+                ip_to_prots = {}
+
+            for date_str, ip in date_rows:
+                key = pack_ip(ip)
+                # Optional: enforce membership in servers.json
+                if allowed_ips and key not in allowed_ips:
+                    # if it's not in servers.json, still write blank (your earlier logic)
+                    out.write((date_str, ip, ""))
+                    continue
 
-            # Try date-local mapping first
-            prots = cache_ip_to_prots[dir_name].get(ip, set())
+                # Try date-local mapping first
+                prots = ip_to_prots.get(key, 0)
 
-            # If date has no servers_full.json, fallback to global index
-            if not prots and not cache_has_full[dir_name]:
-                prots = global_ip_to_prots.get(ip, set())
-                if prots:
-                    used_fallback += 1
+                # If date has no servers_full.json, fallback to global index
+                if not prots and not has_full:
+                    prots = global_ip_to_prots.get(key, 0)
+                    if prots:
+                        used_fallback += 1
 
-            if not prots:
-                still_missing_protocols += 1
+                if not prots:
+                    still_missing_protocols += 1
 
-            writer.writerow([date_str, ip, ",".join(sorted(prots))])
+                out.write((date_str, ip, format_mask(prots)))
 
-            if i % 5000 == 0:
-                print(f"Processed {i}/{len(rows)} rows...")
+            done += len(date_rows)
+            print(f"Processed {done}/{len(rows)} rows ({dir_name})...")
 
     print(f"\nWrote {len(rows)} rows to {OUT_CSV.resolve()}")
     print(f"Bad date rows: {bad_date}")
@@ -1,23 +1,18 @@
-import json
 import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from json_stream import iter_items
 
 def parse_servers(input_file):
-    try:
-        with open(input_file, 'r') as f:
-            data = json.load(f)
-    except FileNotFoundError:
+    """Yield (ip, name) per entry of servers[], streaming large payloads."""
+    path = Path(input_file)
+    if not path.is_file():
         print(f"Error: File '{input_file}' not found.")
         sys.exit(1)
-    
-    servers = data['servers']  
 
-    ips = []    
-    domains = []
-    for server in servers:
-        ips.append(server["ip_address"])
-        domains.append(server["name"])
-    
-    return ips, domains
+    for server in iter_items(path, "servers.item"):
+        yield server["ip_address"], server["name"]
 
 
 if __name__ == "__main__":
@@ -28,12 +23,10 @@ if __name__ == "__main__":
     input_file = sys.argv[1]
     output_file = sys.argv[2]
 
-    ips, domains = parse_servers(input_file)
-
     #with open(output_file, "w") as f:
-    #    for ip, domain in zip(ips,domains):
+    #    for ip, domain in parse_servers(input_file):
     #        f.write(f"{ip},{domain}\n")
 
     with open(output_file, "w") as f:
-        for ip in ips:
+        for ip, _ in parse_servers(input_file):
             f.write(f"{ip}\n")
@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+"""
+Write attribution.csv for Browsec captures: one row per server IP of the
+(double-encoded) server lists in servers.json and servers_ru.json, with the
+server host and role free or premium. Browsec servers are proxies and the
+payload names no protocols, so the protocols column stays empty.
+
+Usage: python3 attribution.py <date_dir | vendor_dir> [...]
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from capture_attribution import AttributionTable, attribution_main
+from remote_config import capture_paths, iter_capture_servers
+
+
+def build_table(date_dir: Path) -> AttributionTable:
+    table = AttributionTable()
+    for _, _, role, host, ips in iter_capture_servers(capture_paths(date_dir)):
+        for ip in ips:
+            if ip.strip():
+                table.add(ip.strip(), 0, host, role)
+    return table
+
+
+if __name__ == "__main__":
+    attribution_main(build_table)
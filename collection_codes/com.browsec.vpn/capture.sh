@@ -17,3 +17,9 @@ mkdir -p $out_dir
 script_dir=$(dirname "$0")
 
 python3 "$script_dir/get_servers.py" "$out_dir"
+
+# Normalize the payload into attribution.csv
+python3 "$script_dir/attribution.py" "$out_dir"
+
+# List the captured files for the readers
+python3 "$script_dir/../manifest.py" "$out_dir"
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Lazy reader for Browsec's Firebase remote-config captures.
+
+servers.json and servers_ru.json (the same request made with a second app
+profile) hold the server lists as JSON strings inside the config:
+
+  {"entries": {"servers": "{\"countries\": {...}}", "servers_RU": "...", ...}}
+
+A RemoteConfig only pulls the raw strings of the entries it is asked for out
+of the payload (one pass, other entries are skipped) and decodes each one on
+first access. Decoded entries are cached by (file sha256, entry), so a config
+that did not change between captures is decoded once per run.
+
+read_regions() goes over both payloads of a capture in one pass and returns,
+per entry ("servers", "servers_RU"), the server IPs and hostnames; the
+payloads are read and decoded concurrently (parallel_load.py).
+"""
+import json
+import sys
+from functools import partial
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from date_cache import LRUCache
+from json_stream import iter_items_multi_or_warn
+from manifest import CaptureDir
+from parallel_load import load_files
+
+SERVER_FILES = ("servers.json", "servers_ru.json")
+# entries holding a JSON-encoded server list, one per region
+LIST_KEYS = ("servers", "servers_RU")
+ROLES = (("servers", "free"), ("premium_servers", "premium"))
+
+# Decoded entries kept resident; captures repeat the same config for days
+DECODE_CACHE_SIZE = 8
+DECODE_CACHE: LRUCache[Any] = LRUCache(DECODE_CACHE_SIZE)
+
+# (region entry, country, role, host, ips)
+ServerRow = Tuple[str, str, str, str, List[str]]
+
+
+def read_raw_entries(path: Path, keys: Sequence[str]) -> Dict[str, str]:
+    """Raw strings of the wanted entries of one payload, read in one pass."""
+    raw: Dict[str, str] = {}
+    paths = [f"entries.{key}" for key in keys]
+    for which, value in iter_items_multi_or_warn(path, paths):
+        if isinstance(value, str):
+            raw[keys[which]] = value
+    return raw
+
+
+def decode_entry(path: Path, key: str, raw: Optional[str]) -> Any:
+    if raw is None:
+        return None
+    try:
+        return json.loads(raw)
+    except json.JSONDecodeError as e:
+        print(f"WARN: could not decode entries.{key} of {path} ({e})")
+        return None
+
+
+def decode_entries(path: Path, keys: Sequence[str]) -> Dict[str, Any]:
+    """Decoded value of every wanted entry of one payload; runs in a worker process."""
+    raw = read_raw_entries(path, keys)
+    return {key: decode_entry(path, key, raw.get(key)) for key in keys}
+
+
+class RemoteConfig:
+    """The list entries of one remote-config payload, decoded on first access."""
+
+    def __init__(self, path: Path, keys: Sequence[str] = LIST_KEYS, cap: Optional[CaptureDir] = None) -> None:
+        self.path = path
+        self.keys = tuple(keys)
+        self.cap = cap or CaptureDir(path.parent)
+        self._digest: Optional[str] = None
+        self._raw: Optional[Dict[str, str]] = None
+        self._decoded: Dict[str, Any] = {}
+
+    @property
+    def digest(self) -> str:
+        if self._digest is None:
+            self._digest = self.cap.sha256(self.path.name)
+        return self._digest
+
+    def _decode(self, key: str) -> Any:
+        if self._raw is None:
+            self._raw = read_raw_entries(self.path, self.keys)
+        return decode_entry(self.path, key, self._raw.get(key))
+
+    def uncached(self) -> bool:
+        """Whether the payload exists and some wanted entry is neither cached nor decoded yet."""
+        if not self.cap.exists(self.path.name):
+            return False
+        return any((self.digest, key) not in DECODE_CACHE and key not in self._decoded for key in self.keys)
+
+    def fill(self, decoded: Dict[str, Any]) -> None:
+        """Take entries decoded elsewhere (decode_entries()), for the ones the cache does not hold."""
+        for key in self.keys:
+            if key in decoded and (self.digest, key) not in DECODE_CACHE:
+                self._decoded[key] = decoded[key]
+
+    def get(self, key: str) -> Any:
+        """Decoded value of entries[key]; None if it is missing or malformed."""
+        if key not in self.keys:
+            raise KeyError(key)
+        if not self.cap.exists(self.path.name):
+            return None
+        if key in self._decoded:
+            return DECODE_CACHE.get((self.digest, key), lambda: self._decoded.pop(key))
+        return DECODE_CACHE.get((self.digest, key), lambda: self._decode(key))
+
+
+def iter_servers(config: Any, first_only: bool = False) -> Iterator[Tuple[str, str, str, List[str]]]:
+    """
+    (country, role, host, ips) per server of a decoded list entry, countries in
+    payload order, free servers before premium ones; the ips are the payload's
+    strings, unstripped. first_only keeps the first server of each
+    (country, role), as the app shows them.
+    """
+    countries = config.get("countries", {}) if isinstance(config, dict) else {}
+    if not isinstance(countries, dict):
+        return
+    for country, servers_by_role in countries.items():
+        if not isinstance(servers_by_role, dict):
+            continue
+        for list_key, role in ROLES:
+            servers = servers_by_role.get(list_key) or []
+            if not isinstance(servers, list):
+                continue
+            for server in servers[:1] if first_only else servers:
+                if not isinstance(server, dict):
+                    continue
+                host = server.get("host")
+                host = host.strip() if isinstance(host, str) else ""
+                ips = server.get("ip", [])
+                ips = [ip for ip in ips if isinstance(ip, str)] if isinstance(ips, list) else []
+                yield country, role, host, ips
+
+
+def iter_capture_servers(paths: Iterable[Path], keys: Sequence[str] = LIST_KEYS,
+                         first_only: bool = False) -> Iterator[ServerRow]:
+    """Servers of every wanted entry of every payload, payload by payload."""
+    paths = list(paths)
+    # one manifest lookup per capture directory, shared by its payloads
+    caps = {parent: CaptureDir(parent) for parent in {path.parent for path in paths}}
+    configs = [RemoteConfig(path, keys, caps[path.parent]) for path in paths]
+    # payloads with entries the cache does not hold are decoded concurrently
+    todo = [config for config in configs if config.uncached()]
+    for config, decoded in zip(todo, load_files([c.path for c in todo], partial(decode_entries, keys=tuple(keys)))):
+        config.fill(decoded)
+    for config in configs:
+        for key in keys:
+            for country, role, host, ips in iter_servers(config.get(key), first_only):
+                yield key, country, role, host, ips
+
+
+class RegionServers:
+    """IPs (in payload order, repeats kept) and hostnames of one list entry."""
+
+    def __init__(self) -> None:
+        self.ips: List[str] = []
+        self.hosts: List[str] = []
+
+    @property
+    def ip_set(self) -> Set[str]:
+        return set(self.ips)
+
+    def add(self, host: str, ips: List[str]) -> None:
+        if host:
+            self.hosts.append(host)
+        self.ips.extend(ips)
+
+
+def read_regions(paths: Iterable[Path], keys: Sequence[str] = LIST_KEYS,
+                 first_only: bool = False) -> Dict[str, RegionServers]:
+    """Per list entry, the servers of all payloads, read in a single pass."""
+    regions = {key: RegionServers() for key in keys}
+    for key, _, _, host, ips in iter_capture_servers(paths, keys, first_only):
+        regions[key].add(host, ips)
+    return regions
+
+
+def capture_paths(date_dir: Path) -> List[Path]:
+    """The remote-config payloads of one capture directory."""
+    return [date_dir / fname for fname in SERVER_FILES]
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Write attribution.csv for PureVPN captures.
+
+Right after the capture only the server names are known, so the table holds
+one hostname row per servers.json dns name. findServerIP.sh runs this again
+once the nslookup logs are complete, which adds one row per logged IP with
+the hostname it resolved from; logged IPs are left out until findServerIP.log
+says the logs are complete.
+
+Usage: python3 attribution.py <date_dir | vendor_dir> [...]
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from capture_attribution import AttributionTable, attribution_main, logs_complete
+from ip_to_protocol import LOG_DIRNAME, SERVERS_JSON, build_dns_index, build_ip_to_host_map_from_logs
+
+
+def build_table(date_dir: Path) -> AttributionTable:
+    table = AttributionTable()
+    dns_index = build_dns_index(date_dir / SERVERS_JSON)
+    for name, (_, prots) in dns_index.items():
+        table.add("", prots, name)
+
+    if not logs_complete(date_dir):
+        return table
+    # globbed from the directory itself: the manifest may predate the logs
+    for ip, host in build_ip_to_host_map_from_logs(date_dir / LOG_DIRNAME).items():
+        table.add(ip, dns_index.mask(host), host)
+    return table
+
+
+if __name__ == "__main__":
+    attribution_main(build_table)
@@ -18,4 +18,10 @@ script_dir=$(dirname "$0")
 
 python3 "$script_dir/get_servers.py" "$out_dir"
 
-nohup bash "$script_dir/../../utils/findServerIP.sh" "$out_dir/server_names.txt" "$out_dir/master_ip_list.txt" > "$out_dir/findServerIP.log" 2>&1 &
\ No newline at end of file
+# Normalize the payload into attribution.csv before logging starts (findServerIP.sh adds the logged IPs)
+python3 "$script_dir/attribution.py" "$out_dir"
+
+nohup bash "$script_dir/../../utils/findServerIP.sh" "$out_dir/server_names.txt" "$out_dir/master_ip_list.txt" "$script_dir/attribution.py" > "$out_dir/findServerIP.log" 2>&1 &
+
+# List the captured files (refreshed by findServerIP.sh once the logs are done)
+python3 "$script_dir/../manifest.py" "$out_dir"
\ No newline at end of file
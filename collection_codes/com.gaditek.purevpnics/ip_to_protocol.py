@@ -1,11 +1,20 @@
 #!/usr/bin/env python3
 import csv
-import json
-import re
+import sys
 from pathlib import Path
-from typing import Dict, Set, Tuple, Any, Optional, List
-from datetime import datetime
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Tuple, Any, Optional, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from capture_attribution import load_attribution
+from date_cache import group_rows_by_date
+from host_index import HostIndex
+from json_stream import iter_items_or_warn
+from logscan import scan_logs_ip_to_host
+from manifest import CaptureDir, list_capture_dirs
+from partition import parse_partition_args
+from prefetch import Prefetcher
+from protocols import format_mask, protocol_bit
+from row_writer import RowWriter
 
 BASE_DIR = Path("../../data/com.gaditek.purevpnics")
 IN_CSV = Path("com.gaditek.purevpnics.csv")
@@ -14,22 +23,8 @@ OUT_CSV = Path("purevpnics_servers_protocols.csv")
 LOG_DIRNAME = "logs"
 SERVERS_JSON = "servers.json"
 
-NSLOOKUP_LINE_RE = re.compile(r"nslookup result for\s+([A-Za-z0-9.-]+)\s*:", re.IGNORECASE)
-IPV4_RE = re.compile(r"\b(\d{1,3}(?:\.\d{1,3}){3})\b")
-
-
-def date_to_dirname(date_str: str) -> str:
-    dt = datetime.strptime(date_str, "%m/%d/%Y")
-    return f"{dt.month:02d}_{dt.day:02d}_{dt.year:04d}"
-
-
-def load_json(path: Path) -> Optional[Dict[str, Any]]:
-    try:
-        with path.open("r", encoding="utf-8") as f:
-            data = json.load(f)
-        return data if isinstance(data, dict) else None
-    except Exception:
-        return None
+# Dates loaded in the background while the current one is joined
+PREFETCH_DEPTH = 2
 
 
 def normalize_protocol_name(p: Any) -> Optional[str]:
@@ -62,43 +57,17 @@ def normalize_protocol_name(p: Any) -> Optional[str]:
 
 
 
-def build_ip_to_host_map_from_logs(log_dir: Path) -> Dict[str, str]:
-    ip_to_host: Dict[str, str] = {}
-    if not log_dir.is_dir():
-        return ip_to_host
-
-    for log_file in sorted(log_dir.glob("*.txt")):
-        current_host: Optional[str] = None
-        try:
-            with log_file.open("r", encoding="utf-8", errors="replace") as f:
-                for line in f:
-                    m = NSLOOKUP_LINE_RE.search(line)
-                    if m:
-                        current_host = m.group(1).strip().lower()
-                        continue
-                    if not current_host:
-                        continue
-                    m_ip = IPV4_RE.search(line)
-                    if m_ip:
-                        ip = m_ip.group(1)
-                        ip_to_host.setdefault(ip, current_host)
-        except Exception:
-            continue
-
-    return ip_to_host
-
-
-def build_dns_name_to_protocols(servers_json: Path) -> Dict[str, Set[str]]:
-    out: Dict[str, Set[str]] = {}
-    data = load_json(servers_json)
-    if not data:
-        return out
+def build_ip_to_host_map_from_logs(log_dir: Path, log_files: Optional[List[Path]] = None) -> Dict[str, str]:
+    return scan_logs_ip_to_host(log_dir, log_files=log_files)
 
-    cities = data.get("cities", [])
-    if not isinstance(cities, list):
-        return out
 
-    for city in cities:
+def build_dns_index(servers_json: Path) -> HostIndex:
+    """
+    Walk cities -> protocols -> dns once and index every dns name:
+      lower-cased dns name -> (first dns record, protocol mask)
+    """
+    out = HostIndex()
+    for city in iter_items_or_warn(servers_json, "cities.item"):
         if not isinstance(city, dict):
             continue
         prot_list = city.get("protocols", [])
@@ -109,8 +78,8 @@ def build_dns_name_to_protocols(servers_json: Path) -> Dict[str, Set[str]]:
             if not isinstance(prot_obj, dict):
                 continue
 
-            pnorm = normalize_protocol_name(prot_obj.get("protocol"))
-            if not pnorm:
+            pbit = protocol_bit(normalize_protocol_name(prot_obj.get("protocol")))
+            if not pbit:
                 continue
 
             dns_list = prot_obj.get("dns", [])
@@ -123,45 +92,40 @@ def build_dns_name_to_protocols(servers_json: Path) -> Dict[str, Set[str]]:
                 name = dns.get("name")
                 if not isinstance(name, str) or not name.strip():
                     continue
-                name = name.strip().lower()
-                out.setdefault(name, set()).add(pnorm)
+                out.add(name, pbit, dns)
 
     return out
 
 
-def process_one_date(dir_name: str, rows: List[Tuple[str, str]]) -> Tuple[str, List[Tuple[str, str, str]]]:
-    out_rows: List[Tuple[str, str, str]] = []
-
-    date_dir = BASE_DIR / dir_name
-    if not date_dir.is_dir():
-        for date_str, ip in rows:
-            out_rows.append((date_str, ip, ""))
-        return dir_name, out_rows
+def load_date_maps(date_dir: Path) -> Tuple[Dict[str, str], HostIndex]:
+    """
+    Parse one date directory into (ip -> hostname, dns name index).
+    A capture-time attribution.csv that already holds the logged IPs answers
+    both maps; one written before the logs were complete is ignored.
+    """
+    cap = CaptureDir(date_dir)
+    table = load_attribution(date_dir, cap)
+    if table is not None and table.has_ips:
+        return table.ip_hosts(), HostIndex.from_masks(table.host_masks())
+    ip_to_host = build_ip_to_host_map_from_logs(date_dir / LOG_DIRNAME, cap.glob(f"{LOG_DIRNAME}/*.txt"))
+    return ip_to_host, build_dns_index(date_dir / SERVERS_JSON)
 
-    ip_to_host = build_ip_to_host_map_from_logs(date_dir / LOG_DIRNAME)
-    dns_map = build_dns_name_to_protocols(date_dir / SERVERS_JSON)
 
+def join_date_rows(rows: List[Tuple[str, str]], ip_to_host: Dict[str, str],
+                   dns_index: HostIndex) -> List[Tuple[str, str, str]]:
+    out_rows: List[Tuple[str, str, str]] = []
     for date_str, ip in rows:
         host = ip_to_host.get(ip)
         if not host:
             out_rows.append((date_str, ip, ""))
             continue
-        prots = dns_map.get(host, set())
-        out_rows.append((date_str, ip, ",".join(sorted(prots))))
-
-    return dir_name, out_rows
+        out_rows.append((date_str, ip, format_mask(dns_index.mask(host))))
+    return out_rows
 
 
-def main() -> None:
-    if not BASE_DIR.is_dir():
-        raise SystemExit(f"Base dir not found: {BASE_DIR.resolve()}")
-    if not IN_CSV.exists():
-        raise SystemExit(f"Input CSV not found: {IN_CSV.resolve()}")
-
-    by_dir: Dict[str, List[Tuple[str, str]]] = {}
-    bad_date_rows: List[Tuple[str, str]] = []
-
-    with IN_CSV.open("r", encoding="utf-8", newline="") as fin:
+def read_rows(csv_path: Path) -> List[Tuple[str, str]]:
+    rows: List[Tuple[str, str]] = []
+    with csv_path.open("r", encoding="utf-8", newline="") as fin:
         reader = csv.reader(fin)
         next(reader, None)
         for row in reader:
@@ -169,34 +133,48 @@ def main() -> None:
                 continue
             ip = (row[0] or "").strip()
             date_str = (row[1] or "").strip()
-            if not ip or not date_str:
-                continue
-            try:
-                dir_name = date_to_dirname(date_str)
-            except ValueError:
-                bad_date_rows.append((date_str, ip))
-                continue
-            by_dir.setdefault(dir_name, []).append((date_str, ip))
+            if ip and date_str:
+                rows.append((date_str, ip))
+    return rows
+
+
+def main() -> None:
+    partition = parse_partition_args(f"Attribute {BASE_DIR.name} server IPs to protocols.")
+    if not partition.wants_vendor(BASE_DIR.name):
+        print(f"Skipping {BASE_DIR.name}: not selected by --vendor")
+        return
+    if partition.has_window:
+        print(f"Partition: {partition.describe()}")
+
+    if not BASE_DIR.is_dir():
+        raise SystemExit(f"Base dir not found: {BASE_DIR.resolve()}")
+    if not IN_CSV.exists():
+        raise SystemExit(f"Input CSV not found: {IN_CSV.resolve()}")
+
+    by_dir, bad_date_rows = group_rows_by_date(partition.filter_rows(read_rows(IN_CSV)))
+    # one listing of BASE_DIR instead of an is_dir() probe per date
+    present = list_capture_dirs(BASE_DIR)
+    date_dirs = [present[d] for d in by_dir if d in present]
 
-    with OUT_CSV.open("w", encoding="utf-8", newline="") as fout:
-        writer = csv.writer(fout)
-        writer.writerow(["date", "ip", "protocols"])
+    with RowWriter(OUT_CSV, ["date", "ip", "protocols"]) as out, \
+         Prefetcher(date_dirs, load_date_maps, PREFETCH_DEPTH) as prefetcher:
 
         for date_str, ip in bad_date_rows:
-            writer.writerow([date_str, ip, ""])
-
-        with ProcessPoolExecutor(max_workers=1) as ex:
-            futures = [ex.submit(process_one_date, d, rows) for d, rows in by_dir.items()]
-            done = 0
-            for fut in as_completed(futures):
-                dir_name, out_rows = fut.result()
-                for date_str, ip, prots in out_rows:
-                    writer.writerow([date_str, ip, prots])
-                done += 1
-                print(f"Done {done}/{len(futures)}: {dir_name} ({len(out_rows)} rows)")
+            out.write((date_str, ip, ""))
+
+        for done, (dir_name, rows) in enumerate(by_dir.items(), start=1):
+            date_dir = BASE_DIR / dir_name
+            if dir_name not in present:
+                out_rows = [(date_str, ip, "") for date_str, ip in rows]
+            else:
+                ip_to_host, dns_index = prefetcher.get(date_dir)
+                out_rows = join_date_rows(rows, ip_to_host, dns_index)
+            for date_str, ip, prots in out_rows:
+                out.write((date_str, ip, prots))
+            print(f"Done {done}/{len(by_dir)}: {dir_name} ({len(out_rows)} rows)")
 
     print(f"\nWrote output to {OUT_CSV.resolve()}")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
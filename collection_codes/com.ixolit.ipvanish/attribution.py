@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+Write attribution.csv for IPVanish captures: one row per servers.json entry
+with its hostname and protocol names.
+
+Usage: python3 attribution.py <date_dir | vendor_dir> [...]
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from capture_attribution import AttributionTable, attribution_main, first_str
+from ip_to_protocol import SERVERS_JSON, load_servers_json, protocols_from_server
+
+
+def build_table(date_dir: Path) -> AttributionTable:
+    table = AttributionTable()
+    for server in load_servers_json(date_dir / SERVERS_JSON):
+        if not isinstance(server, dict):
+            continue
+        ip = server.get("ip_address")
+        if not ip or not isinstance(ip, str):
+            continue
+        table.add(ip, protocols_from_server(server), first_str(server, "hostname"))
+    return table
+
+
+if __name__ == "__main__":
+    attribution_main(build_table)
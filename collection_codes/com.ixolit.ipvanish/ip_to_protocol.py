@@ -1,49 +1,44 @@
 #!/usr/bin/env python3
-import csv
-import json
+import sys
 from pathlib import Path
-from typing import Dict, Set, Tuple, Iterable, Any
-from datetime import datetime
+from typing import Dict, Iterable, Any
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from capture_attribution import load_attribution
+from columnar import SortedTable, group_indices_by_date, pack_column, read_ip_date_columns
+from json_stream import iter_items_or_warn
+from manifest import list_capture_dirs
+from partition import parse_partition_args
+from prefetch import Prefetcher
+from protocols import IPKey, format_mask, pack_ip, protocol_bit
+from row_writer import RowWriter
 
 BASE_DIR = Path("../../data/com.ixolit.ipvanish")
 IN_CSV = Path("com.ixolit.ipvanish.csv")
 OUT_CSV = Path("ipvanish_servers_protocols.csv")
 
+# Dates loaded in the background while the current one is joined
+PREFETCH_DEPTH = 2
+
 SERVERS_JSON = "servers.json"
 
 
 def load_servers_json(json_path: Path) -> Iterable[Dict[str, Any]]:
     """
     Expects JSON like: {"servers": [ { ... }, { ... } ]}
-    Returns the list under "servers" or [] on errors.
+    Yields the entries under "servers" one at a time; nothing on errors.
     """
-    try:
-        with json_path.open("r", encoding="utf-8") as f:
-            data = json.load(f)
-
-        if not isinstance(data, dict):
-            return []
-
-        servers = data.get("servers", [])
-        return servers if isinstance(servers, list) else []
-    except FileNotFoundError:
-        return []
-    except json.JSONDecodeError as e:
-        print(f"WARN: could not parse JSON: {json_path} ({e})")
-        return []
-    except Exception as e:
-        print(f"WARN: error reading {json_path}: {e}")
-        return []
-
-
-def protocols_from_server(server_obj: Dict[str, Any]) -> Set[str]:
+    return iter_items_or_warn(json_path, "servers.item")
+
+
+def protocols_from_server(server_obj: Dict[str, Any]) -> int:
     """
     Extract ONLY protocol names from a server object.
     server_obj["protocols"] is expected to be a list of dicts containing:
       - "name": "openvpn", "wireguard", etc.
-    Returns a set of unique protocol names.
+    Returns the protocol mask of the unique protocol names.
     """
-    prots: Set[str] = set()
+    prots = 0
     plist = server_obj.get("protocols", [])
     if not isinstance(plist, list):
         return prots
@@ -55,19 +50,19 @@ def protocols_from_server(server_obj: Dict[str, Any]) -> Set[str]:
         if isinstance(name, str):
             name = name.strip()
             if name:
-                prots.add(name)
+                prots |= protocol_bit(name)
 
     return prots
 
 
 
 
-def load_ip_to_protocols(json_path: Path) -> Dict[str, Set[str]]:
+def load_ip_to_protocols(json_path: Path) -> Dict[IPKey, int]:
     """
-    Builds ip -> set(protocol_names) for servers.json.
+    Builds packed ip -> protocol mask for servers.json.
     If an IP occurs multiple times, protocol names are unioned.
     """
-    ip_map: Dict[str, Set[str]] = {}
+    ip_map: Dict[IPKey, int] = {}
     for server in load_servers_json(json_path):
         if not isinstance(server, dict):
             continue
@@ -80,99 +75,74 @@ def load_ip_to_protocols(json_path: Path) -> Dict[str, Set[str]]:
         if not prots:
             continue
 
-        ip_map.setdefault(ip, set()).update(prots)
+        key = pack_ip(ip)
+        ip_map[key] = ip_map.get(key, 0) | prots
 
     return ip_map
 
 
-def read_date_ip_pairs(csv_path: Path) -> Set[Tuple[str, str]]:
-    """
-    Reads CSV and returns a set of (date_str, ip) pairs.
-    - Skips first line.
-    - Assumes rows like: ip,date
-    """
-    pairs: Set[Tuple[str, str]] = set()
-    with csv_path.open("r", encoding="utf-8", newline="") as f:
-        reader = csv.reader(f)
-
-        # Skip the first line (e.g., ",0")
-        try:
-            next(reader)
-        except StopIteration:
-            return pairs
-
-        for row in reader:
-            if not row or len(row) < 2:
-                continue
-            ip = (row[0] or "").strip()
-            date_str = (row[1] or "").strip()
-            if ip and date_str:
-                pairs.add((date_str, ip))
-
-    return pairs
-
-
-def date_to_dirname(date_str: str) -> str:
+def load_date_map(date_dir: Path) -> SortedTable[int]:
     """
-    CSV date is assumed to be like 11/05/2025 (MM/DD/YYYY).
-    Directory name is MM_DD_YYYY, e.g., 11_05_2025.
+    Parse servers.json of one date directory into a sorted ip -> protocols table,
+    from the capture-time attribution.csv when there is one.
     """
-    dt = datetime.strptime(date_str, "%m/%d/%Y")
-    return f"{dt.month:02d}_{dt.day:02d}_{dt.year:04d}"
+    table = load_attribution(date_dir)
+    if table is not None:
+        return SortedTable(table.ip_masks())
+    return SortedTable(load_ip_to_protocols(date_dir / SERVERS_JSON))
 
 
 def main() -> None:
+    partition = parse_partition_args(f"Attribute {BASE_DIR.name} server IPs to protocols.")
+    if not partition.wants_vendor(BASE_DIR.name):
+        print(f"Skipping {BASE_DIR.name}: not selected by --vendor")
+        return
+    if partition.has_window:
+        print(f"Partition: {partition.describe()}")
+
     if not BASE_DIR.exists() or not BASE_DIR.is_dir():
         raise SystemExit(f"Base dir not found or not a directory: {BASE_DIR.resolve()}")
 
     if not IN_CSV.exists():
         raise SystemExit(f"Input CSV not found: {IN_CSV.resolve()}")
 
-    date_ip_pairs = read_date_ip_pairs(IN_CSV)
-    print(f"Loaded {len(date_ip_pairs)} unique (date, ip) pairs from {IN_CSV.resolve()}")
+    ips, dates = read_ip_date_columns(IN_CSV, unique=True, keep_date=partition.wants_date)
+    keys = pack_column(ips)
+    print(f"Loaded {len(ips)} unique (date, ip) pairs from {IN_CSV.resolve()}")
 
-    # Cache per directory so multiple IPs for same date don't re-parse JSON
-    cache: Dict[str, Dict[str, Set[str]]] = {}
-
-    results: Dict[Tuple[str, str], Set[str]] = {}
+    # Group by date so each JSON is parsed once
+    by_dir, bad_idx = group_indices_by_date(dates)
 
     missing_dir = 0
     missing_ip = 0
 
-    for (date_str, ip) in sorted(date_ip_pairs, key=lambda x: (x[0], x[1])):
-        try:
-            dir_name = date_to_dirname(date_str)
-        except ValueError:
-            print(f"WARN: could not parse date '{date_str}' (expected MM/DD/YYYY)")
+    # one listing of BASE_DIR instead of an is_dir() probe per date
+    present = list_capture_dirs(BASE_DIR)
+    date_dirs = [present[d] for d in by_dir if d in present]
+    with RowWriter(OUT_CSV, ["date", "ip", "protocols"], sort=True) as out, \
+         Prefetcher(date_dirs, load_date_map, PREFETCH_DEPTH) as prefetcher:
+        for i in bad_idx:
+            print(f"WARN: could not parse date '{dates[i]}' (expected MM/DD/YYYY)")
             missing_dir += 1
-            results[(date_str, ip)] = set()
-            continue
-
-        date_dir = BASE_DIR / dir_name
-        if not date_dir.is_dir():
-            print(f"WARN: directory not found for date '{date_str}': {date_dir.resolve()}")
-            missing_dir += 1
-            results[(date_str, ip)] = set()
-            continue
-
-        if dir_name not in cache:
-            ip_map = load_ip_to_protocols(date_dir / SERVERS_JSON)
-            cache[dir_name] = ip_map
-
-        ip_map = cache[dir_name]
-        prots = ip_map.get(ip, set())
-        if not prots:
-            missing_ip += 1
+            out.write((dates[i], ips[i], ""))
+
+        for dir_name, idx in by_dir.items():
+            date_dir = BASE_DIR / dir_name
+            if dir_name not in present:
+                print(f"WARN: directory not found for {len(idx)} rows: {date_dir.resolve()}")
+                missing_dir += len(idx)
+                for i in idx:
+                    out.write((dates[i], ips[i], ""))
+                continue
 
-        results[(date_str, ip)] = set(prots)
+            ip_map = prefetcher.get(date_dir)
 
-    with OUT_CSV.open("w", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        writer.writerow(["date", "ip", "protocols"])
-        for (date_str, ip), prots in sorted(results.items(), key=lambda x: (x[0][0], x[0][1])):
-            writer.writerow([date_str, ip, ",".join(sorted(prots))])
+            found = ip_map.lookup_many([keys[i] for i in idx], 0)
+            missing_ip += found.count(0)
+            for i, prots in zip(idx, found):
+                out.write((dates[i], ips[i], format_mask(prots)))
 
-    print(f"\nWrote {len(results)} rows to {OUT_CSV.resolve()}")
+    print(f"\nWrote {out.rows_written} rows to {OUT_CSV.resolve()}")
     print(f"Dates with missing directory: {missing_dir}")
     print(f"(date,ip) pairs where IP not found / no protocols: {missing_ip}")
 
@@ -1,28 +1,26 @@
-import json
 import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from json_stream import iter_items
+
+# servers[]
+SERVERS_PATH = "servers.item"
 
 
 def main(input_file, output_file):
     print(input_file,output_file)
 
-    try:
-        with open(input_file,'r') as f:
-            data = json.load(f)
-
-    except FileNotFoundError as e:
-        print(f"File not found: {e}")
+    path = Path(input_file)
+    if not path.is_file():
+        print(f"File not found: {input_file}")
         exit(1)
 
-
-    ips = [] 
-
-    for server in data['servers']:
-        ips.append(server['ip_address'])
-    
+    # IPs are written as they are read (a server without one is a KeyError); large payloads are streamed
     with open(output_file,'w') as f:
-        for ip in ips:
-            f.write(f"{ip}\n")
-    
+        for server in iter_items(path, SERVERS_PATH):
+            f.write(f"{server['ip_address']}\n")
+
     return 0    
 
 if __name__ == "__main__":
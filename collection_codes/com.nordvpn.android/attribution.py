@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Write attribution.csv for NordVPN captures: one row per server IP with the
+server hostname, its normalized technologies and the IP type (entry, ...).
+
+Usage: python3 attribution.py <date_dir | vendor_dir> [...]
+"""
+import sys
+from pathlib import Path
+from typing import Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from capture_attribution import AttributionTable, attribution_main, first_str
+from ip_to_protocol import (extract_server_tech_ids, find_json_file, iter_servers_with_techs,
+                            normalize_tech_identifier)
+
+
+def build_table(date_dir: Path) -> Optional[AttributionTable]:
+    """None when the directory holds no JSON file (ip_to_protocol.py treats that as no capture)."""
+    json_path = find_json_file(date_dir)
+    if not json_path:
+        return None
+    table = AttributionTable()
+    for tech_map, s in iter_servers_with_techs(json_path):
+        hostname = first_str(s, "hostname")
+
+        prot_mask = 0
+        for tid in extract_server_tech_ids(s):
+            ident = tech_map.get(tid)
+            if ident:
+                prot_mask |= normalize_tech_identifier(ident)
+
+        ips = s.get("ips", [])
+        if not isinstance(ips, list):
+            continue
+        for item in ips:
+            if not isinstance(item, dict):
+                continue
+            ip_obj = item.get("ip")
+            if not isinstance(ip_obj, dict):
+                continue
+            ip = first_str(ip_obj, "ip")
+            if ip:
+                table.add(ip, prot_mask, hostname, first_str(item, "type"))
+
+    return table
+
+
+if __name__ == "__main__":
+    attribution_main(build_table)
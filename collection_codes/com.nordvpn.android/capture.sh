@@ -15,4 +15,10 @@ out_dir=$folder/$date
 mkdir -p $out_dir
 
 script_dir=$(dirname "$0")
-python3 "$script_dir/get_servers.py" "$out_dir"
\ No newline at end of file
+python3 "$script_dir/get_servers.py" "$out_dir"
+
+# Normalize the payload into attribution.csv
+python3 "$script_dir/attribution.py" "$out_dir"
+
+# List the captured files for the readers
+python3 "$script_dir/../manifest.py" "$out_dir"
\ No newline at end of file
@@ -1,21 +1,39 @@
 #!/usr/bin/env python3
-import csv
-import json
+import argparse
+import sys
 from pathlib import Path
-from typing import Dict, Set, Tuple, Iterable, Any, Optional
-from datetime import datetime
+from typing import Dict, Set, Tuple, Iterable, Iterator, Any, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from capture_attribution import load_attribution
+from columnar import SortedTable, group_indices_by_date, pack_column, read_ip_date_columns
+from interval_index import dirname_to_ordinal, load_or_build_index
+from json_stream import iter_items_multi_or_warn
+from manifest import MANIFEST_NAME, CaptureDir, list_capture_dirs
+from partition import add_partition_args, partition_from_args
+from prefetch import Prefetcher
+from protocols import IPKey, format_mask, pack_ip, protocol_bit
+from row_writer import RowWriter
 
 BASE_DIR = Path("../../data/com.nordvpn.android")
 IN_CSV = Path("com.nordvpn.android.csv")
 OUT_CSV = Path("nordvpn_servers_protocols.csv")
 
+# Dates loaded in the background while the current one is joined
+PREFETCH_DEPTH = 2
+# With --index, rows whose date has no capture are filled from a capture at
+# most this many days away (0 = leave them empty); --gap-tolerance
+GAP_TOLERANCE_DAYS = 0
+INDEX_JSON = Path("nordvpn_interval_index.json")
 
-def find_json_file(date_dir: Path) -> Optional[Path]:
+
+def find_json_file(date_dir: Path, cap: Optional[CaptureDir] = None) -> Optional[Path]:
     """
     NordVPN date directory contains one JSON file.
     If multiple exist, prefer servers.json, else pick the largest file.
     """
-    candidates = sorted(date_dir.glob("*.json"))
+    cap = cap or CaptureDir(date_dir)
+    candidates = [p for p in cap.glob("*.json") if p.name != MANIFEST_NAME]
     if not candidates:
         return None
 
@@ -23,29 +41,15 @@ def find_json_file(date_dir: Path) -> Optional[Path]:
         if p.name.lower() == "servers.json":
             return p
 
-    # If multiple, choose the largest (usually the main payload)
-    candidates.sort(key=lambda p: p.stat().st_size, reverse=True)
+    # If multiple, choose the largest (usually the main payload); sizes come from the manifest
+    candidates.sort(key=lambda p: cap.size(p.name), reverse=True)
     return candidates[0]
 
 
-def load_json(json_path: Path) -> Dict[str, Any]:
-    try:
-        with json_path.open("r", encoding="utf-8") as f:
-            data = json.load(f)
-        return data if isinstance(data, dict) else {}
-    except FileNotFoundError:
-        return {}
-    except json.JSONDecodeError as e:
-        print(f"WARN: could not parse JSON: {json_path} ({e})")
-        return {}
-    except Exception as e:
-        print(f"WARN: error reading {json_path}: {e}")
-        return {}
-
-
-def normalize_tech_identifier(identifier: str) -> Optional[str]:
+def normalize_tech_identifier(identifier: str) -> int:
     """
-    Convert NordVPN 'technologies[].identifier' values into base protocol names.
+    Convert NordVPN 'technologies[].identifier' values into base protocol codes
+    (bits from protocols.py, named after the base protocol).
 
     Examples:
       openvpn_udp -> openvpn
@@ -57,31 +61,31 @@ def normalize_tech_identifier(identifier: str) -> Optional[str]:
       socks -> socks
       nordwhisper -> nordwhisper
 
-    Return None to drop unknown identifiers if you want strict output.
+    Return 0 to drop unknown identifiers if you want strict output.
     """
     if not isinstance(identifier, str):
-        return None
+        return 0
     ident = identifier.strip().lower()
     if not ident:
-        return None
+        return 0
 
     if ident.startswith("openvpn"):
-        return "openvpn"
+        return protocol_bit("openvpn")
     if ident.startswith("wireguard"):
-        return "wireguard"
+        return protocol_bit("wireguard")
     if ident.startswith("ikev2"):
-        return "ikev2"
+        return protocol_bit("ikev2")
     if ident.startswith("proxy"):
-        return "proxy"
+        return protocol_bit("proxy")
     if ident.startswith("socks"):
-        return "socks"
+        return protocol_bit("socks")
 
     # Keep single-token identifiers like "nordwhisper"
     if "_" not in ident:
-        return ident
+        return protocol_bit(ident)
 
     # Fallback: take first token (safe default)
-    return ident.split("_", 1)[0]
+    return protocol_bit(ident.split("_", 1)[0])
 
 
 def extract_server_ips(server_obj: Dict[str, Any]) -> Set[str]:
@@ -128,16 +132,12 @@ def extract_server_tech_ids(server_obj: Dict[str, Any]) -> Set[int]:
     return out
 
 
-def build_tech_id_to_identifier(data: Dict[str, Any]) -> Dict[int, str]:
+def build_tech_id_to_identifier(techs: Iterable[Any]) -> Dict[int, str]:
     """
     Top-level has: "technologies": [{"id": 3, "identifier": "openvpn_udp", ...}, ...]
     Map id -> identifier.
     """
     out: Dict[int, str] = {}
-    techs = data.get("technologies", [])
-    if not isinstance(techs, list):
-        return out
-
     for t in techs:
         if not isinstance(t, dict):
             continue
@@ -148,26 +148,43 @@ def build_tech_id_to_identifier(data: Dict[str, Any]) -> Dict[int, str]:
     return out
 
 
-def load_ip_to_protocols(json_path: Path) -> Dict[str, Set[str]]:
+def iter_servers_with_techs(json_path: Path) -> Iterator[Tuple[Dict[int, str], Dict[str, Any]]]:
     """
-    Build ip -> set(base_protocol_names) for the NordVPN JSON.
+    (tech id -> identifier, server) for every servers[] entry, in one pass
+    over the payload. technologies[] comes before servers[] in the captures,
+    so servers are streamed; any read before the technologies are held back
+    until the end.
     """
-    data = load_json(json_path)
-    if not data:
-        return {}
-
-    tech_map = build_tech_id_to_identifier(data)
+    techs = []
+    held = []
+    tech_map: Optional[Dict[int, str]] = None
+    for which, value in iter_items_multi_or_warn(json_path, ("technologies.item", "servers.item")):
+        if which == 0:
+            techs.append(value)
+            continue
+        if not isinstance(value, dict):
+            continue
+        if tech_map is None and techs:
+            # the technologies array is complete once a server follows it
+            tech_map = build_tech_id_to_identifier(techs)
+        if tech_map is None:
+            held.append(value)
+        else:
+            yield tech_map, value
 
-    servers = data.get("servers", [])
-    if not isinstance(servers, list):
-        return {}
+    if held:
+        tech_map = build_tech_id_to_identifier(techs)
+        for s in held:
+            yield tech_map, s
 
-    ip_map: Dict[str, Set[str]] = {}
 
-    for s in servers:
-        if not isinstance(s, dict):
-            continue
+def load_ip_to_protocols(json_path: Path) -> Dict[IPKey, int]:
+    """
+    Build packed ip -> protocol mask for the NordVPN JSON.
+    """
+    ip_map: Dict[IPKey, int] = {}
 
+    for tech_map, s in iter_servers_with_techs(json_path):
         ips = extract_server_ips(s)
         if not ips:
             continue
@@ -176,121 +193,144 @@ def load_ip_to_protocols(json_path: Path) -> Dict[str, Set[str]]:
         if not tech_ids:
             continue
 
-        prot_names: Set[str] = set()
+        prot_mask = 0
         for tid in tech_ids:
             ident = tech_map.get(tid)
             if not ident:
                 continue
-            base = normalize_tech_identifier(ident)
-            if base:
-                prot_names.add(base)
+            prot_mask |= normalize_tech_identifier(ident)
 
-        if not prot_names:
+        if not prot_mask:
             continue
 
         for ip in ips:
-            ip_map.setdefault(ip, set()).update(prot_names)
+            key = pack_ip(ip)
+            ip_map[key] = ip_map.get(key, 0) | prot_mask
 
     return ip_map
 
 
-def read_date_ip_pairs(csv_path: Path) -> Set[Tuple[str, str]]:
+def load_date_ip_map(date_dir: Path) -> Optional[SortedTable[int]]:
     """
-    Reads CSV and returns a set of (date_str, ip) pairs.
-    - Skips first line.
-    - Assumes rows like: ip,date
+    Parse the JSON payload of one date directory into a sorted ip table,
+    from the capture-time attribution.csv when there is one.
+    Returns None when the directory holds no JSON file.
     """
-    pairs: Set[Tuple[str, str]] = set()
-    with csv_path.open("r", encoding="utf-8", newline="") as f:
-        reader = csv.reader(f)
-
-        # Skip the first line (e.g., ",0")
-        try:
-            next(reader)
-        except StopIteration:
-            return pairs
-
-        for row in reader:
-            if not row or len(row) < 2:
-                continue
-            ip = (row[0] or "").strip()
-            date_str = (row[1] or "").strip()
-            if ip and date_str:
-                pairs.add((date_str, ip))
+    cap = CaptureDir(date_dir)
+    table = load_attribution(date_dir, cap)
+    if table is not None:
+        return SortedTable(table.ip_masks())
+    json_path = find_json_file(date_dir, cap)
+    if not json_path:
+        return None
+    return SortedTable(load_ip_to_protocols(json_path))
 
-    return pairs
 
-
-def date_to_dirname(date_str: str) -> str:
-    """
-    CSV date is assumed to be like 11/05/2025 (MM/DD/YYYY).
-    Directory name is MM_DD_YYYY, e.g., 11_05_2025.
-    """
-    dt = datetime.strptime(date_str, "%m/%d/%Y")
-    return f"{dt.month:02d}_{dt.day:02d}_{dt.year:04d}"
+def load_date_items(date_dir: Path) -> Optional[Iterable[Tuple[IPKey, int]]]:
+    """(ip key, protocols) pairs of one capture, for the interval index."""
+    table = load_date_ip_map(date_dir)
+    return table.items() if table is not None else None
 
 
 def main() -> None:
+    parser = argparse.ArgumentParser(description=f"Attribute {BASE_DIR.name} server IPs to protocols.")
+    add_partition_args(parser)
+    parser.add_argument("--index", action="store_true",
+                        help=f"answer rows from the interval index ({INDEX_JSON}, rebuilt over the "
+                             "--since/--until window when a capture in it changed) instead of loading each date")
+    parser.add_argument("--gap-tolerance", type=int, default=GAP_TOLERANCE_DAYS, metavar="DAYS",
+                        help="with the index, fill rows whose date has no capture from the nearest capture at "
+                             f"most DAYS days away (default {GAP_TOLERANCE_DAYS}: leave them empty); implies --index")
+    args = parser.parse_args()
+    partition = partition_from_args(args)
+    gap_tolerance = max(args.gap_tolerance, 0)
+    use_index = args.index or gap_tolerance > 0
+    if not partition.wants_vendor(BASE_DIR.name):
+        print(f"Skipping {BASE_DIR.name}: not selected by --vendor")
+        return
+    if partition.has_window:
+        print(f"Partition: {partition.describe()}")
+
     if not BASE_DIR.exists() or not BASE_DIR.is_dir():
         raise SystemExit(f"Base dir not found or not a directory: {BASE_DIR.resolve()}")
 
     if not IN_CSV.exists():
         raise SystemExit(f"Input CSV not found: {IN_CSV.resolve()}")
 
-    date_ip_pairs = read_date_ip_pairs(IN_CSV)
-    print(f"Loaded {len(date_ip_pairs)} unique (date, ip) pairs from {IN_CSV.resolve()}")
+    ips, dates = read_ip_date_columns(IN_CSV, unique=True, keep_date=partition.wants_date)
+    keys = pack_column(ips)
+    print(f"Loaded {len(ips)} unique (date, ip) pairs from {IN_CSV.resolve()}")
 
-    # Cache per directory so multiple IPs for same date don't re-parse JSON
-    cache: Dict[str, Dict[str, Set[str]]] = {}
-
-    results: Dict[Tuple[str, str], Set[str]] = {}
+    # Group by date so each JSON is parsed once
+    by_dir, bad_idx = group_indices_by_date(dates)
 
     missing_dir = 0
     missing_json = 0
     missing_ip = 0
+    gap_filled = 0
 
-    for (date_str, ip) in sorted(date_ip_pairs, key=lambda x: (x[0], x[1])):
-        try:
-            dir_name = date_to_dirname(date_str)
-        except ValueError:
-            print(f"WARN: could not parse date '{date_str}' (expected MM/DD/YYYY)")
-            missing_dir += 1
-            results[(date_str, ip)] = set()
-            continue
-
-        date_dir = BASE_DIR / dir_name
-        if not date_dir.is_dir():
-            print(f"WARN: directory not found for date '{date_str}': {date_dir.resolve()}")
+    with RowWriter(OUT_CSV, ["date", "ip", "protocols"], sort=True) as out:
+        for i in bad_idx:
+            print(f"WARN: could not parse date '{dates[i]}' (expected MM/DD/YYYY)")
             missing_dir += 1
-            results[(date_str, ip)] = set()
-            continue
-
-        if dir_name not in cache:
-            json_path = find_json_file(date_dir)
-            if not json_path:
-                print(f"WARN: no JSON file found in {date_dir.resolve()}")
-                missing_json += 1
-                cache[dir_name] = {}
-            else:
-                cache[dir_name] = load_ip_to_protocols(json_path)
-
-        ip_map = cache[dir_name]
-        prots = ip_map.get(ip, set())
-        if not prots:
-            missing_ip += 1
-
-        results[(date_str, ip)] = set(prots)
-
-    with OUT_CSV.open("w", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        writer.writerow(["date", "ip", "protocols"])
-        for (date_str, ip), prots in sorted(results.items(), key=lambda x: (x[0][0], x[0][1])):
-            writer.writerow([date_str, ip, ",".join(sorted(prots))])
-
-    print(f"\nWrote {len(results)} rows to {OUT_CSV.resolve()}")
+            out.write((dates[i], ips[i], ""))
+
+        if use_index:
+            # the window's captures, plus the days a gap may be filled from
+            first = partition.since.toordinal() - gap_tolerance if partition.since else None
+            last = partition.until.toordinal() + gap_tolerance if partition.until else None
+            index = load_or_build_index(INDEX_JSON, BASE_DIR, load_date_items, BASE_DIR.name, first, last)
+            scanned = set(index.scanned_dirs)
+
+            for dir_name, idx in by_dir.items():
+                day = dirname_to_ordinal(dir_name)
+                prots_list = [index.lookup(keys[i], day, gap_tolerance) or 0 for i in idx]
+                if index.captured_on(day):
+                    missing_ip += prots_list.count(0)
+                else:
+                    filled = len(prots_list) - prots_list.count(0)
+                    gap_filled += filled
+                    date_dir = BASE_DIR / dir_name
+                    if dir_name not in scanned:
+                        print(f"WARN: directory not found for {len(idx)} rows: {date_dir.resolve()}")
+                        missing_dir += len(idx) - filled
+                    else:
+                        print(f"WARN: no JSON file found in {date_dir.resolve()}")
+                        missing_json += 1
+                        missing_ip += len(idx) - filled
+                for i, prots in zip(idx, prots_list):
+                    out.write((dates[i], ips[i], format_mask(prots)))
+        else:
+            # one listing of BASE_DIR instead of an is_dir() probe per date
+            present = list_capture_dirs(BASE_DIR)
+            date_dirs = [present[d] for d in by_dir if d in present]
+            with Prefetcher(date_dirs, load_date_ip_map, PREFETCH_DEPTH) as prefetcher:
+                for dir_name, idx in by_dir.items():
+                    date_dir = BASE_DIR / dir_name
+                    if dir_name not in present:
+                        print(f"WARN: directory not found for {len(idx)} rows: {date_dir.resolve()}")
+                        missing_dir += len(idx)
+                        prots_list = [0] * len(idx)
+                    else:
+                        ip_map = prefetcher.get(date_dir)
+                        if ip_map is None:
+                            print(f"WARN: no JSON file found in {date_dir.resolve()}")
+                            missing_json += 1
+                            missing_ip += len(idx)
+                            prots_list = [0] * len(idx)
+                        else:
+                            prots_list = ip_map.lookup_many([keys[i] for i in idx], 0)
+                            missing_ip += prots_list.count(0)
+
+                    for i, prots in zip(idx, prots_list):
+                        out.write((dates[i], ips[i], format_mask(prots)))
+
+    print(f"\nWrote {out.rows_written} rows to {OUT_CSV.resolve()}")
     print(f"Dates with missing directory: {missing_dir}")
     print(f"Dates with missing JSON: {missing_json}")
     print(f"(date,ip) pairs where IP not found / no protocols: {missing_ip}")
+    if gap_tolerance > 0:
+        print(f"(date,ip) pairs filled from captures within {gap_tolerance} days: {gap_filled}")
 
 
 if __name__ == "__main__":
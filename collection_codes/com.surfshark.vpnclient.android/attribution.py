@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Write attribution.csv for Surfshark captures.
+
+Right after the capture only the connection names are known, so the table
+holds one hostname row per servers.json connection. findServerIP.sh runs this
+again once the nslookup logs are complete, which adds one row per logged IP
+with the hostname it resolved from; logged IPs are left out until
+findServerIP.log says the logs are complete.
+
+Usage: python3 attribution.py <date_dir | vendor_dir> [...]
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from capture_attribution import AttributionTable, attribution_main, logs_complete
+from ip_to_protocol import LOG_DIRNAME, SERVERS_JSON, build_connection_to_protocols, build_ip_to_host_map_from_logs
+
+
+def build_table(date_dir: Path) -> AttributionTable:
+    table = AttributionTable()
+    conn_to_prots = build_connection_to_protocols(date_dir / SERVERS_JSON)
+    for conn, prots in conn_to_prots.items():
+        table.add("", prots, conn)
+
+    if not logs_complete(date_dir):
+        return table
+    # globbed from the directory itself: the manifest may predate the logs
+    for ip, host in build_ip_to_host_map_from_logs(date_dir / LOG_DIRNAME).items():
+        table.add(ip, conn_to_prots.get(host.lower(), 0), host)
+    return table
+
+
+if __name__ == "__main__":
+    attribution_main(build_table)
@@ -1,10 +1,18 @@
 #!/usr/bin/env python3
-import csv
-import json
-import re
+import sys
 from pathlib import Path
-from typing import Dict, Set, Tuple, Any, Optional, List
-from datetime import datetime
+from typing import Dict, Tuple, Any, Optional, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from capture_attribution import load_attribution
+from columnar import SortedTable, group_indices_by_date, pack_column, read_ip_date_columns
+from json_stream import iter_items_or_warn
+from manifest import CaptureDir, list_capture_dirs
+from partition import parse_partition_args
+from prefetch import Prefetcher
+from protocols import format_mask, pack_ip, protocol_bit
+from row_writer import RowWriter
+from logscan import scan_logs_ip_to_host
 
 BASE_DIR = Path("../../data/com.surfshark.vpnclient.android")
 IN_CSV = Path("com.surfshark.vpnclient.android.csv")
@@ -13,102 +21,56 @@ OUT_CSV = Path("surfshark_servers_protocols.csv")
 LOG_DIRNAME = "logs"
 SERVERS_JSON = "servers.json"
 
-# [2025-11-05 08:10:04] nslookup result for us-chi.prod.surfshark.com:
-NSLOOKUP_LINE_RE = re.compile(r"nslookup result for\s+([A-Za-z0-9.-]+)\s*:", re.IGNORECASE)
-IPV4_RE = re.compile(r"\b(\d{1,3}(?:\.\d{1,3}){3})\b")
+# Dates loaded in the background while the current one is joined
+PREFETCH_DEPTH = 2
 
 
-def date_to_dirname(date_str: str) -> str:
-    dt = datetime.strptime(date_str, "%m/%d/%Y")
-    return f"{dt.month:02d}_{dt.day:02d}_{dt.year:04d}"
-
-
-def load_json_any(path: Path) -> Any:
-    try:
-        with path.open("r", encoding="utf-8") as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return None
-    except json.JSONDecodeError as e:
-        print(f"WARN: could not parse JSON: {path} ({e})")
-        return None
-    except Exception as e:
-        print(f"WARN: error reading {path}: {e}")
-        return None
-
-
-def build_ip_to_host_map_from_logs(log_dir: Path) -> Dict[str, str]:
+def build_ip_to_host_map_from_logs(log_dir: Path, log_files: Optional[List[Path]] = None) -> Dict[str, str]:
     """
     Scan logs ONCE and map each seen IP to the currently active nslookup hostname.
     Works for lines containing:
       - 'Address: <ip>' (nslookup output)
       - '[...] Resolved IP: <ip>' (your logger)
       - '[...] New IP seen: <ip>' etc.
+
+    Delegates to logscan, which scans the files in parallel on raw bytes
+    and returns the same mapping as the original line-by-line regex scan.
     """
-    ip_to_host: Dict[str, str] = {}
-    if not log_dir.is_dir():
-        return ip_to_host
-
-    for log_file in sorted(log_dir.glob("*.txt")):
-        current_host: Optional[str] = None
-        try:
-            with log_file.open("r", encoding="utf-8", errors="replace") as f:
-                for line in f:
-                    m = NSLOOKUP_LINE_RE.search(line)
-                    if m:
-                        current_host = m.group(1).strip().lower()
-                        continue
-
-                    if not current_host:
-                        continue
-
-                    m_ip = IPV4_RE.search(line)
-                    if m_ip:
-                        ip = m_ip.group(1)
-                        # keep first mapping found (stable); change to assignment for "latest"
-                        ip_to_host.setdefault(ip, current_host)
-        except Exception as e:
-            print(f"WARN: could not read log {log_file}: {e}")
-
-    return ip_to_host
-
-
-def protocols_from_server_obj(obj: Dict[str, Any]) -> Set[str]:
+    return scan_logs_ip_to_host(log_dir, log_files=log_files)
+
+
+def protocols_from_server_obj(obj: Dict[str, Any]) -> int:
     """
     Based on your snippet, Surfshark entries include:
       - connectionName: "us-chi.prod.surfshark.com"
       - pubKey: ... (WireGuard)
     If you later find explicit OpenVPN/IKEv2 fields, add them here.
 
-    Returns set of protocol labels, e.g. {"wireguard"}.
+    Returns the protocol mask, e.g. protocol_bit("wireguard").
     """
-    out: Set[str] = set()
+    out = 0
 
     # WireGuard heuristic: pubKey present
     pub = obj.get("pubKey")
     if isinstance(pub, str) and pub.strip():
-        out.add("wireguard")
+        out |= protocol_bit("wireguard")
 
     # If you discover explicit fields, uncomment/adapt:
     # proto = obj.get("protocol")
     # if isinstance(proto, str) and proto.strip():
-    #     out.add(proto.strip().lower())
+    #     out |= protocol_bit(proto.strip().lower())
 
     return out
 
 
-def build_connection_to_protocols(servers_json: Path) -> Dict[str, Set[str]]:
+def build_connection_to_protocols(servers_json: Path) -> Dict[str, int]:
     """
     servers.json appears to be a LIST of server objects (per your start-of-file snippet).
     Build:
-      connectionName(lower) -> {protocols}
+      connectionName(lower) -> protocol mask
     """
-    out: Dict[str, Set[str]] = {}
-    data = load_json_any(servers_json)
-    if not isinstance(data, list):
-        return out
-
-    for obj in data:
+    out: Dict[str, int] = {}
+    for obj in iter_items_or_warn(servers_json, "item"):
         if not isinstance(obj, dict):
             continue
         conn = obj.get("connectionName")
@@ -116,93 +78,100 @@ def build_connection_to_protocols(servers_json: Path) -> Dict[str, Set[str]]:
             continue
         conn = conn.strip().lower()
 
-        prots = protocols_from_server_obj(obj)
-        if prots:
-            out.setdefault(conn, set()).update(prots)
-        else:
-            # keep empty mapping out by default
-            out.setdefault(conn, set())
+        # empty masks are kept so the connection is still known
+        out[conn] = out.get(conn, 0) | protocols_from_server_obj(obj)
 
     return out
 
 
+def load_date_maps(date_dir: Path) -> Tuple[SortedTable[str], Optional[Dict[str, int]]]:
+    """
+    Parse one date directory into (sorted ip -> hostname table, connectionName -> protocols).
+    The second map is None when servers.json is missing.
+
+    A capture-time attribution.csv that already holds the logged IPs answers
+    both maps; one written before the logs were complete is ignored.
+    """
+    cap = CaptureDir(date_dir)
+    table = load_attribution(date_dir, cap)
+    if table is not None and table.has_ips:
+        ip_to_host = SortedTable({pack_ip(ip): host for ip, host in table.ip_hosts().items()})
+        return ip_to_host, {host.lower(): prots for host, prots in table.host_masks().items()}
+    log_files = cap.glob(f"{LOG_DIRNAME}/*.txt")
+    ip_to_host = SortedTable({
+        pack_ip(ip): host for ip, host in build_ip_to_host_map_from_logs(date_dir / LOG_DIRNAME, log_files).items()
+    })
+    if not cap.exists(SERVERS_JSON):
+        return ip_to_host, None
+    return ip_to_host, build_connection_to_protocols(date_dir / SERVERS_JSON)
+
+
 def main() -> None:
+    partition = parse_partition_args(f"Attribute {BASE_DIR.name} server IPs to protocols.")
+    if not partition.wants_vendor(BASE_DIR.name):
+        print(f"Skipping {BASE_DIR.name}: not selected by --vendor")
+        return
+    if partition.has_window:
+        print(f"Partition: {partition.describe()}")
+
     if not BASE_DIR.is_dir():
         raise SystemExit(f"Base dir not found: {BASE_DIR.resolve()}")
     if not IN_CSV.exists():
         raise SystemExit(f"Input CSV not found: {IN_CSV.resolve()}")
 
-    total = 0
+    # Read columns (duplicates are kept, one output row per input row)
+    ips, dates = read_ip_date_columns(IN_CSV, keep_date=partition.wants_date)
+    keys = pack_column(ips)
+    total = len(ips)
     bad_date = 0
     missing_dir = 0
     missing_servers_json = 0
     no_host = 0
     no_protocols = 0
 
-    # Cache per date dir
-    cache_ip_to_host: Dict[str, Dict[str, str]] = {}
-    cache_conn_to_prots: Dict[str, Dict[str, Set[str]]] = {}
-
-    with IN_CSV.open("r", encoding="utf-8", newline="") as fin, \
-         OUT_CSV.open("w", encoding="utf-8", newline="") as fout:
-
-        reader = csv.reader(fin)
-        writer = csv.writer(fout)
-        writer.writerow(["date", "ip", "protocols"])
-
-        # skip first line (e.g. ",0")
-        next(reader, None)
-
-        for row in reader:
-            if not row or len(row) < 2:
-                continue
-
-            ip = (row[0] or "").strip()
-            date_str = (row[1] or "").strip()
-            if not ip or not date_str:
-                continue
+    # Group rows by date so each date is parsed once, in chronological order
+    by_dir, bad_idx = group_indices_by_date(dates)
 
-            total += 1
+    # one listing of BASE_DIR instead of an is_dir() probe per date
+    present = list_capture_dirs(BASE_DIR)
+    date_dirs = [present[d] for d in by_dir if d in present]
+    with RowWriter(OUT_CSV, ["date", "ip", "protocols"]) as out, \
+         Prefetcher(date_dirs, load_date_maps, PREFETCH_DEPTH) as prefetcher:
 
-            try:
-                dir_name = date_to_dirname(date_str)
-            except ValueError:
-                bad_date += 1
-                writer.writerow([date_str, ip, ""])
-                continue
+        for i in bad_idx:
+            bad_date += 1
+            out.write((dates[i], ips[i], ""))
 
+        done = bad_date
+        for dir_name, idx in by_dir.items():
             date_dir = BASE_DIR / dir_name
-            if not date_dir.is_dir():
-                missing_dir += 1
-                writer.writerow([date_str, ip, ""])
+            if dir_name not in present:
+                missing_dir += len(idx)
+                for i in idx:
+                    out.write((dates[i], ips[i], ""))
+                done += len(idx)
                 continue
 
-            # Load per-date maps once
-            if dir_name not in cache_ip_to_host:
-                cache_ip_to_host[dir_name] = build_ip_to_host_map_from_logs(date_dir / LOG_DIRNAME)
-
-            if dir_name not in cache_conn_to_prots:
-                sjson = date_dir / SERVERS_JSON
-                if not sjson.exists():
-                    missing_servers_json += 1
-                    cache_conn_to_prots[dir_name] = {}
-                else:
-                    cache_conn_to_prots[dir_name] = build_connection_to_protocols(sjson)
-
-            hostname = cache_ip_to_host[dir_name].get(ip)
-            if not hostname:
-                no_host += 1
-                writer.writerow([date_str, ip, ""])
-                continue
+            ip_to_host, conn_to_prots = prefetcher.get(date_dir)
+            if conn_to_prots is None:
+                missing_servers_json += 1
+                conn_to_prots = {}
+
+            hostnames = ip_to_host.lookup_many([keys[i] for i in idx], "")
+            for i, hostname in zip(idx, hostnames):
+                if not hostname:
+                    no_host += 1
+                    out.write((dates[i], ips[i], ""))
+                    continue
 
-            prots = cache_conn_to_prots[dir_name].get(hostname.lower(), set())
-            if not prots:
-                no_protocols += 1
+                prots = conn_to_prots.get(hostname.lower(), 0)
+                if not prots:
+                    no_protocols += 1
 
-            writer.writerow([date_str, ip, ",".join(sorted(prots))])
+                out.write((dates[i], ips[i], format_mask(prots)))
 
-            if total % 5000 == 0:
-                print(f"Processed {total} rows...")
+            done += len(idx)
+            print(f"Processed {done}/{total} rows ({dir_name})...")
 
     print(f"\nWrote output to {OUT_CSV.resolve()}")
     print(f"Total rows processed: {total}")
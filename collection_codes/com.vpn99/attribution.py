@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Write attribution.csv for VPN99 captures: one row per server entry with its
+true protocols, role premium or non_premium after the list it came from.
+
+Usage: python3 attribution.py <date_dir | vendor_dir> [...]
+"""
+import sys
+from pathlib import Path
+from typing import List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from capture_attribution import AttributionTable, attribution_main, first_str
+from ip_to_protocol import NON_PREM, PREM, iter_server_entries, true_protocols
+from parallel_load import load_files
+from protocols import format_mask, parse_mask
+
+ROLES = ((NON_PREM, "non_premium"), (PREM, "premium"))
+
+
+def load_rows(json_path: Path) -> List[Tuple[str, str, str]]:
+    """(ip, protocol names, hostname) per entry of one payload; runs in a worker process."""
+    rows = []
+    for entry in iter_server_entries(json_path):
+        if not isinstance(entry, dict):
+            continue
+        ip = entry.get("ip")
+        if not ip or not isinstance(ip, str):
+            continue
+        rows.append((ip, format_mask(true_protocols(entry)), first_str(entry, "hostname", "host")))
+    return rows
+
+
+def build_table(date_dir: Path) -> AttributionTable:
+    table = AttributionTable()
+    payloads = load_files([date_dir / fname for fname, _ in ROLES], load_rows)
+    for (_, role), rows in zip(ROLES, payloads):
+        for ip, prots, hostname in rows:
+            table.add(ip, parse_mask(prots), hostname, role)
+    return table
+
+
+if __name__ == "__main__":
+    attribution_main(build_table)
@@ -1,46 +1,49 @@
 #!/usr/bin/env python3
 import csv
-import json
+import sys
 from pathlib import Path
 from typing import Dict, Set, Tuple, Iterable, Any
-from datetime import datetime
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from capture_attribution import load_attribution
+from date_cache import group_rows_by_date
+from json_stream import iter_items_or_warn
+from manifest import list_capture_dirs
+from parallel_load import load_files
+from partition import parse_partition_args
+from prefetch import Prefetcher
+from protocols import IPKey, format_mask, mask_names, name_masks, pack_ip, protocol_mask
+from row_writer import RowWriter
 
 BASE_DIR = Path("../../data/com.vpn99")
 IN_CSV = Path("com.vpn99.csv")                  # input
 OUT_CSV = Path("vpn99_servers_protocols.csv")   # output
 
+# Dates loaded in the background while the current one is joined
+PREFETCH_DEPTH = 2
+
 NON_PREM = "non_premium_servers.json"
 PREM = "servers.json"
 
 
 def iter_server_entries(json_path: Path) -> Iterable[Dict[str, Any]]:
-    try:
-        with json_path.open("r", encoding="utf-8") as f:
-            data = json.load(f)
-        return data if isinstance(data, list) else []
-    except FileNotFoundError:
-        return []
-    except json.JSONDecodeError as e:
-        print(f"WARN: could not parse JSON: {json_path} ({e})")
-        return []
-    except Exception as e:
-        print(f"WARN: error reading {json_path}: {e}")
-        return []
-
-
-def true_protocols(server_obj: Dict[str, Any]) -> Set[str]:
+    """Entries of a top-level server list, one at a time; nothing on errors."""
+    return iter_items_or_warn(json_path, "item")
+
+
+def true_protocols(server_obj: Dict[str, Any]) -> int:
     prot = server_obj.get("protocols", {})
     if not isinstance(prot, dict):
-        return set()
-    return {k for k, v in prot.items() if v is True}
+        return 0
+    return protocol_mask(k for k, v in prot.items() if v is True)
 
 
-def load_ip_to_protocols(json_path: Path) -> Dict[str, Set[str]]:
+def load_ip_to_protocols(json_path: Path) -> Dict[IPKey, int]:
     """
-    Builds ip -> set(true_protocols) for a single JSON file.
+    Builds packed ip -> true_protocols mask for a single JSON file.
     If an IP occurs multiple times in the file, protocols are unioned.
     """
-    ip_map: Dict[str, Set[str]] = {}
+    ip_map: Dict[IPKey, int] = {}
     for entry in iter_server_entries(json_path):
         if not isinstance(entry, dict):
             continue
@@ -50,10 +53,16 @@ def load_ip_to_protocols(json_path: Path) -> Dict[str, Set[str]]:
         prots = true_protocols(entry)
         if not prots:
             continue
-        ip_map.setdefault(ip, set()).update(prots)
+        key = pack_ip(ip)
+        ip_map[key] = ip_map.get(key, 0) | prots
     return ip_map
 
 
+def load_ip_protocol_names(json_path: Path) -> Dict[IPKey, str]:
+    """load_ip_to_protocols() with protocol names instead of masks, for a worker process."""
+    return mask_names(load_ip_to_protocols(json_path))
+
+
 def read_date_ip_pairs(csv_path: Path) -> Set[Tuple[str, str]]:
     """
     Reads com.vpn99.csv and returns a set of (date_str, ip) pairs.
@@ -80,76 +89,79 @@ def read_date_ip_pairs(csv_path: Path) -> Set[Tuple[str, str]]:
     return pairs
 
 
-def date_to_dirname(date_str: str) -> str:
+def load_date_maps(date_dir: Path) -> Tuple[Dict[IPKey, int], Dict[IPKey, int]]:
     """
-    CSV date is assumed to be like 11/05/2025 (MM/DD/YYYY).
-    Directory name is MM_DD_YYYY, e.g., 11_05_2025.
+    Parse one date directory into (non_premium_map, premium_map),
+    from the capture-time attribution.csv when there is one.
+    Both payloads are decoded concurrently.
     """
-    dt = datetime.strptime(date_str, "%m/%d/%Y")
-    return f"{dt.month:02d}_{dt.day:02d}_{dt.year:04d}"
+    table = load_attribution(date_dir)
+    if table is not None:
+        return table.ip_masks("non_premium"), table.ip_masks("premium")
+    non_prem, prem = load_files([date_dir / NON_PREM, date_dir / PREM], load_ip_protocol_names)
+    return name_masks(non_prem), name_masks(prem)
 
 
 def main() -> None:
+    partition = parse_partition_args(f"Attribute {BASE_DIR.name} server IPs to protocols.")
+    if not partition.wants_vendor(BASE_DIR.name):
+        print(f"Skipping {BASE_DIR.name}: not selected by --vendor")
+        return
+    if partition.has_window:
+        print(f"Partition: {partition.describe()}")
+
     if not BASE_DIR.exists() or not BASE_DIR.is_dir():
         raise SystemExit(f"Base dir not found or not a directory: {BASE_DIR.resolve()}")
 
     if not IN_CSV.exists():
         raise SystemExit(f"Input CSV not found: {IN_CSV.resolve()}")
 
-    date_ip_pairs = read_date_ip_pairs(IN_CSV)
+    date_ip_pairs = partition.filter_rows(read_date_ip_pairs(IN_CSV))
     print(f"Loaded {len(date_ip_pairs)} unique (date, ip) pairs from {IN_CSV.resolve()}")
 
-    # Cache per directory to avoid re-parsing JSON for multiple IPs on same date
-    cache: Dict[str, Tuple[Dict[str, Set[str]], Dict[str, Set[str]]]] = {}
-
-    results: Dict[Tuple[str, str], Set[str]] = {}
+    # Group by date so each date is parsed once
+    by_dir, bad_date_rows = group_rows_by_date(date_ip_pairs)
 
     missing_dir = 0
     missing_ip = 0
     dup_prem_non = 0
 
-    for (date_str, ip) in sorted(date_ip_pairs, key=lambda x: (x[0], x[1])):
-        try:
-            dir_name = date_to_dirname(date_str)
-        except ValueError:
+    # one listing of BASE_DIR instead of an is_dir() probe per date
+    present = list_capture_dirs(BASE_DIR)
+    date_dirs = [present[d] for d in by_dir if d in present]
+    with RowWriter(OUT_CSV, ["date", "ip", "protocols"], sort=True) as out, \
+         Prefetcher(date_dirs, load_date_maps, PREFETCH_DEPTH) as prefetcher:
+        for date_str, ip in bad_date_rows:
             print(f"WARN: could not parse date '{date_str}' (expected MM/DD/YYYY)")
             missing_dir += 1
-            results[(date_str, ip)] = set()
-            continue
-
-        date_dir = BASE_DIR / dir_name
-        if not date_dir.is_dir():
-            print(f"WARN: directory not found for date '{date_str}': {date_dir.resolve()}")
-            missing_dir += 1
-            results[(date_str, ip)] = set()
-            continue
-
-        if dir_name not in cache:
-            non_map = load_ip_to_protocols(date_dir / NON_PREM)
-            prem_map = load_ip_to_protocols(date_dir / PREM)
-            cache[dir_name] = (non_map, prem_map)
-
-        non_map, prem_map = cache[dir_name]
+            out.write((date_str, ip, ""))
+
+        for dir_name, rows in by_dir.items():
+            date_dir = BASE_DIR / dir_name
+            if dir_name not in present:
+                print(f"WARN: directory not found for {len(rows)} rows: {date_dir.resolve()}")
+                missing_dir += len(rows)
+                for date_str, ip in rows:
+                    out.write((date_str, ip, ""))
+                continue
 
-        non_prots = non_map.get(ip, set())
-        prem_prots = prem_map.get(ip, set())
+            non_map, prem_map = prefetcher.get(date_dir)
 
-        if non_prots and prem_prots:
-            dup_prem_non += 1
+            for date_str, ip in rows:
+                key = pack_ip(ip)
+                non_prots = non_map.get(key, 0)
+                prem_prots = prem_map.get(key, 0)
 
-        prots = set(non_prots) | set(prem_prots)
-        if not prots:
-            missing_ip += 1
+                if non_prots and prem_prots:
+                    dup_prem_non += 1
 
-        results[(date_str, ip)] = prots
+                prots = non_prots | prem_prots
+                if not prots:
+                    missing_ip += 1
 
-    with OUT_CSV.open("w", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        writer.writerow(["date", "ip", "protocols"])
-        for (date_str, ip), prots in sorted(results.items(), key=lambda x: (x[0][0], x[0][1])):
-            writer.writerow([date_str, ip, ",".join(sorted(prots))])
+                out.write((date_str, ip, format_mask(prots)))
 
-    print(f"\nWrote {len(results)} rows to {OUT_CSV.resolve()}")
+    print(f"\nWrote {out.rows_written} rows to {OUT_CSV.resolve()}")
     print(f"Dates with missing directory: {missing_dir}")
     print(f"(date,ip) pairs where IP not found / no true protocols: {missing_ip}")
     print(f"(date,ip) pairs present in BOTH premium & non-premium: {dup_prem_non}")
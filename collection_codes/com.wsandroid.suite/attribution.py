@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Write attribution.csv for wsandroid (McAfee) captures.
+
+Right after the capture only the region hostnames of region_prefix.txt are
+known, so the table holds one hostname row per region with the protocols of
+its regions/<CC>.json (plus ipsec when the region has an ipsec endpoint).
+findServerIP.sh runs this again once the nslookup logs are complete, which
+adds one row per logged IP with the hostname it resolved from; logged IPs are
+left out until findServerIP.log says the logs are complete.
+
+Usage: python3 attribution.py <date_dir | vendor_dir> [...]
+"""
+import sys
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from capture_attribution import AttributionTable, attribution_main, logs_complete
+from ip_to_protocol import LOG_DIRNAME, build_ip_to_host_map_from_logs, build_region_index
+
+REGION_PREFIX_TXT = "region_prefix.txt"
+
+
+def read_hostnames(path: Path) -> List[str]:
+    try:
+        with path.open("r", encoding="utf-8") as f:
+            return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    except OSError:
+        return []
+
+
+def build_table(date_dir: Path) -> AttributionTable:
+    table = AttributionTable()
+    index = build_region_index(date_dir)
+
+    for host in read_hostnames(date_dir / REGION_PREFIX_TXT):
+        table.add("", index.mask(host), host)
+
+    if not logs_complete(date_dir):
+        return table
+    for ip, host in build_ip_to_host_map_from_logs(date_dir / LOG_DIRNAME).items():
+        table.add(ip, index.mask(host), host)
+    return table
+
+
+if __name__ == "__main__":
+    attribution_main(build_table)
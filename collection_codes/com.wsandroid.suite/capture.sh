@@ -19,9 +19,22 @@ script_dir=$(dirname "$0")
 if python3 "$script_dir/get_servers.py" "$out_dir"
 then
   echo "Successfully fetched servers and saved to $out_dir"
-  nohup bash "$script_dir/../../utils/findServerIP.sh" "$out_dir/region_prefix.txt" "$out_dir/master_ip_list.txt" > "$out_dir/findServerIP.log" 2>&1 &
+  server_file="$out_dir/region_prefix.txt"
 else
-  # find regions prefix file 
-  last_file=$(find "$folder" -type f -name "region_prefix.txt" | sort | tail -n 1)
-  nohup bash "$script_dir/../../utils/findServerIP.sh" "$last_file" "$out_dir/master_ip_list.txt" > "$out_dir/findServerIP.log" 2>&1 &
+  # find regions prefix file
+  server_file=$(find "$folder" -type f -name "region_prefix.txt" -not -path "$out_dir/*" | sort | tail -n 1)
+  # attribution.py reads the one in the date dir
+  if [ -n "$server_file" ]
+  then
+    cp "$server_file" "$out_dir/region_prefix.txt"
+    server_file="$out_dir/region_prefix.txt"
+  fi
 fi
+
+# Normalize the payload into attribution.csv before logging starts (findServerIP.sh adds the logged IPs)
+python3 "$script_dir/attribution.py" "$out_dir"
+
+nohup bash "$script_dir/../../utils/findServerIP.sh" "$server_file" "$out_dir/master_ip_list.txt" "$script_dir/attribution.py" > "$out_dir/findServerIP.log" 2>&1 &
+
+# List the captured files (refreshed by findServerIP.sh once the logs are done)
+python3 "$script_dir/../manifest.py" "$out_dir"
\ No newline at end of file
@@ -1,12 +1,20 @@
 #!/usr/bin/env python3
 import csv
 import json
-import re
-import os
+import sys
 from pathlib import Path
-from typing import Dict, Set, Tuple, Any, Optional, List
-from datetime import datetime
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Tuple, Any, Optional, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from capture_attribution import load_attribution
+from date_cache import group_rows_by_date
+from host_index import HostEntry, HostIndex
+from logscan import scan_logs_ip_to_host
+from manifest import CaptureDir, list_capture_dirs
+from partition import parse_partition_args
+from prefetch import Prefetcher
+from protocols import format_mask, protocol_bit
+from row_writer import RowWriter
 
 BASE_DIR = Path("../../data/com.wsandroid.suite")
 IN_CSV = Path("com.wsandroid.suite.csv")
@@ -15,13 +23,8 @@ OUT_CSV = Path("wsandroid_suite_servers_protocols.csv")
 REGIONS_DIRNAME = "regions"
 LOG_DIRNAME = "logs"
 
-NSLOOKUP_LINE_RE = re.compile(r"nslookup result for\s+([A-Za-z0-9.-]+)\s*:", re.IGNORECASE)
-IP_RE = re.compile(r"\b(\d{1,3}(?:\.\d{1,3}){3})\b")
-
-
-def date_to_dirname(date_str: str) -> str:
-    dt = datetime.strptime(date_str, "%m/%d/%Y")
-    return f"{dt.month:02d}_{dt.day:02d}_{dt.year:04d}"
+# Dates loaded in the background while the current one is joined
+PREFETCH_DEPTH = 2
 
 
 def load_json(path: Path) -> Optional[Dict[str, Any]]:
@@ -33,33 +36,32 @@ def load_json(path: Path) -> Optional[Dict[str, Any]]:
         return None
 
 
-def infer_protocols(entry: Dict[str, Any]) -> Set[str]:
+def infer_protocols(entry: Dict[str, Any]) -> int:
     """
-    Return a SET of protocol labels for one vpn entry.
+    Return the protocol mask for one vpn entry.
 
     Rules you asked for:
       - Only label openvpn if it explicitly mentions openvpn (not inferred from tcp/udp)
       - If protocol is udp/tcp, keep as udp/tcp
       - If wireguardPublicKey exists, add wireguard (do NOT stop processing)
     """
-    out: Set[str] = set()
+    out = 0
 
     # Add wireguard if key exists, but DO NOT return early
     wg_key = entry.get("wireguardPublicKey")
     if isinstance(wg_key, str) and wg_key.strip():
-        out.add("wireguard")
+        out |= protocol_bit("wireguard")
 
     proto = entry.get("protocol")
     if isinstance(proto, str):
         s = proto.strip().lower()
         if s in {"udp", "tcp"}:
-            out.add(s)
+            out |= protocol_bit(s)
         elif "openvpn" in s:
-            out.add("openvpn")
+            out |= protocol_bit("openvpn")
         else:
             # keep unknown protocol strings if they exist
-            if s:
-                out.add(s)
+            out |= protocol_bit(s)
 
     return out
 
@@ -82,154 +84,160 @@ def host_to_region_json(hostname: str) -> Optional[str]:
     return None
 
 
-def build_ip_to_host_map_from_logs(log_dir: Path) -> Dict[str, str]:
+def build_ip_to_host_map_from_logs(log_dir: Path, log_files: Optional[List[Path]] = None) -> Dict[str, str]:
     """
     Scan logs ONCE and map each seen IP to the currently active nslookup hostname.
     Works for both:
       - 'Address: <ip>'
       - '[...] Resolved IP: <ip>'
     """
-    ip_to_host: Dict[str, str] = {}
-    if not log_dir.is_dir():
-        return ip_to_host
-
-    for log_file in sorted(log_dir.glob("*.txt")):
-        current_host: Optional[str] = None
-        try:
-            with log_file.open("r", encoding="utf-8", errors="replace") as f:
-                for line in f:
-                    m = NSLOOKUP_LINE_RE.search(line)
-                    if m:
-                        current_host = m.group(1).strip().lower()
-                        continue
-                    if not current_host:
-                        continue
-                    m_ip = IP_RE.search(line)
-                    if m_ip:
-                        ip = m_ip.group(1)
-                        # keep first mapping (stable); switch to overwrite if you want "latest"
-                        ip_to_host.setdefault(ip, current_host)
-        except Exception:
-            continue
+    return scan_logs_ip_to_host(log_dir, log_files=log_files)
 
-    return ip_to_host
 
-
-def load_region_json(region_json: Path) -> Tuple[Set[str], bool]:
+def load_region_json(region_json: Path) -> Tuple[int, bool]:
     """
     Return:
-      - region_protocols: union of protocol labels across ALL vpns[] in this region
+      - region_protocols: protocol mask across ALL vpns[] in this region
       - has_ipsec flag
     """
     data = load_json(region_json)
     if not data:
-        return set(), False
+        return 0, False
 
     has_ipsec = isinstance(data.get("ipsec"), str) and bool(data.get("ipsec").strip())
 
-    region_prots: Set[str] = set()
+    region_prots = 0
     vpns = data.get("vpns", [])
     if isinstance(vpns, list):
         for entry in vpns:
             if not isinstance(entry, dict):
                 continue
-            region_prots.update(infer_protocols(entry))
+            region_prots |= infer_protocols(entry)
 
 
     return region_prots, has_ipsec
 
 
 
-def process_one_date(dir_name: str, rows: List[Tuple[str, str]]) -> Tuple[str, List[Tuple[str, str, str]]]:
+def build_region_index(date_dir: Path, cap: Optional[CaptureDir] = None) -> HostIndex:
     """
-    rows = [(date_str, ip), ...] for a single dir_name.
-    Returns (dir_name, output_rows) where output_rows are (date_str, ip, protocols_csv).
+    Hostname index of one capture, resolved on first lookup:
+      lower-cased hostname -> ({"region": "AE.json"}, region protocols | ipsec)
+    Each regions/<CC>.json is parsed at most once however many hostnames
+    map to it; regions missing from the capture are not opened at all.
     """
-    out_rows: List[Tuple[str, str, str]] = []
-    date_dir = BASE_DIR / dir_name
-    if not date_dir.is_dir():
-        for date_str, ip in rows:
-            out_rows.append((date_str, ip, ""))
-        return dir_name, out_rows
+    cap = cap or CaptureDir(date_dir)
+    region_masks: Dict[str, int] = {}
+
+    def resolve(host: str) -> Optional[HostEntry]:
+        region_fname = host_to_region_json(host)
+        if not region_fname:
+            return None
+        prots = region_masks.get(region_fname)
+        if prots is None:
+            prots = 0
+            if cap.exists(f"{REGIONS_DIRNAME}/{region_fname}"):
+                region_prots, has_ipsec = load_region_json(date_dir / REGIONS_DIRNAME / region_fname)
+                prots = region_prots | (protocol_bit("ipsec") if has_ipsec else 0)
+            region_masks[region_fname] = prots
+        return {"region": region_fname}, prots
+
+    return HostIndex(resolve)
+
 
-    ip_to_host = build_ip_to_host_map_from_logs(date_dir / LOG_DIRNAME)
+def load_date_maps(date_dir: Path) -> Tuple[Dict[str, str], HostIndex]:
+    """
+    Parse one date directory into:
+      - ip -> hostname from the nslookup logs
+      - the hostname index, already resolved for every logged hostname
+
+    A capture-time attribution.csv that already holds the logged IPs answers
+    both (its protocols include ipsec already); one written before the logs
+    were complete is ignored.
+    """
+    cap = CaptureDir(date_dir)
+    table = load_attribution(date_dir, cap)
+    if table is not None and table.has_ips:
+        return table.ip_hosts(), HostIndex.from_masks(table.host_masks())
+    ip_to_host = build_ip_to_host_map_from_logs(date_dir / LOG_DIRNAME, cap.glob(f"{LOG_DIRNAME}/*.txt"))
 
-    # Cache only region files needed in this date
-    region_cache: Dict[str, Tuple[Set[str], bool]] = {}
+    index = build_region_index(date_dir, cap)
+    for host in set(ip_to_host.values()):
+        index.get(host)
+    return ip_to_host, index
 
+
+def join_date_rows(rows: List[Tuple[str, str]], ip_to_host: Dict[str, str],
+                   index: HostIndex) -> List[Tuple[str, str, str]]:
+    """
+    rows = [(date_str, ip), ...] for a single date.
+    Returns output rows (date_str, ip, protocols_csv).
+    """
+    out_rows: List[Tuple[str, str, str]] = []
     for date_str, ip in rows:
         host = ip_to_host.get(ip)
         if not host:
             out_rows.append((date_str, ip, ""))
             continue
+        out_rows.append((date_str, ip, format_mask(index.mask(host))))
 
-        region_fname = host_to_region_json(host)
-        if not region_fname:
-            out_rows.append((date_str, ip, ""))
-            continue
+    return out_rows
 
-        if region_fname not in region_cache:
-            region_json = date_dir / REGIONS_DIRNAME / region_fname
-            region_cache[region_fname] = load_region_json(region_json)
 
-        region_prots, has_ipsec = region_cache[region_fname]
-        prots = set(region_prots)
-        if has_ipsec:
-            prots.add("ipsec")
-
-
-        out_rows.append((date_str, ip, ",".join(sorted(prots))))
-
-    return dir_name, out_rows
+def read_rows(csv_path: Path) -> List[Tuple[str, str]]:
+    rows: List[Tuple[str, str]] = []
+    with csv_path.open("r", encoding="utf-8", newline="") as fin:
+        reader = csv.reader(fin)
+        next(reader, None)  # skip first line
+        for row in reader:
+            if not row or len(row) < 2:
+                continue
+            ip = (row[0] or "").strip()
+            date_str = (row[1] or "").strip()
+            if ip and date_str:
+                rows.append((date_str, ip))
+    return rows
 
 
 def main() -> None:
+    partition = parse_partition_args(f"Attribute {BASE_DIR.name} server IPs to protocols.")
+    if not partition.wants_vendor(BASE_DIR.name):
+        print(f"Skipping {BASE_DIR.name}: not selected by --vendor")
+        return
+    if partition.has_window:
+        print(f"Partition: {partition.describe()}")
+
     if not BASE_DIR.is_dir():
         raise SystemExit(f"Base dir not found: {BASE_DIR.resolve()}")
     if not IN_CSV.exists():
         raise SystemExit(f"Input CSV not found: {IN_CSV.resolve()}")
 
     # Group input rows by date directory
-    by_dir: Dict[str, List[Tuple[str, str]]] = {}
-    bad_date_rows: List[Tuple[str, str]] = []
-
-    with IN_CSV.open("r", encoding="utf-8", newline="") as fin:
-        reader = csv.reader(fin)
-        next(reader, None)  # skip first line
-        for row in reader:
-            if not row or len(row) < 2:
-                continue
-            ip = (row[0] or "").strip()
-            date_str = (row[1] or "").strip()
-            if not ip or not date_str:
-                continue
-            try:
-                dir_name = date_to_dirname(date_str)
-            except ValueError:
-                bad_date_rows.append((date_str, ip))
-                continue
-            by_dir.setdefault(dir_name, []).append((date_str, ip))
+    by_dir, bad_date_rows = group_rows_by_date(partition.filter_rows(read_rows(IN_CSV)))
+    # one listing of BASE_DIR instead of an is_dir() probe per date
+    present = list_capture_dirs(BASE_DIR)
+    date_dirs = [present[d] for d in by_dir if d in present]
 
-    with OUT_CSV.open("w", encoding="utf-8", newline="") as fout:
-        writer = csv.writer(fout)
-        writer.writerow(["date", "ip", "protocols"])
+    with RowWriter(OUT_CSV, ["date", "ip", "protocols"]) as out, \
+         Prefetcher(date_dirs, load_date_maps, PREFETCH_DEPTH) as prefetcher:
 
         # write bad-date rows first
         for date_str, ip in bad_date_rows:
-            writer.writerow([date_str, ip, ""])
-
-        with ProcessPoolExecutor(max_workers=1) as ex:
-            futures = [ex.submit(process_one_date, d, rows) for d, rows in by_dir.items()]
-            done = 0
-            for fut in as_completed(futures):
-                dir_name, out_rows = fut.result()
-                for date_str, ip, prots in out_rows:
-                    writer.writerow([date_str, ip, prots])
-                done += 1
-                print(f"Done {done}/{len(futures)}: {dir_name} ({len(out_rows)} rows)")
+            out.write((date_str, ip, ""))
+
+        for done, (dir_name, rows) in enumerate(by_dir.items(), start=1):
+            date_dir = BASE_DIR / dir_name
+            if dir_name not in present:
+                out_rows = [(date_str, ip, "") for date_str, ip in rows]
+            else:
+                ip_to_host, index = prefetcher.get(date_dir)
+                out_rows = join_date_rows(rows, ip_to_host, index)
+            for date_str, ip, prots in out_rows:
+                out.write((date_str, ip, prots))
+            print(f"Done {done}/{len(by_dir)}: {dir_name} ({len(out_rows)} rows)")
 
     print(f"\nWrote output to {OUT_CSV.resolve()}")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
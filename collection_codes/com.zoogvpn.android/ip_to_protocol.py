@@ -1,76 +1,41 @@
 #!/usr/bin/env python3
-import csv
-import json
+import sys
 from pathlib import Path
-from typing import Dict, Set, Tuple, Iterable, Any, Optional
-from datetime import datetime
+from typing import Dict, Iterable, Any
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from capture_attribution import load_attribution
+from columnar import SortedTable, group_indices_by_date, pack_column, read_ip_date_columns
+from json_stream import iter_items_or_warn
+from manifest import list_capture_dirs
+from partition import parse_partition_args
+from prefetch import Prefetcher
+from protocols import IPKey, format_mask, pack_ip, protocol_bit
+from row_writer import RowWriter
 
 BASE_DIR = Path("../../data/com.zoogvpn.android")
 IN_CSV = Path("com.zoogvpn.android.csv")
 OUT_CSV = Path("zoogvpn_servers_protocols.csv")
 
-SERVERS_JSON = "servers.json"
-
-
-def read_date_ip_pairs(csv_path: Path) -> Set[Tuple[str, str]]:
-    """
-    Reads CSV and returns a set of (date_str, ip) pairs.
-    - Skips first line (e.g., ",0")
-    - Assumes rows like: ip,date
-    """
-    pairs: Set[Tuple[str, str]] = set()
-    with csv_path.open("r", encoding="utf-8", newline="") as f:
-        reader = csv.reader(f)
-
-        try:
-            next(reader)  # skip first line
-        except StopIteration:
-            return pairs
-
-        for row in reader:
-            if not row or len(row) < 2:
-                continue
-            ip = (row[0] or "").strip()
-            date_str = (row[1] or "").strip()
-            if ip and date_str:
-                pairs.add((date_str, ip))
-    return pairs
-
+# Dates loaded in the background while the current one is joined
+PREFETCH_DEPTH = 2
 
-def date_to_dirname(date_str: str) -> str:
-    """
-    CSV date like 11/05/2025 (MM/DD/YYYY) -> dir name 11_05_2025
-    """
-    dt = datetime.strptime(date_str, "%m/%d/%Y")
-    return f"{dt.month:02d}_{dt.day:02d}_{dt.year:04d}"
+SERVERS_JSON = "servers.json"
 
 
 def load_servers_list(json_path: Path) -> Iterable[Dict[str, Any]]:
     """
     Expects JSON like:
       { "error": false, "servers": [ {...}, {...} ] }
-    Returns list under "servers" or [] on errors.
+    Yields the entries under "servers" one at a time; nothing on errors.
     """
-    try:
-        with json_path.open("r", encoding="utf-8") as f:
-            data = json.load(f)
-        if not isinstance(data, dict):
-            return []
-        servers = data.get("servers", [])
-        return servers if isinstance(servers, list) else []
-    except FileNotFoundError:
-        return []
-    except json.JSONDecodeError as e:
-        print(f"WARN: could not parse JSON: {json_path} ({e})")
-        return []
-    except Exception as e:
-        print(f"WARN: error reading {json_path}: {e}")
-        return []
-
-
-def normalize_zoog_protocol_label(label: str) -> Optional[str]:
+    return iter_items_or_warn(json_path, "servers.item")
+
+
+def normalize_zoog_protocol_label(label: str) -> int:
     """
-    Convert Zoog protocol strings into normalized protocol *names* only.
+    Convert Zoog protocol strings into normalized protocol codes
+    (bits from protocols.py, named after the normalized protocol).
 
     IMPORTANT CHANGE:
       - Do NOT map UDP/TCP -> openvpn anymore.
@@ -78,52 +43,52 @@ def normalize_zoog_protocol_label(label: str) -> Optional[str]:
       - Only return "openvpn" if it explicitly says "openvpn".
     """
     if not isinstance(label, str):
-        return None
+        return 0
 
     p = label.strip().lower()
     if not p:
-        return None
+        return 0
 
     # Keep transport labels as-is
     if p in {"udp", "tcp"}:
-        return p
+        return protocol_bit(p)
 
     # Explicit protocol names
     if p in {"openvpn", "open_vpn", "open-vpn"}:
-        return "openvpn"
+        return protocol_bit("openvpn")
     if p in {"ikev2", "ikev", "ike"}:
-        return "ikev2"
+        return protocol_bit("ikev2")
     if p in {"wireguard", "wg"}:
-        return "wireguard"
+        return protocol_bit("wireguard")
     if p == "dtls":
-        return "dtls"
+        return protocol_bit("dtls")
 
     # Shadowsocks / V2Ray / VMess / XRay variants (Zoog-specific naming)
     p_up = p.upper()
     if p_up.startswith("SS_"):
         if "SHADOWSOCKS" in p_up:
-            return "shadowsocksr" if "SSR" in p_up else "shadowsocks"
+            return protocol_bit("shadowsocksr" if "SSR" in p_up else "shadowsocks")
         if "V2RAY" in p_up:
-            return "v2ray"
+            return protocol_bit("v2ray")
         if "VMESS" in p_up:
-            return "vmess"
+            return protocol_bit("vmess")
         if "XR" in p_up:
-            return "xray"
-        return "shadowsocks"
+            return protocol_bit("xray")
+        return protocol_bit("shadowsocks")
 
-    # Keep unknown labels (or return None if you want strict)
-    return p
+    # Keep unknown labels (or return 0 if you want strict)
+    return protocol_bit(p)
 
 
 
-def protocols_from_server(server_obj: Dict[str, Any]) -> Set[str]:
+def protocols_from_server(server_obj: Dict[str, Any]) -> int:
     """
-    Extract normalized protocol NAMES from a Zoog server.
+    Extract the normalized protocol mask from a Zoog server.
     server_obj["protocols"] is expected to be a list of dicts:
       { "protocol": "UDP", "port": 1194, ... }
-    We ignore port/configName/etc and only return normalized names.
+    We ignore port/configName/etc and only return normalized protocols.
     """
-    out: Set[str] = set()
+    out = 0
     plist = server_obj.get("protocols", [])
     if not isinstance(plist, list):
         return out
@@ -134,19 +99,17 @@ def protocols_from_server(server_obj: Dict[str, Any]) -> Set[str]:
         raw = entry.get("protocol")
         if not isinstance(raw, str):
             continue
-        norm = normalize_zoog_protocol_label(raw)
-        if norm:
-            out.add(norm)
+        out |= normalize_zoog_protocol_label(raw)
 
     return out
 
 
-def load_ip_to_protocols(json_path: Path) -> Dict[str, Set[str]]:
+def load_ip_to_protocols(json_path: Path) -> Dict[IPKey, int]:
     """
-    Builds ip -> set(protocol_names) for one servers.json.
+    Builds packed ip -> protocol mask for one servers.json.
     If an IP occurs multiple times, protocol names are unioned.
     """
-    ip_map: Dict[str, Set[str]] = {}
+    ip_map: Dict[IPKey, int] = {}
 
     for server in load_servers_list(json_path):
         if not isinstance(server, dict):
@@ -161,59 +124,74 @@ def load_ip_to_protocols(json_path: Path) -> Dict[str, Set[str]]:
         if not prots:
             continue
 
-        ip_map.setdefault(ip, set()).update(prots)
+        key = pack_ip(ip)
+        ip_map[key] = ip_map.get(key, 0) | prots
 
     return ip_map
 
 
+def load_date_map(date_dir: Path) -> SortedTable[int]:
+    """
+    Parse servers.json of one date directory into a sorted ip -> protocols table,
+    from the capture-time attribution.csv when there is one.
+    """
+    table = load_attribution(date_dir)
+    if table is not None:
+        return SortedTable(table.ip_masks())
+    return SortedTable(load_ip_to_protocols(date_dir / SERVERS_JSON))
+
+
 def main() -> None:
+    partition = parse_partition_args(f"Attribute {BASE_DIR.name} server IPs to protocols.")
+    if not partition.wants_vendor(BASE_DIR.name):
+        print(f"Skipping {BASE_DIR.name}: not selected by --vendor")
+        return
+    if partition.has_window:
+        print(f"Partition: {partition.describe()}")
+
     if not BASE_DIR.exists() or not BASE_DIR.is_dir():
         raise SystemExit(f"Base dir not found or not a directory: {BASE_DIR.resolve()}")
 
     if not IN_CSV.exists():
         raise SystemExit(f"Input CSV not found: {IN_CSV.resolve()}")
 
-    date_ip_pairs = read_date_ip_pairs(IN_CSV)
-    print(f"Loaded {len(date_ip_pairs)} unique (date, ip) pairs from {IN_CSV.resolve()}")
+    ips, dates = read_ip_date_columns(IN_CSV, unique=True, keep_date=partition.wants_date)
+    keys = pack_column(ips)
+    print(f"Loaded {len(ips)} unique (date, ip) pairs from {IN_CSV.resolve()}")
 
-    cache: Dict[str, Dict[str, Set[str]]] = {}  # dir_name -> ip_map
-    results: Dict[Tuple[str, str], Set[str]] = {}
+    # Group by date so each JSON is parsed once
+    by_dir, bad_idx = group_indices_by_date(dates)
 
     missing_dir = 0
     missing_ip = 0
 
-    for (date_str, ip) in sorted(date_ip_pairs, key=lambda x: (x[0], x[1])):
-        try:
-            dir_name = date_to_dirname(date_str)
-        except ValueError:
-            print(f"WARN: could not parse date '{date_str}' (expected MM/DD/YYYY)")
-            results[(date_str, ip)] = set()
+    # one listing of BASE_DIR instead of an is_dir() probe per date
+    present = list_capture_dirs(BASE_DIR)
+    date_dirs = [present[d] for d in by_dir if d in present]
+    with RowWriter(OUT_CSV, ["date", "ip", "protocols"], sort=True) as out, \
+         Prefetcher(date_dirs, load_date_map, PREFETCH_DEPTH) as prefetcher:
+        for i in bad_idx:
+            print(f"WARN: could not parse date '{dates[i]}' (expected MM/DD/YYYY)")
             missing_dir += 1
-            continue
-
-        date_dir = BASE_DIR / dir_name
-        if not date_dir.is_dir():
-            print(f"WARN: directory not found for date '{date_str}': {date_dir.resolve()}")
-            results[(date_str, ip)] = set()
-            missing_dir += 1
-            continue
-
-        if dir_name not in cache:
-            cache[dir_name] = load_ip_to_protocols(date_dir / SERVERS_JSON)
-
-        prots = cache[dir_name].get(ip, set())
-        if not prots:
-            missing_ip += 1
+            out.write((dates[i], ips[i], ""))
+
+        for dir_name, idx in by_dir.items():
+            date_dir = BASE_DIR / dir_name
+            if dir_name not in present:
+                print(f"WARN: directory not found for {len(idx)} rows: {date_dir.resolve()}")
+                missing_dir += len(idx)
+                for i in idx:
+                    out.write((dates[i], ips[i], ""))
+                continue
 
-        results[(date_str, ip)] = set(prots)
+            ip_map = prefetcher.get(date_dir)
 
-    with OUT_CSV.open("w", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        writer.writerow(["date", "ip", "protocols"])
-        for (date_str, ip), prots in sorted(results.items(), key=lambda x: (x[0][0], x[0][1])):
-            writer.writerow([date_str, ip, ",".join(sorted(prots))])
+            found = ip_map.lookup_many([keys[i] for i in idx], 0)
+            missing_ip += found.count(0)
+            for i, prots in zip(idx, found):
+                out.write((dates[i], ips[i], format_mask(prots)))
 
-    print(f"\nWrote {len(results)} rows to {OUT_CSV.resolve()}")
+    print(f"\nWrote {out.rows_written} rows to {OUT_CSV.resolve()}")
     print(f"Dates with missing directory: {missing_dir}")
     print(f"(date,ip) pairs where IP not found / no protocols: {missing_ip}")
 
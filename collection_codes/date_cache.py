@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Date grouping for the ip_to_protocol.py scripts, and a bounded LRU cache.
+
+The scripts used to keep every parsed date in a plain dict for the whole
+run, so peak memory grew with the number of capture days. Grouping the input
+rows by date directory first means each date is parsed once and can be
+dropped as soon as its rows are joined; no cache is needed for that.
+
+LRUCache is for values that are actually requested again, e.g. browsec's
+decoded configs, which repeat across days (keyed by content hash).
+"""
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, Generic, Hashable, Iterable, List, Optional, Tuple, TypeVar
+
+V = TypeVar("V")
+
+DEFAULT_CACHE_SIZE = 4
+
+
+def date_to_dirname(date_str: str) -> str:
+    """
+    CSV date is assumed to be like 11/05/2025 (MM/DD/YYYY).
+    Directory name is MM_DD_YYYY, e.g., 11_05_2025.
+    """
+    dt = datetime.strptime(date_str, "%m/%d/%Y")
+    return f"{dt.month:02d}_{dt.day:02d}_{dt.year:04d}"
+
+
+def dirname_sort_key(dir_name: str) -> Tuple[str, str, str]:
+    """MM_DD_YYYY -> (YYYY, MM, DD) so groups are processed chronologically."""
+    mm, dd, yyyy = dir_name.split("_")
+    return yyyy, mm, dd
+
+
+def group_rows_by_date(
+    rows: Iterable[Tuple[str, str]],
+) -> Tuple[Dict[str, List[Tuple[str, str]]], List[Tuple[str, str]]]:
+    """
+    Group (date_str, ip) rows by date directory name.
+
+    Returns:
+      - by_dir: dir_name -> [(date_str, ip), ...] in chronological order,
+        rows keep their input order inside a group
+      - bad_date_rows: rows whose date could not be parsed
+
+    Each distinct date string is parsed only once.
+    """
+    dir_names: Dict[str, Optional[str]] = {}
+    by_dir: Dict[str, List[Tuple[str, str]]] = {}
+    bad_date_rows: List[Tuple[str, str]] = []
+
+    for date_str, ip in rows:
+        if date_str not in dir_names:
+            try:
+                dir_names[date_str] = date_to_dirname(date_str)
+            except ValueError:
+                dir_names[date_str] = None
+        dir_name = dir_names[date_str]
+        if dir_name is None:
+            bad_date_rows.append((date_str, ip))
+            continue
+        by_dir.setdefault(dir_name, []).append((date_str, ip))
+
+    ordered = {d: by_dir[d] for d in sorted(by_dir, key=dirname_sort_key)}
+    return ordered, bad_date_rows
+
+
+class LRUCache(Generic[V]):
+    """
+    Small least-recently-used cache.
+
+    get(key, loader) returns the cached value or calls loader() on a miss,
+    evicting the least recently used entry once maxsize is exceeded.
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_CACHE_SIZE) -> None:
+        if maxsize < 1:
+            raise ValueError("maxsize must be >= 1")
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Hashable, V]" = OrderedDict()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, loader: Callable[[], V]) -> V:
+        if key in self._data:
+            self._data.move_to_end(key)
+            return self._data[key]
+
+        value = loader()
+        self._data[key] = value
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+        return value
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Write attribution.csv for CyberGhost captures: one row per server IP of
+servers.json (country code -> IP list), which names neither hostnames nor
+protocols, plus one row per server of the per-country payloads that
+get_servers2.py bundles into countries.ndjson (country_bundle.py): servers
+with an IP are added with their name and protocol names, role = country.
+capture.sh runs this again once the per-country crawl is done.
+
+Usage: python3 attribution.py <date_dir | vendor_dir> [...]
+"""
+import sys
+from pathlib import Path
+from typing import Any, Dict, Iterator
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from capture_attribution import AttributionTable, attribution_main, first_str
+from country_bundle import read_countries
+from json_stream import iter_items_or_warn
+from protocols import protocol_mask
+
+SERVERS_JSON = "servers.json"
+
+
+def iter_country_servers(payload: Any) -> Iterator[Dict[str, Any]]:
+    """Server objects of one country payload: a list of them, or a dict holding such lists."""
+    lists = payload.values() if isinstance(payload, dict) else [payload]
+    for items in lists:
+        if isinstance(items, list):
+            yield from (s for s in items if isinstance(s, dict))
+
+
+def server_protocols(server: Dict[str, Any]) -> int:
+    names = []
+    for p in server.get("protocols") or []:
+        name = p.get("name") if isinstance(p, dict) else p
+        if isinstance(name, str):
+            names.append(name.strip().lower())
+    return protocol_mask(names)
+
+
+def build_table(date_dir: Path) -> AttributionTable:
+    table = AttributionTable()
+    # {"<country>": [ip, ...], ...}
+    for ip in iter_items_or_warn(date_dir / SERVERS_JSON, "*.item"):
+        if isinstance(ip, str) and ip.strip():
+            table.add(ip.strip(), 0)
+
+    for country, payload in read_countries(date_dir).items():
+        for server in iter_country_servers(payload):
+            ip = first_str(server, "ip", "ip_address", "address")
+            if ip:
+                table.add(ip, server_protocols(server), first_str(server, "name", "hostname"), country)
+    return table
+
+
+if __name__ == "__main__":
+    attribution_main(build_table)
@@ -17,3 +17,16 @@ mkdir -p $out_dir
 script_dir=$(dirname "$0")
 
 python3 "$script_dir/get_servers.py" "$out_dir"
+
+# Normalize the payload into attribution.csv
+python3 "$script_dir/attribution.py" "$out_dir"
+
+# List the captured files for the readers
+python3 "$script_dir/../manifest.py" "$out_dir"
+
+# The per-country crawl takes hours: it appends each country to countries.ndjson
+# as it arrives, then the table and the manifest are rebuilt with the countries
+if [ -f "$script_dir/country_codes.txt" ]; then
+  nohup bash -c 'python3 "$1/get_servers2.py" "$2" "$1/country_codes.txt"; python3 "$1/attribution.py" "$2"; python3 "$1/../manifest.py" "$2"' \
+    _ "$script_dir" "$out_dir" > "$out_dir/get_servers2.log" 2>&1 &
+fi
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Per-date bundle of CyberGhost's per-country server payloads.
+
+get_servers2.py used to write one <country>_servers.json per entry of
+country_codes.txt, hundreds of small files per capture. They are now kept in
+one NDJSON bundle per date directory (ndjson_bundle.py):
+
+  MM_DD_YYYY/countries.ndjson            {"key": "<country>", "value": <payload>}
+  MM_DD_YYYY/countries.ndjson.idx.json   country -> (offset, length)
+
+read_countries() reads every country with one sequential read (attribution.py
+adds their servers to the capture's table);
+load_country() seeks to one country through the index. Both fall back to the
+legacy per-country files of captures that have not been bundled.
+
+Bundling existing captures (the per-country files are kept unless --remove):
+
+  python3 country_bundle.py [--remove] <date_dir | vendor_dir> [...]
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from manifest import DATE_DIR_RE, MANIFEST_NAME, list_capture_dirs, write_manifest
+from ndjson_bundle import BundleReader, BundleWriter, iter_bundle
+
+BUNDLE_NAME = "countries.ndjson"
+COUNTRY_SUFFIX = "_servers.json"
+
+
+def country_file(date_dir: Path, country: str) -> Path:
+    return date_dir / f"{country}{COUNTRY_SUFFIX}"
+
+
+def legacy_country_files(date_dir: Path) -> Dict[str, Path]:
+    """country -> <country>_servers.json of a capture that was not bundled."""
+    return {p.name[:-len(COUNTRY_SUFFIX)]: p for p in sorted(date_dir.glob(f"*{COUNTRY_SUFFIX}")) if p.is_file()}
+
+
+def load_json_file(path: Path) -> Any:
+    try:
+        with path.open("r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"WARN: could not read {path}: {e}")
+        return None
+
+
+def read_countries(date_dir: Path) -> Dict[str, Any]:
+    """
+    country -> payload for every country of a capture. A loose per-country
+    file wins over the bundle: it was written after the last bundling.
+    """
+    bundle = date_dir / BUNDLE_NAME
+    out: Dict[str, Any] = dict(iter_bundle(bundle)) if bundle.is_file() else {}
+    for country, path in legacy_country_files(date_dir).items():
+        out[country] = load_json_file(path)
+    return out
+
+
+def load_country(date_dir: Path, country: str) -> Optional[Any]:
+    """Payload of one country (see read_countries), or None if the capture does not have it."""
+    path = country_file(date_dir, country)
+    if path.is_file():
+        return load_json_file(path)
+    bundle = date_dir / BUNDLE_NAME
+    if not bundle.is_file():
+        return None
+    with BundleReader(bundle) as reader:
+        return reader.get(country)
+
+
+def bundle_date_dir(date_dir: Path, remove: bool = False) -> int:
+    """
+    Fold the per-country files of one capture into its bundle; returns the
+    bundled country count. Files that do not parse are left in place.
+    """
+    files = legacy_country_files(date_dir)
+    if not files:
+        return 0
+    bundle = date_dir / BUNDLE_NAME
+    countries: Dict[str, Any] = dict(iter_bundle(bundle)) if bundle.is_file() else {}
+    bundled = []
+    for country, path in files.items():
+        payload = load_json_file(path)
+        if payload is not None:
+            countries[country] = payload
+            bundled.append(path)
+    if not bundled:
+        return 0
+    with BundleWriter(bundle) as writer:
+        for country in sorted(countries):
+            writer.add(country, countries[country])
+    if remove:
+        for path in bundled:
+            path.unlink()
+    if (date_dir / MANIFEST_NAME).exists():
+        write_manifest(date_dir)
+    return len(countries)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Bundle CyberGhost per-country payloads per capture.")
+    parser.add_argument("paths", nargs="+", type=Path, metavar="date_dir | vendor_dir")
+    parser.add_argument("--remove", action="store_true", help="delete the per-country files once bundled")
+    args = parser.parse_args()
+
+    for path in args.paths:
+        dirs = {path.name: path} if DATE_DIR_RE.match(path.name) else list_capture_dirs(path)
+        for name in sorted(dirs):
+            n = bundle_date_dir(dirs[name], args.remove)
+            if n:
+                print(f"Bundled {n} countries into {dirs[name] / BUNDLE_NAME}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,12 +2,17 @@ import requests
 import json
 import sys
 import time
+from pathlib import Path
 
-outdir = "."
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from country_bundle import BUNDLE_NAME
+from ndjson_bundle import BundleWriter
+
+outdir = sys.argv[1] if len(sys.argv) > 1 else "."
 
 country_codes = []
 
-in_file = "country_codes.txt"
+in_file = sys.argv[2] if len(sys.argv) > 2 else "country_codes.txt"
 
 
 with open(in_file, "r") as f:
@@ -24,17 +29,23 @@ headers = {
     "accept-encoding": "gzip"
 }
 
-for country in country_codes:
-    path = f""
+# one NDJSON bundle per capture instead of a <country>_servers.json per country;
+# each country is flushed as it arrives, so a rerun after an interruption
+# only fetches the countries the bundle does not have yet
+with BundleWriter(Path(outdir) / BUNDLE_NAME, append=True) as bundle:
+    for country in country_codes:
+        if not country or country in bundle:
+            continue
+        path = f""
+
+        try:
+            response = requests.get(path, headers=headers)
+            payload = json.loads(response.text)
 
-    try:
-        response = requests.get(path, headers=headers)
+        except Exception as e:
+            print(f"Error fetching servers for country {country}: {e}")
+            continue
 
-    except Exception as e:
-        print(f"Error fetching servers for country {country}: {e}")
-        continue
+        bundle.add(country, payload)
 
-    with open(f"{outdir}/{country}_servers.json", "w") as f:
-        json.dump(json.loads(response.text), f, indent=4)
-    
-    time.sleep(5)
+        time.sleep(5)
@@ -1,39 +1,63 @@
-import json
-import glob
+#!/usr/bin/env python3
+"""
+Write attribution.csv for a germany.vpn capture: one row per server IP of
+servers.json (openvpn), servers_ss.json (shadowsocks) and servers_wg.json
+(wireguard), with the protocols of the lists it appears in, in that order.
+
+The file keeps its original two-column format (ip,protocols), which the
+notebooks read; it is not the ip,hostname,protocols,role table of
+capture_attribution.py.
+
+Usage: python3 attribution.py <date_dir>
+"""
+import csv
 import sys
-from collections import defaultdict
-import pandas as pd
-
-filename = 'servers.json'
-ss_filename = 'servers_ss.json'
-wg_filename = 'servers_wg.json'
-
-ddir = sys.argv[1]
-
-ips = defaultdict(list)
-
-with open(f"{ddir}/{filename}", "r") as f:
-    data = json.load(f)
-    for server in data:
-        ip = server.get('ip')
-        ips[ip].append('openvpn')
-
-with open(f"{ddir}/{ss_filename}", "r") as f:
-    data = json.load(f)
-    for server in data:
-        ip = server.get('ip')
-        ips[ip].append('shadowsocks')
-
-with open(f"{ddir}/{wg_filename}", "r") as f:
-    data = json.load(f)
-    for server in data:
-        ip = server.get('ip')
-        ips[ip].append('wireguard')
-
-arr = []
-
-for k, v in ips.items():
-    arr.append((k, ','.join(v)))
-
-df = pd.DataFrame(arr, columns=['ip', 'protocols'])
-df.to_csv(f"{ddir}/attribution.csv", index=False)
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from json_stream import iter_items_or_warn
+from parallel_load import load_files
+
+ATTRIBUTION_CSV = "attribution.csv"
+HEADER = ("ip", "protocols")
+
+SERVER_FILES = (
+    ("servers.json", "openvpn"),
+    ("servers_ss.json", "shadowsocks"),
+    ("servers_wg.json", "wireguard"),
+)
+
+
+def load_ips(json_path: Path) -> List[str]:
+    """ip of every server of one protocol list, repeats included; '' if it has none."""
+    ips = []
+    for server in iter_items_or_warn(json_path, "item"):
+        if isinstance(server, dict):
+            ip = server.get("ip")
+            ips.append("" if ip is None else str(ip))
+    return ips
+
+
+def main() -> None:
+    if len(sys.argv) != 2:
+        print(f"Usage: python3 {sys.argv[0]} <date_dir>")
+        sys.exit(1)
+    ddir = Path(sys.argv[1])
+
+    # the three lists are decoded concurrently
+    payloads = load_files([ddir / fname for fname, _ in SERVER_FILES], load_ips)
+    ips: Dict[str, List[str]] = {}
+    for (_, protocol), server_ips in zip(SERVER_FILES, payloads):
+        for ip in server_ips:
+            ips.setdefault(ip, []).append(protocol)
+
+    with (ddir / ATTRIBUTION_CSV).open("w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f, lineterminator="\n")
+        writer.writerow(HEADER)
+        writer.writerows((ip, ",".join(protocols)) for ip, protocols in ips.items())
+    print(f"Wrote {len(ips)} rows to {ddir / ATTRIBUTION_CSV}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,42 +1,26 @@
-import json
 import sys
+from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from json_stream import iter_items
 
-def find_all_by_key(obj, key):
-    """Recursively find all values for the given key in a JSON-like structure."""
-    results = []
+# every server of the top-level list
+SERVERS_PATH = "item"
 
-    if isinstance(obj, dict):
-        for k, v in obj.items():
-            if k == key:
-                results.append(v)
-            results.extend(find_all_by_key(v, key))
-    elif isinstance(obj, list):
-        for item in obj:
-            results.extend(find_all_by_key(item, key))
-
-    return results
 
 def main(input_file, output_file):
     print(input_file,output_file)
 
-    try:
-        with open(input_file,'r') as f:
-            data = json.load(f)
-
-    except FileNotFoundError as e:
-        print(f"File not found: {e}")
+    path = Path(input_file)
+    if not path.is_file():
+        print(f"File not found: {input_file}")
         exit(1)
 
-    ips = []
-
-    for server in data:
-        ips.append(server['ip'])
-    
+    # IPs are written as they are read (a server without one is a KeyError); large payloads are streamed
     with open(output_file,'w') as f:
-        for ip in ips:
-            f.write(f"{ip}\n")
-    
+        for server in iter_items(path, SERVERS_PATH):
+            f.write(f"{server['ip']}\n")
+
     return 0    
 
 if __name__ == "__main__":
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Per-capture hostname index for the log-based attribution scripts.
+
+The nslookup logs give each IP a hostname; the payload gives protocols per
+server name (PureVPN's cities -> protocols -> dns, wsandroid's per-region
+files). A HostIndex is built once per capture and maps the lower-cased
+hostname to (server record, protocol mask), so every host -> protocols
+lookup afterwards is one dict access.
+
+Hostnames that are not in the index can be resolved on first lookup by a
+`resolve` callback (e.g. open the host's region file); the result, a miss
+included, is memoized, so each source is parsed at most once per capture.
+"""
+from typing import Any, Callable, Dict, Iterator, Optional, Set, Tuple
+
+# (server record, protocol mask)
+HostEntry = Tuple[Dict[str, Any], int]
+
+
+class HostIndex:
+    """Lower-cased hostname -> (server record, protocol mask) for one capture."""
+
+    def __init__(self, resolve: Optional[Callable[[str], Optional[HostEntry]]] = None) -> None:
+        self.hosts: Dict[str, HostEntry] = {}
+        self.resolve = resolve
+        self._misses: Set[str] = set()
+
+    @classmethod
+    def from_masks(cls, masks: Dict[str, int]) -> "HostIndex":
+        index = cls()
+        for hostname, prots in masks.items():
+            index.add(hostname, prots)
+        return index
+
+    def __len__(self) -> int:
+        return len(self.hosts)
+
+    def __contains__(self, hostname: str) -> bool:
+        return self.get(hostname) is not None
+
+    def add(self, hostname: str, prots: int, record: Optional[Dict[str, Any]] = None) -> None:
+        """Add a hostname; protocols of a repeated name are unioned, the first record is kept."""
+        key = hostname.strip().lower()
+        if not key:
+            return
+        entry = self.hosts.get(key)
+        if entry is None:
+            self.hosts[key] = (record or {}, prots)
+        else:
+            self.hosts[key] = (entry[0], entry[1] | prots)
+
+    def get(self, hostname: str) -> Optional[HostEntry]:
+        key = hostname.strip().lower()
+        entry = self.hosts.get(key)
+        if entry is not None or self.resolve is None or key in self._misses:
+            return entry
+        entry = self.resolve(key)
+        if entry is None:
+            self._misses.add(key)
+        else:
+            self.hosts[key] = entry
+        return entry
+
+    def mask(self, hostname: str) -> int:
+        """Protocol mask of a hostname; 0 if it is unknown."""
+        entry = self.get(hostname)
+        return entry[1] if entry is not None else 0
+
+    def items(self) -> Iterator[Tuple[str, HostEntry]]:
+        return iter(self.hosts.items())
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Validity-interval index: ip -> protocols over time for one vendor.
+
+Instead of opening one MM_DD_YYYY directory per question, every capture of a
+vendor is folded into runs: for each ip, a run is a stretch of consecutive
+captures with the same protocol mask, stored as (start day, end day, mask).
+A run only continues over days that were not captured, so a captured day
+inside a run always had exactly that mask.
+
+Queries bisect the run starts, so both point and range lookups are
+O(log runs). For days with no capture, lookup() can fill in from the nearest
+captured day within `tolerance` days.
+
+The index is saved as JSON with protocol names (masks are per-process, see
+protocols.py), together with the mtime of every scanned directory: one stat
+per date, which changes whenever a file of the capture is added, removed or
+replaced (the capture and attribution scripts write through a temporary
+file). An index can be built over a window of dates only; a saved index is
+reused for a window while the directories inside it, and their mtimes, are
+the ones it was built from.
+"""
+import json
+import os
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from date_cache import dirname_sort_key
+from manifest import list_capture_dirs
+from protocols import IPKey, format_mask, pack_ip, protocol_mask, unpack_ip
+
+# ip -> (starts, ends, masks); starts/ends are date ordinals
+Runs = Tuple[array, array, List[int]]
+
+
+def dirname_to_ordinal(dir_name: str) -> int:
+    """MM_DD_YYYY -> date ordinal."""
+    return datetime.strptime(dir_name, "%m_%d_%Y").toordinal()
+
+
+def ordinal_to_dirname(day: int) -> str:
+    d = date.fromordinal(day)
+    return f"{d.month:02d}_{d.day:02d}_{d.year:04d}"
+
+
+def list_date_dirs(base_dir: Path, first: Optional[int] = None, last: Optional[int] = None) -> List[str]:
+    """
+    MM_DD_YYYY directory names under base_dir, in chronological order,
+    limited to the days [first, last] (date ordinals; None = unbounded).
+    """
+    names = sorted(list_capture_dirs(base_dir), key=dirname_sort_key)
+    if first is None and last is None:
+        return names
+    return [name for name in names if in_window(dirname_to_ordinal(name), first, last)]
+
+
+def in_window(day: int, first: Optional[int], last: Optional[int]) -> bool:
+    return (first is None or day >= first) and (last is None or day <= last)
+
+
+def dir_fingerprint(date_dir: Path) -> int:
+    """mtime of a capture directory; it changes when a file is added, removed or replaced."""
+    return os.stat(date_dir).st_mtime_ns
+
+
+def fingerprint_dirs(base_dir: Path, first: Optional[int] = None, last: Optional[int] = None) -> Dict[str, int]:
+    """MM_DD_YYYY name -> dir_fingerprint() for the date directories of base_dir in [first, last]."""
+    return {name: dir_fingerprint(base_dir / name) for name in list_date_dirs(base_dir, first, last)}
+
+
+class IntervalIndex:
+    """
+    Runs of stable protocol masks per ip.
+
+    Build by calling add_capture() once per captured day, in chronological
+    order; then query with lookup() / lookup_range().
+    """
+
+    def __init__(self, vendor: str = "") -> None:
+        self.vendor = vendor
+        self.captured: List[int] = []
+        self.scanned_dirs: List[str] = []
+        # scanned dir -> dir_fingerprint() at build time
+        self.fingerprints: Dict[str, int] = {}
+        self.runs: Dict[IPKey, Runs] = {}
+
+    def __len__(self) -> int:
+        return len(self.runs)
+
+    @property
+    def n_runs(self) -> int:
+        return sum(len(masks) for _, _, masks in self.runs.values())
+
+    def add_capture(self, day: int, items: Iterable[Tuple[IPKey, int]]) -> None:
+        """Fold one captured day (ip key, mask) pairs into the runs."""
+        if self.captured and day <= self.captured[-1]:
+            raise ValueError("captures must be added in chronological order")
+        prev = self.captured[-1] if self.captured else None
+        self.captured.append(day)
+
+        for key, mask in items:
+            if not mask:
+                continue
+            runs = self.runs.get(key)
+            if runs is None:
+                self.runs[key] = (array("l", [day]), array("l", [day]), [mask])
+                continue
+            starts, ends, masks = runs
+            if ends[-1] == prev and masks[-1] == mask:
+                ends[-1] = day
+            else:
+                starts.append(day)
+                ends.append(day)
+                masks.append(mask)
+
+    def captured_on(self, day: int) -> bool:
+        i = bisect_left(self.captured, day)
+        return i < len(self.captured) and self.captured[i] == day
+
+    def _mask_at(self, key: IPKey, day: int) -> int:
+        runs = self.runs.get(key)
+        if runs is None:
+            return 0
+        starts, ends, masks = runs
+        i = bisect_right(starts, day) - 1
+        if i >= 0 and ends[i] >= day:
+            return masks[i]
+        return 0
+
+    def lookup(self, ip: IPKey, day: int, tolerance: int = 0) -> Optional[int]:
+        """
+        Protocol mask of ip on day (a date ordinal).
+
+        Returns 0 when the day was captured and the ip had no protocols.
+        For a day without a capture, the nearest captured day at most
+        `tolerance` days away answers (the earlier one on a tie); None if
+        there is none.
+        """
+        key = pack_ip(ip) if isinstance(ip, str) else ip
+        i = bisect_left(self.captured, day)
+        if i < len(self.captured) and self.captured[i] == day:
+            return self._mask_at(key, day)
+        if tolerance <= 0:
+            return None
+
+        before = self.captured[i - 1] if i > 0 else None
+        after = self.captured[i] if i < len(self.captured) else None
+        if before is not None and day - before <= tolerance:
+            if after is None or day - before <= after - day:
+                return self._mask_at(key, before)
+        if after is not None and after - day <= tolerance:
+            return self._mask_at(key, after)
+        return None
+
+    def lookup_range(self, ip: IPKey, first: int, last: int) -> List[Tuple[int, int, int]]:
+        """Runs of ip overlapping [first, last], clipped to it, as (start, end, mask)."""
+        key = pack_ip(ip) if isinstance(ip, str) else ip
+        runs = self.runs.get(key)
+        if runs is None or first > last:
+            return []
+        starts, ends, masks = runs
+        out: List[Tuple[int, int, int]] = []
+        i = max(bisect_right(starts, first) - 1, 0)
+        while i < len(starts) and starts[i] <= last:
+            if ends[i] >= first:
+                out.append((max(starts[i], first), min(ends[i], last), masks[i]))
+            i += 1
+        return out
+
+    def save(self, path: Path) -> None:
+        runs_out = {
+            unpack_ip(key): [[ordinal_to_dirname(s), ordinal_to_dirname(e), format_mask(m)]
+                             for s, e, m in zip(starts, ends, masks)]
+            for key, (starts, ends, masks) in self.runs.items()
+        }
+        payload = {
+            "vendor": self.vendor,
+            "scanned_dirs": self.scanned_dirs,
+            "fingerprints": self.fingerprints,
+            "captured": [ordinal_to_dirname(d) for d in self.captured],
+            "runs": runs_out,
+        }
+        with path.open("w", encoding="utf-8") as f:
+            json.dump(payload, f)
+
+    @classmethod
+    def load(cls, path: Path) -> "IntervalIndex":
+        with path.open("r", encoding="utf-8") as f:
+            payload = json.load(f)
+        index = cls(payload.get("vendor", ""))
+        index.scanned_dirs = list(payload.get("scanned_dirs", []))
+        index.fingerprints = dict(payload.get("fingerprints", {}))
+        index.captured = [dirname_to_ordinal(d) for d in payload.get("captured", [])]
+        for ip, ip_runs in payload.get("runs", {}).items():
+            starts, ends, masks = array("l"), array("l"), []
+            for s, e, prots in ip_runs:
+                starts.append(dirname_to_ordinal(s))
+                ends.append(dirname_to_ordinal(e))
+                masks.append(protocol_mask(prots.split(",")))
+            index.runs[pack_ip(ip)] = (starts, ends, masks)
+        return index
+
+    def fingerprints_within(self, first: Optional[int], last: Optional[int]) -> Dict[str, int]:
+        return {name: fp for name, fp in self.fingerprints.items()
+                if in_window(dirname_to_ordinal(name), first, last)}
+
+    @classmethod
+    def build(cls, base_dir: Path, loader: Callable[[Path], Optional[Iterable[Tuple[IPKey, int]]]],
+              vendor: str = "", first: Optional[int] = None, last: Optional[int] = None) -> "IntervalIndex":
+        """
+        Scan every MM_DD_YYYY directory of base_dir in [first, last] (date
+        ordinals; None = unbounded). loader(date_dir) returns the (ip key,
+        mask) pairs of that capture, or None if the directory has no usable
+        capture.
+        """
+        index = cls(vendor)
+        for dir_name in list_date_dirs(base_dir, first, last):
+            index.scanned_dirs.append(dir_name)
+            # taken before loading, so a capture changing meanwhile triggers the next rebuild
+            index.fingerprints[dir_name] = dir_fingerprint(base_dir / dir_name)
+            items = loader(base_dir / dir_name)
+            if items is None:
+                continue
+            index.add_capture(dirname_to_ordinal(dir_name), items)
+        return index
+
+
+def load_or_build_index(path: Path, base_dir: Path,
+                        loader: Callable[[Path], Optional[Iterable[Tuple[IPKey, int]]]],
+                        vendor: str = "", first: Optional[int] = None, last: Optional[int] = None) -> IntervalIndex:
+    """
+    An index answering every day of [first, last] (date ordinals; None =
+    unbounded): the saved one while the date directories inside the window
+    and their mtimes are the ones it was built from (it may cover more), a
+    new one over the window otherwise.
+    """
+    if path.exists():
+        try:
+            index = IntervalIndex.load(path)
+            if index.fingerprints_within(first, last) == fingerprint_dirs(base_dir, first, last):
+                return index
+            print(f"Interval index {path} is out of date for this window; rebuilding")
+        except Exception as e:
+            print(f"WARN: could not read interval index {path}: {e}")
+
+    index = IntervalIndex.build(base_dir, loader, vendor, first, last)
+    index.save(path)
+    print(f"Built interval index: {len(index)} ips, {index.n_runs} runs "
+          f"over {len(index.captured)} captures -> {path.resolve()}")
+    return index
@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+"""
+Incremental JSON extraction for the parse_servers.py and attribution loaders.
+
+Instead of json.load()ing a whole payload and walking it, the loaders ask for
+the values at a path and get them one at a time:
+
+  for server in iter_items(path, "servers.item"):            # {"servers": [...]}
+  for ip in iter_items(path, "item.ip"):                      # [{"ip": ...}, ...]
+  for s in iter_items(path, "LogicalServers.item.Servers.item"):
+  for ips in iter_items(path, "*"):                           # {"DE": [...], ...}
+
+Paths use ijson's prefix syntax: object keys joined with ".", "item" for the
+elements of an array, "" for the document itself; "*" matches any one
+object key or array element.
+Only the value being yielded is held in memory.
+
+Files smaller than STREAM_MIN_BYTES are still read with json.load (the C
+decoder is much faster than any event parser) and walked with the same path
+rules, so results do not depend on the file size. Larger files are parsed as
+a stream of events: by ijson when it is installed, otherwise by the stdlib
+tokenizer below.
+
+Malformed JSON raises ValueError (json.JSONDecodeError when the stdlib
+parser is used) from the iteration, possibly after some values were yielded;
+the *_or_warn variants print a WARN instead, as the loaders always have.
+"""
+import json
+import re
+from json.decoder import scanstring
+from json.scanner import NUMBER_RE
+from pathlib import Path
+from typing import IO, Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+try:
+    import ijson
+except ImportError:  # optional: the stdlib event parser is used instead
+    ijson = None
+
+# Malformed input, as raised by either parser
+PARSE_ERRORS = (ValueError, ijson.JSONError) if ijson is not None else (ValueError,)
+
+# Files at least this large are parsed as a stream
+STREAM_MIN_BYTES = 64 << 20
+CHUNK_SIZE = 1 << 16
+# Characters kept ahead of a number or literal, so it is never cut by a chunk
+LOOKAHEAD = 64
+
+# (prefix, event, value), as produced by ijson.parse()
+Event = Tuple[str, str, Any]
+
+WS_RE = re.compile(r"[ \t\n\r]*")
+LITERALS = (
+    ("true", "boolean", True),
+    ("false", "boolean", False),
+    ("null", "null", None),
+    ("NaN", "number", float("nan")),
+    ("Infinity", "number", float("inf")),
+    ("-Infinity", "number", float("-inf")),
+)
+VALUE_EVENTS = frozenset(("start_map", "start_array", "string", "number", "boolean", "null"))
+
+# parser states
+VALUE, VALUE_OR_END, KEY, KEY_OR_END, COLON, COMMA_OR_END, DONE = range(7)
+
+
+def iter_tokens(f: IO[str], chunk_size: int = CHUNK_SIZE) -> Iterator[Tuple[str, Any]]:
+    """
+    JSON tokens of a text stream: ("{", None) ... for punctuation, and
+    ("string" | "number" | "boolean" | "null", value) for scalars.
+    """
+    buf = ""
+    pos = 0
+    eof = False
+
+    def fill(n: int) -> None:
+        nonlocal buf, pos, eof
+        chunk = f.read(n)
+        if not chunk:
+            eof = True
+        buf = buf[pos:] + chunk
+        pos = 0
+
+    while True:
+        pos = WS_RE.match(buf, pos).end()
+        if not eof and len(buf) - pos < LOOKAHEAD:
+            fill(chunk_size)
+            continue
+        if pos >= len(buf):
+            return
+        c = buf[pos]
+
+        if c in "{}[]:,":
+            pos += 1
+            yield c, None
+            continue
+
+        if c == '"':
+            try:
+                s, end = scanstring(buf, pos + 1, True)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                # the string runs past the buffer: read at least as much again
+                fill(max(chunk_size, len(buf)))
+                continue
+            pos = end
+            yield "string", s
+            continue
+
+        m = NUMBER_RE.match(buf, pos)
+        if m is not None:
+            if not eof and m.end() + 2 >= len(buf):
+                fill(chunk_size)
+                continue
+            integer, frac, exp = m.groups()
+            pos = m.end()
+            if frac or exp:
+                yield "number", float(integer + (frac or "") + (exp or ""))
+            else:
+                yield "number", int(integer)
+            continue
+
+        for text, kind, value in LITERALS:
+            if buf.startswith(text, pos):
+                pos += len(text)
+                yield kind, value
+                break
+        else:
+            raise json.JSONDecodeError("Expecting value", buf, pos)
+
+
+def join_prefix(prefix: str, name: str) -> str:
+    return f"{prefix}.{name}" if prefix else name
+
+
+def parse_events(f: IO[str], chunk_size: int = CHUNK_SIZE) -> Iterator[Event]:
+    """ijson.parse()-style (prefix, event, value) events from a text stream."""
+    stack: List[Tuple[bool, str]] = []  # (is_map, prefix) of the open containers
+    value_prefix = ""
+    state = VALUE
+
+    def bad(tok: str) -> json.JSONDecodeError:
+        return json.JSONDecodeError(f"Unexpected token {tok!r}", "", 0)
+
+    for tok, val in iter_tokens(f, chunk_size):
+        if state == VALUE or state == VALUE_OR_END:
+            if tok == "]" and state == VALUE_OR_END:
+                _, prefix = stack.pop()
+                yield prefix, "end_array", None
+            elif tok == "{":
+                yield value_prefix, "start_map", None
+                stack.append((True, value_prefix))
+                state = KEY_OR_END
+                continue
+            elif tok == "[":
+                yield value_prefix, "start_array", None
+                stack.append((False, value_prefix))
+                value_prefix = join_prefix(value_prefix, "item")
+                state = VALUE_OR_END
+                continue
+            elif tok in ("string", "number", "boolean", "null"):
+                yield value_prefix, tok, val
+            else:
+                raise bad(tok)
+        elif state == KEY or state == KEY_OR_END:
+            if tok == "}" and state == KEY_OR_END:
+                _, prefix = stack.pop()
+                yield prefix, "end_map", None
+            elif tok == "string":
+                prefix = stack[-1][1]
+                yield prefix, "map_key", val
+                value_prefix = join_prefix(prefix, val)
+                state = COLON
+                continue
+            else:
+                raise bad(tok)
+        elif state == COLON:
+            if tok != ":":
+                raise bad(tok)
+            state = VALUE
+            continue
+        elif state == COMMA_OR_END:
+            is_map, prefix = stack[-1]
+            if tok == ",":
+                if is_map:
+                    state = KEY
+                else:
+                    value_prefix = join_prefix(prefix, "item")
+                    state = VALUE
+                continue
+            if tok != ("}" if is_map else "]"):
+                raise bad(tok)
+            stack.pop()
+            yield prefix, "end_map" if is_map else "end_array", None
+        else:
+            raise json.JSONDecodeError("Extra data", "", 0)
+
+        # a value (scalar or container) just ended
+        state = COMMA_OR_END if stack else DONE
+
+    if state != DONE:
+        raise json.JSONDecodeError("Unexpected end of data", "", 0)
+
+
+def open_events(path: Path) -> Tuple[IO, Iterator[Event]]:
+    """Open path and return (file, event iterator), ijson's when it is installed."""
+    if ijson is not None:
+        f = path.open("rb")
+        return f, ijson.parse(f, use_float=True)
+    f = path.open("r", encoding="utf-8")
+    return f, parse_events(f)
+
+
+def build_value(events: Iterator[Event], event: str, value: Any) -> Any:
+    """Assemble the value that starts with (event, value), consuming its events."""
+    if event not in ("start_map", "start_array"):
+        return value
+    root: Union[Dict[str, Any], List[Any]] = {} if event == "start_map" else []
+    stack: List[Any] = [root]
+    keys: List[Optional[str]] = [None]
+    for _, ev, val in events:
+        if ev == "map_key":
+            keys[-1] = val
+            continue
+        if ev == "end_map" or ev == "end_array":
+            stack.pop()
+            keys.pop()
+            if not stack:
+                return root
+            continue
+        if ev == "start_map":
+            item: Any = {}
+        elif ev == "start_array":
+            item = []
+        else:
+            item = val
+        top = stack[-1]
+        if isinstance(top, list):
+            top.append(item)
+        else:
+            top[keys[-1]] = item
+        if ev == "start_map" or ev == "start_array":
+            stack.append(item)
+            keys.append(None)
+    raise json.JSONDecodeError("Unexpected end of data", "", 0)
+
+
+def split_path(path: str) -> Tuple[str, ...]:
+    return tuple(path.split(".")) if path else ()
+
+
+def prefix_matches(prefix: str, parts: Sequence[str]) -> bool:
+    names = split_path(prefix)
+    if len(names) != len(parts):
+        return False
+    return all(p == "*" or p == n for p, n in zip(parts, names))
+
+
+def walk(obj: Any, parts: Sequence[str]) -> Iterator[Any]:
+    """Values of an in-memory document at a split path (same rules as the stream)."""
+    if not parts:
+        yield obj
+        return
+    head, rest = parts[0], parts[1:]
+    if isinstance(obj, list):
+        if head == "item" or head == "*":
+            for item in obj:
+                yield from walk(item, rest)
+    elif isinstance(obj, dict):
+        if head == "*":
+            for value in obj.values():
+                yield from walk(value, rest)
+        elif head in obj:
+            yield from walk(obj[head], rest)
+
+
+def iter_events_items(events: Iterator[Event], paths: Sequence[str]) -> Iterator[Tuple[int, Any]]:
+    """(index into paths, value) for every value whose prefix matches one of paths, in document order."""
+    split = [split_path(p) for p in paths]
+    matched: Dict[str, Optional[int]] = {}
+    for prefix, event, value in events:
+        if event not in VALUE_EVENTS:
+            continue
+        which = matched.get(prefix, -1)
+        if which == -1:
+            which = next((i for i, parts in enumerate(split) if prefix_matches(prefix, parts)), None)
+            matched[prefix] = which
+        if which is not None:
+            yield which, build_value(events, event, value)
+
+
+def iter_items_multi(path: Path, paths: Sequence[str]) -> Iterator[Tuple[int, Any]]:
+    """
+    (index into paths, value) for the values at several paths, read in one
+    pass. Streamed values come in document order; values of small files come
+    path by path.
+    """
+    if path.stat().st_size < STREAM_MIN_BYTES:
+        with path.open("r", encoding="utf-8") as f:
+            data = json.load(f)
+        for i, p in enumerate(paths):
+            for value in walk(data, split_path(p)):
+                yield i, value
+        return
+
+    f, events = open_events(path)
+    with f:
+        yield from iter_events_items(events, paths)
+
+
+def iter_items(path: Path, item_path: str) -> Iterator[Any]:
+    """Values at item_path (e.g. "servers.item"), one at a time."""
+    for _, value in iter_items_multi(path, (item_path,)):
+        yield value
+
+
+def iter_items_multi_or_warn(path: Path, paths: Sequence[str]) -> Iterator[Tuple[int, Any]]:
+    """
+    iter_items_multi() for the ip_to_protocol loaders: a missing file yields
+    nothing, unreadable or malformed JSON prints a WARN and ends the items.
+    """
+    try:
+        yield from iter_items_multi(path, paths)
+    except FileNotFoundError:
+        return
+    except PARSE_ERRORS as e:
+        print(f"WARN: could not parse JSON: {path} ({e})")
+    except Exception as e:
+        print(f"WARN: error reading {path}: {e}")
+
+
+def iter_items_or_warn(path: Path, item_path: str) -> Iterator[Any]:
+    """iter_items() with the error handling of iter_items_multi_or_warn()."""
+    for _, value in iter_items_multi_or_warn(path, (item_path,)):
+        yield value
+
+
+def find_all_by_key(obj: Any, key: str) -> Iterator[Any]:
+    """
+    Generator version of the recursive find_all_by_key of the parse_servers
+    scripts: every value stored under key anywhere in a JSON-like structure,
+    in the same order, without building a list at every level.
+    """
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            if k == key:
+                yield v
+            yield from find_all_by_key(v, key)
+    elif isinstance(obj, list):
+        for item in obj:
+            yield from find_all_by_key(item, key)
+
+
+def iter_values_by_key(path: Path, key: str) -> Iterator[Any]:
+    """find_all_by_key() over a file, streaming it when it is large."""
+    if path.stat().st_size < STREAM_MIN_BYTES:
+        with path.open("r", encoding="utf-8") as f:
+            yield from find_all_by_key(json.load(f), key)
+        return
+
+    f, events = open_events(path)
+    with f:
+        for _, event, value in events:
+            if event == "map_key" and value == key:
+                _, ev, val = next(events)
+                found = build_value(events, ev, val)
+                yield found
+                yield from find_all_by_key(found, key)
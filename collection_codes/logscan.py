@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Fast scanner for the nslookup logs written by utils/findServerIP.sh.
+
+The attribution scripts used to run two regexes on every decoded line of every
+logs/*.txt file:
+
+  NSLOOKUP_LINE_RE = r"nslookup result for\\s+([A-Za-z0-9.-]+)\\s*:"  (IGNORECASE)
+  IPV4_RE          = r"\\b(\\d{1,3}(?:\\.\\d{1,3}){3})\\b"
+
+This module returns exactly the same ip -> hostname mapping, but works on the
+memory-mapped bytes of each file:
+  - lines are cut straight out of the mapping, one line in memory at a time,
+  - headers are located with a single lower-cased find() per line,
+  - lines that cannot hold an IPv4 (fewer than 3 dots) are skipped,
+  - 'Address:' / 'Server:' lines skip their prefix before parsing,
+  - IPs are parsed by a small hand-written matcher instead of a regex,
+  - files are scanned on the process pool shared with parallel_load.py and
+    merged in sorted file order.
+
+Files with non-ASCII bytes fall back to the original text/regex path, so the
+result is identical even for unexpected log content (tests/test_logscan.py
+compares both).
+"""
+import mmap
+import os
+import re
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence
+
+from parallel_load import shared_pool
+
+NSLOOKUP_LINE_RE = re.compile(r"nslookup result for\s+([A-Za-z0-9.-]+)\s*:", re.IGNORECASE)
+IPV4_RE = re.compile(r"\b(\d{1,3}(?:\.\d{1,3}){3})\b")
+
+HEADER_MARK = b"nslookup result for"
+PREFIXES = (b"address:", b"server:")
+
+DIGITS = frozenset(b"0123456789")
+WORD = frozenset(b"0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ_")
+HOST_CHARS = frozenset(b"0123456789abcdefghijklmnopqrstuvwxyz.-")
+# what \s matches in ASCII text: \t\n\v\f\r, \x1c-\x1f and the space
+SPACES = frozenset(b" \t\n\r\f\v\x1c\x1d\x1e\x1f")
+DOT = 46
+COLON = 58
+# Bytes checked for non-ASCII content per step, so the check copies little at a time
+ASCII_CHUNK = 1 << 20
+
+
+def parse_header(line: bytes) -> Optional[str]:
+    """
+    Same as NSLOOKUP_LINE_RE.search(line) on a lower-cased ASCII line.
+    Returns the hostname or None.
+    """
+    n = len(line)
+    pos = line.find(HEADER_MARK)
+    while pos != -1:
+        i = pos + len(HEADER_MARK)
+        j = i
+        while j < n and line[j] in SPACES:
+            j += 1
+        if j > i:
+            k = j
+            while k < n and line[k] in HOST_CHARS:
+                k += 1
+            if k > j:
+                m = k
+                while m < n and line[m] in SPACES:
+                    m += 1
+                if m < n and line[m] == COLON:
+                    return line[j:k].decode("ascii")
+        pos = line.find(HEADER_MARK, pos + 1)
+    return None
+
+
+def first_ipv4(line: bytes, start: int = 0) -> Optional[str]:
+    """
+    Same as IPV4_RE.search(line) on an ASCII line, starting at `start`.
+
+    A match starts at a digit that is not preceded by a word character and is
+    four maximal digit runs of 1-3 digits joined by single dots, not followed by
+    a word character.
+    """
+    n = len(line)
+    i = start
+    while i < n:
+        if line[i] in DIGITS and (i == 0 or line[i - 1] not in WORD):
+            j = i
+            end = -1
+            for part in range(4):
+                k = j
+                while k < n and line[k] in DIGITS:
+                    k += 1
+                if not 1 <= k - j <= 3:
+                    break
+                if part < 3:
+                    if k >= n or line[k] != DOT:
+                        break
+                    j = k + 1
+                elif k >= n or line[k] not in WORD:
+                    end = k
+            if end != -1:
+                return line[i:end].decode("ascii")
+        i += 1
+    return None
+
+
+def scan_text_fallback(log_file: Path) -> Dict[str, str]:
+    """Original line-by-line regex scan; used for files with non-ASCII bytes."""
+    ip_to_host: Dict[str, str] = {}
+    current_host: Optional[str] = None
+    with log_file.open("r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            m = NSLOOKUP_LINE_RE.search(line)
+            if m:
+                current_host = m.group(1).strip().lower()
+                continue
+            if not current_host:
+                continue
+            m_ip = IPV4_RE.search(line)
+            if m_ip:
+                ip_to_host.setdefault(m_ip.group(1), current_host)
+    return ip_to_host
+
+
+def is_ascii(mm: mmap.mmap) -> bool:
+    return all(mm[i:i + ASCII_CHUNK].isascii() for i in range(0, len(mm), ASCII_CHUNK))
+
+
+def iter_lines(mm: mmap.mmap) -> Iterator[bytes]:
+    """
+    Lines of a mapped file, split like text mode does (on \n, \r and \r\n;
+    \r\n yields an extra empty line, which never matches anything).
+    """
+    n = len(mm)
+    pos = 0
+    while pos < n:
+        end = mm.find(b"\n", pos)
+        if end == -1:
+            end = n
+        line = mm[pos:end]
+        pos = end + 1
+        if b"\r" in line:
+            yield from line.split(b"\r")
+        else:
+            yield line
+
+
+def scan_lines(lines: Iterator[bytes]) -> Dict[str, str]:
+    """ip -> hostname over the lines of one ASCII log file."""
+    ip_to_host: Dict[str, str] = {}
+    current_host: Optional[str] = None
+    for line in lines:
+        line = line.lower()
+        if HEADER_MARK in line:
+            host = parse_header(line)
+            if host is not None:
+                current_host = host
+                continue
+        if not current_host or line.count(b".") < 3:
+            continue
+
+        start = 0
+        for prefix in PREFIXES:
+            if line.startswith(prefix):
+                start = len(prefix)
+                break
+
+        ip = first_ipv4(line, start)
+        if ip is not None and ip not in ip_to_host:
+            ip_to_host[ip] = current_host
+
+    return ip_to_host
+
+
+def scan_log_file(log_file: Path) -> Dict[str, str]:
+    """
+    Map each IP seen in one log file to the nslookup hostname active at the time.
+    First mapping wins, as in the original scripts.
+    """
+    if log_file.stat().st_size == 0:
+        return {}
+
+    with log_file.open("rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if not is_ascii(mm):
+                return scan_text_fallback(log_file)
+            return scan_lines(iter_lines(mm))
+
+
+def safe_scan_log_file(log_file: Path) -> Dict[str, str]:
+    try:
+        return scan_log_file(log_file)
+    except Exception as e:
+        print(f"WARN: could not read log {log_file}: {e}")
+        return {}
+
+
+def scan_logs_ip_to_host(log_dir: Path, workers: Optional[int] = None,
+                         log_files: Optional[Sequence[Path]] = None) -> Dict[str, str]:
+    """
+    Scan every logs/*.txt file (on the shared pool when workers > 1) and
+    merge the per-file maps in sorted file order, keeping the first hostname
+    for an IP. log_files, when given (e.g. from a capture manifest),
+    replaces the glob.
+    """
+    ip_to_host: Dict[str, str] = {}
+    if log_files is None:
+        if not log_dir.is_dir():
+            return ip_to_host
+        log_files = sorted(log_dir.glob("*.txt"))
+    else:
+        log_files = sorted(log_files)
+    if workers is None:
+        workers = min(len(log_files), os.cpu_count() or 1)
+
+    if workers > 1 and len(log_files) > 1:
+        chunksize = max(1, min(16, len(log_files) // workers))
+        per_file: List[Dict[str, str]] = list(shared_pool().map(safe_scan_log_file, log_files, chunksize=chunksize))
+    else:
+        per_file = [safe_scan_log_file(p) for p in log_files]
+
+    for file_map in per_file:
+        for ip, host in file_map.items():
+            ip_to_host.setdefault(ip, host)
+
+    return ip_to_host
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Per-directory capture manifests.
+
+Every capture writes a manifest.json into its MM_DD_YYYY directory listing
+each file (recursively, e.g. logs/*.txt and regions/*.json) with its size,
+mtime, sha256, payload kind and record count:
+
+  kind     records
+  json     items of a top-level array, or of the largest top-level array
+           value of an object (e.g. "servers"); 1 for other objects
+  ndjson   JSON lines (e.g. Censys output, which uses .json)
+  csv      data lines (the first line is a header / ",0" marker)
+  text     lines
+  binary   -
+
+Readers go through CaptureDir, which answers exists()/glob()/size() from the
+manifest when one is present and falls back to the filesystem otherwise. A
+manifest is only trusted while it lists the files the directory holds: one
+os.scandir per (sub)directory, names only, no stat. A stale manifest (files
+added or removed since it was written) is ignored with a warning; readers
+never rewrite it, that is left to manifest.py and findServerIP.sh, which
+re-hash only the files that changed. Readers skip opening and parsing files
+to count records or hash them.
+
+Writing manifests for existing captures (or refreshing them after more files
+were added, e.g. the nslookup logs):
+
+  python3 manifest.py <date_dir | vendor_dir> [...]
+
+A vendor directory gets a top-level manifest of its own files (the ip,date
+CSV, the Censys output) plus one manifest per date directory.
+"""
+import fnmatch
+import hashlib
+import json
+import os
+import re
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+DATE_DIR_RE = re.compile(r"^\d{2}_\d{2}_\d{4}$")
+HASH_CHUNK = 1 << 20
+
+
+def file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def count_lines(path: Path) -> int:
+    n = 0
+    with path.open("rb") as f:
+        for line in f:
+            if line.strip():
+                n += 1
+    return n
+
+
+def json_records(data: Any) -> int:
+    if isinstance(data, list):
+        return len(data)
+    if isinstance(data, dict):
+        lists = [len(v) for v in data.values() if isinstance(v, list)]
+        return max(lists) if lists else 1
+    return 1
+
+
+def classify(path: Path) -> Tuple[str, Optional[int]]:
+    """(payload kind, record count) of one file."""
+    suffix = path.suffix.lower()
+    if suffix in (".json", ".ndjson", ".jsonl"):
+        try:
+            with path.open("r", encoding="utf-8") as f:
+                return "json", json_records(json.load(f))
+        except Exception:
+            pass
+        try:
+            n = 0
+            with path.open("r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        json.loads(line)
+                        n += 1
+            return "ndjson", n
+        except Exception:
+            return "binary", None
+    if suffix == ".csv":
+        return "csv", max(count_lines(path) - 1, 0)
+    if suffix in (".txt", ".log"):
+        return "text", count_lines(path)
+    return "binary", None
+
+
+def describe_file(path: Path) -> Dict[str, Any]:
+    st = path.stat()
+    kind, records = classify(path)
+    return {
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+        "sha256": file_sha256(path),
+        "kind": kind,
+        "records": records,
+    }
+
+
+def is_manifest_file(name: str) -> bool:
+    """manifest.json itself and the temporary files it is written through."""
+    return name == MANIFEST_NAME or (name.startswith(MANIFEST_NAME + ".") and name.endswith(".tmp"))
+
+
+def scan_files(directory: Path, recursive: bool = True) -> Dict[str, Tuple[int, int]]:
+    """relpath -> (size, mtime_ns) of every file under directory, manifests excluded."""
+    out: Dict[str, Tuple[int, int]] = {}
+    pending = [(directory, "")]
+    while pending:
+        path, prefix = pending.pop()
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.is_dir():
+                    if recursive:
+                        pending.append((Path(entry.path), f"{prefix}{entry.name}/"))
+                elif entry.is_file() and not is_manifest_file(entry.name):
+                    st = entry.stat()
+                    out[prefix + entry.name] = (st.st_size, st.st_mtime_ns)
+    return out
+
+
+def list_names(directory: Path, recursive: bool = True) -> Set[str]:
+    """Relative paths of the files under directory, manifests excluded; no stat per file."""
+    out: Set[str] = set()
+    pending = [(directory, "")]
+    while pending:
+        path, prefix = pending.pop()
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.is_dir():
+                    if recursive:
+                        pending.append((Path(entry.path), f"{prefix}{entry.name}/"))
+                elif entry.is_file() and not is_manifest_file(entry.name):
+                    out.add(prefix + entry.name)
+    return out
+
+
+def build_manifest(directory: Path, recursive: bool = True,
+                   previous: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """
+    Manifest of directory. Entries of previous (an older manifest's files)
+    whose size and mtime still match are kept instead of hashing the file again.
+    """
+    files: Dict[str, Dict[str, Any]] = {}
+    previous = previous or {}
+    for name, (size, mtime_ns) in sorted(scan_files(directory, recursive).items()):
+        old = previous.get(name)
+        if isinstance(old, dict) and (old.get("size"), old.get("mtime_ns")) == (size, mtime_ns):
+            files[name] = old
+            continue
+        p = directory / name
+        try:
+            files[name] = describe_file(p)
+        except OSError as e:
+            print(f"WARN: could not read {p}: {e}")
+    return {
+        "version": MANIFEST_VERSION,
+        "dir": directory.name,
+        "created": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "files": files,
+    }
+
+
+def write_manifest(directory: Path, recursive: bool = True) -> Path:
+    """
+    Build and write directory/manifest.json atomically; returns its path.
+    Entries of the current manifest whose files did not change are kept.
+    """
+    manifest = build_manifest(directory, recursive, load_manifest(directory))
+    out = directory / MANIFEST_NAME
+    tmp = out.with_name(MANIFEST_NAME + ".tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp, out)
+    return out
+
+
+def load_manifest(directory: Path) -> Optional[Dict[str, Dict[str, Any]]]:
+    """relpath -> file entry, or None if the directory has no readable manifest."""
+    try:
+        with (directory / MANIFEST_NAME).open("r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    files = data.get("files") if isinstance(data, dict) else None
+    return files if isinstance(files, dict) else None
+
+
+def list_capture_dirs(base_dir: Path) -> Dict[str, Path]:
+    """MM_DD_YYYY name -> path for every date directory, from one listing of base_dir."""
+    out: Dict[str, Path] = {}
+    with os.scandir(base_dir) as it:
+        for entry in it:
+            if DATE_DIR_RE.match(entry.name) and entry.is_dir():
+                out[entry.name] = Path(entry.path)
+    return out
+
+
+def current_manifest(directory: Path) -> Optional[Dict[str, Dict[str, Any]]]:
+    """
+    The manifest entries of a capture directory, if it has a manifest that
+    lists exactly the files the directory holds; None otherwise.
+    """
+    files = load_manifest(directory)
+    if files is None:
+        return None
+    try:
+        names = list_names(directory)
+    except OSError as e:
+        print(f"WARN: could not list {directory}, ignoring its manifest: {e}")
+        return None
+    if names != files.keys():
+        changed = sorted(names.symmetric_difference(files.keys()))
+        print(f"WARN: {directory / MANIFEST_NAME} is stale ({len(changed)} files added or removed, "
+              f"e.g. {changed[0]}); reading the directory instead (refresh it with manifest.py)")
+        return None
+    return files
+
+
+class CaptureDir:
+    """
+    File lookups for one capture directory: the manifest when present (and
+    current, see current_manifest), the filesystem otherwise. Names are
+    paths relative to the directory.
+    """
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self.files = current_manifest(root)
+
+    @property
+    def has_manifest(self) -> bool:
+        return self.files is not None
+
+    def exists(self, name: str) -> bool:
+        if self.files is not None:
+            return name in self.files
+        return (self.root / name).is_file()
+
+    def glob(self, pattern: str) -> List[Path]:
+        """Sorted files matching pattern; '*' does not cross '/' (like Path.glob)."""
+        if self.files is None:
+            return sorted(p for p in self.root.glob(pattern) if p.is_file())
+        pat_dir, _, pat_name = pattern.rpartition("/")
+        out = []
+        for name in self.files:
+            name_dir, _, base = name.rpartition("/")
+            if fnmatch.fnmatchcase(name_dir, pat_dir) and fnmatch.fnmatchcase(base, pat_name):
+                out.append(self.root / name)
+        return sorted(out)
+
+    def size(self, name: str) -> int:
+        if self.files is not None and name in self.files:
+            return int(self.files[name]["size"])
+        return (self.root / name).stat().st_size
+
+    def sha256(self, name: str) -> str:
+        """Content hash of a file, from the manifest when it lists one."""
+        if self.files is not None and name in self.files and self.files[name].get("sha256"):
+            return self.files[name]["sha256"]
+        return file_sha256(self.root / name)
+
+    def records(self, name: str) -> Optional[int]:
+        if self.files is not None and name in self.files:
+            return self.files[name].get("records")
+        return None
+
+
+def write_manifests(path: Path) -> None:
+    if DATE_DIR_RE.match(path.name):
+        write_manifest(path)
+        print(f"Wrote {path / MANIFEST_NAME}")
+        return
+    write_manifest(path, recursive=False)
+    print(f"Wrote {path / MANIFEST_NAME}")
+    dirs = list_capture_dirs(path)
+    for name in sorted(dirs):
+        write_manifest(dirs[name])
+    print(f"Wrote manifests for {len(dirs)} date directories under {path}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(f"Usage: python3 {sys.argv[0]} <date_dir | vendor_dir> [...]")
+        sys.exit(1)
+    for arg in sys.argv[1:]:
+        write_manifests(Path(arg))
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Keyed NDJSON bundle: many small JSON payloads of one capture in one file.
+
+  <name>.ndjson          one {"key": ..., "value": ...} object per line
+  <name>.ndjson.idx.json {"version": 1, "size": <bundle bytes>,
+                          "entries": {key: [offset, length], ...}}
+
+The bundle is read sequentially by iter_bundle(), with no index needed; the
+index lets BundleReader.get() seek straight to one key's line. A key that is
+written twice keeps its last line in the index (the later file won when the
+payloads were separate files). An index that is missing or does not match the
+bundle size is rebuilt from one scan of the bundle.
+
+A new bundle is written to a temporary name and renamed into place, bundle
+first, so a reader never sees an index for a partial bundle. An appended
+bundle (BundleWriter(path, append=True), for crawls that take hours) is
+written in place instead, each line flushed as it is added, so an
+interrupted crawl keeps every finished key; its index is written on close
+and otherwise rebuilt by the next reader. A torn last line is ignored by the
+readers and cut off by the next append.
+"""
+import json
+import os
+from pathlib import Path
+from typing import IO, Any, Dict, Iterator, List, Optional, Tuple
+
+INDEX_SUFFIX = ".idx.json"
+INDEX_VERSION = 1
+
+# key -> (byte offset, byte length) of its line
+Index = Dict[str, Tuple[int, int]]
+
+
+def index_path(bundle: Path) -> Path:
+    return bundle.with_name(bundle.name + INDEX_SUFFIX)
+
+
+def decode_line(line: bytes) -> Tuple[str, Any]:
+    obj = json.loads(line)
+    return obj["key"], obj["value"]
+
+
+class BundleWriter:
+    """
+    Append (key, value) lines to a new bundle, or with append=True to the
+    end of an existing one, and write its index on close.
+
+      with BundleWriter(date_dir / "countries.ndjson") as bundle:
+          bundle.add("DE", payload)
+    """
+
+    def __init__(self, path: Path, append: bool = False) -> None:
+        self.path = path
+        self.append = append
+        self.index: Index = {}
+        self._tmp = path if append else path.with_name(path.name + ".tmp")
+        self._f: Optional[IO[bytes]] = None
+        self._offset = 0
+
+    def __enter__(self) -> "BundleWriter":
+        if self.append and self.path.is_file():
+            self.index, self._offset = scan_complete(self.path)
+            with self.path.open("r+b") as f:
+                f.truncate(self._offset)
+        self._f = self._tmp.open("ab" if self.append else "wb")
+        return self
+
+    def __exit__(self, exc_type, *exc) -> None:
+        # an appended bundle keeps what was added before the error
+        if exc_type is None or self.append:
+            self.close()
+        else:
+            self.abort()
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.index
+
+    def add(self, key: str, value: Any) -> None:
+        if self._f is None:
+            raise ValueError("bundle is not open")
+        line = json.dumps({"key": key, "value": value}, separators=(",", ":")).encode("utf-8") + b"\n"
+        self._f.write(line)
+        if self.append:
+            self._f.flush()
+        self.index[key] = (self._offset, len(line))
+        self._offset += len(line)
+
+    def close(self) -> None:
+        if self._f is None:
+            return
+        self._f.close()
+        self._f = None
+        if not self.append:
+            os.replace(self._tmp, self.path)
+        write_index(self.path, self.index, self._offset)
+
+    def abort(self) -> None:
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+        self._tmp.unlink(missing_ok=True)
+
+
+def write_index(bundle: Path, index: Index, size: int) -> Path:
+    out = index_path(bundle)
+    tmp = out.with_name(out.name + ".tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        json.dump({"version": INDEX_VERSION, "size": size,
+                   "entries": {k: list(v) for k, v in index.items()}}, f)
+    os.replace(tmp, out)
+    return out
+
+
+def scan_complete(bundle: Path) -> Tuple[Index, int]:
+    """Index of a bundle from one sequential scan, and the size of its complete lines."""
+    index: Index = {}
+    offset = 0
+    with bundle.open("rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break  # a torn last line
+            if line.strip():
+                key, _ = decode_line(line)
+                index[key] = (offset, len(line))
+            offset += len(line)
+    return index, offset
+
+
+def scan_index(bundle: Path) -> Index:
+    """Index of a bundle from one sequential scan."""
+    return scan_complete(bundle)[0]
+
+
+def load_index(bundle: Path) -> Index:
+    """The bundle's index; rebuilt (and rewritten) when missing or stale."""
+    size = bundle.stat().st_size
+    try:
+        with index_path(bundle).open("r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") == INDEX_VERSION and data.get("size") == size:
+            return {k: (int(v[0]), int(v[1])) for k, v in data["entries"].items()}
+    except (OSError, ValueError, KeyError, TypeError, AttributeError):
+        pass
+    index = scan_index(bundle)
+    try:
+        write_index(bundle, index, size)
+    except OSError as e:
+        print(f"WARN: could not write {index_path(bundle)}: {e}")
+    return index
+
+
+def iter_bundle(bundle: Path) -> Iterator[Tuple[str, Any]]:
+    """(key, value) per line, in write order; one sequential read."""
+    with bundle.open("rb") as f:
+        for line in f:
+            if line.endswith(b"\n") and line.strip():
+                yield decode_line(line)
+
+
+class BundleReader:
+    """Random access to a bundle by key."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.index = load_index(path)
+        self._f: Optional[IO[bytes]] = None
+
+    def __enter__(self) -> "BundleReader":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.index
+
+    def keys(self) -> List[str]:
+        return list(self.index)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        entry = self.index.get(key)
+        if entry is None:
+            return default
+        if self._f is None:
+            self._f = self.path.open("rb")
+        offset, length = entry
+        self._f.seek(offset)
+        found, value = decode_line(self._f.read(length))
+        if found != key:
+            raise ValueError(f"{self.path}: index entry for {key!r} points at {found!r}")
+        return value
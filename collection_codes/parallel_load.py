@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Concurrent decode of the payload files of one capture directory.
+
+Several vendors write more than one payload per date (premium and
+non-premium lists, one list per protocol, per-region configs), and the
+loaders used to parse them one after another. load_files() hands every file
+of a date to a small bounded pool and returns the results in the order of
+the paths, so the caller merges them exactly as before:
+
+  non_prem, prem = load_files([date_dir / NON_PREM, date_dir / PREM], load_ip_protocol_names)
+  non_prem, prem = name_masks(non_prem), name_masks(prem)
+
+json.load holds the GIL, so the files are decoded in worker processes (one
+pool shared by the whole run, see shared_pool()) and a date costs about as
+much as its largest file. The loader must therefore be picklable (a
+module-level function, or a functools.partial of one) and return plain data:
+protocol names, not masks. A bit that protocols.protocol_bit() allocates for
+a non-canonical label exists only in the process that allocated it, so
+masks are built from the names in the parent (protocols.name_masks(),
+parse_mask()).
+
+Dates whose files add up to less than PROCESS_MIN_BYTES are decoded on
+threads instead, where shipping the result back costs more than the decode.
+
+Files are submitted largest first, which keeps the slowest file from being
+the last one started.
+"""
+import atexit
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Iterable, List, Optional, TypeVar
+
+V = TypeVar("V")
+
+DEFAULT_WORKERS = 4
+# Below this many bytes per date, threads: pickling the result back costs more than the decode
+PROCESS_MIN_BYTES = 4 << 20
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def file_size(path: Path) -> int:
+    """Size of path; 0 if it is missing, so absent payloads sort last."""
+    try:
+        return path.stat().st_size
+    except OSError:
+        return 0
+
+
+def shared_pool() -> ProcessPoolExecutor:
+    """
+    The process pool of every parallel decode and log scan, started on first
+    use (one worker per CPU). Workers are spawned, not forked: the pool is
+    used from the Prefetcher's threads, and forking a threaded process can
+    leave a lock held in the child.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=os.cpu_count() or 1,
+                                        mp_context=multiprocessing.get_context("spawn"))
+            atexit.register(_pool.shutdown)
+        return _pool
+
+
+def load_files(paths: Iterable[Path], loader: Callable[[Path], V], max_workers: int = DEFAULT_WORKERS,
+               min_process_bytes: int = PROCESS_MIN_BYTES) -> List[V]:
+    """
+    loader(path) for every path, results in the order of paths: on the
+    shared process pool once the files add up to min_process_bytes, on at
+    most max_workers threads below that. A loader exception is raised here.
+    """
+    paths = list(paths)
+    if len(paths) < 2 or max_workers < 2:
+        return [loader(p) for p in paths]
+
+    sizes = [file_size(p) for p in paths]
+    order = sorted(range(len(paths)), key=lambda i: sizes[i], reverse=True)
+
+    thread_pool: Optional[ThreadPoolExecutor] = None
+    if sum(sizes) >= min_process_bytes:
+        executor: Executor = shared_pool()
+    else:
+        executor = thread_pool = ThreadPoolExecutor(max_workers=min(max_workers, len(paths)))
+    try:
+        futures = {i: executor.submit(loader, paths[i]) for i in order}
+        return [futures[i].result() for i in range(len(paths))]
+    finally:
+        if thread_pool is not None:
+            thread_pool.shutdown(wait=True)
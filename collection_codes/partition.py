@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Date-range and vendor partition pruning shared by the pipeline scripts.
+
+Every stage accepts the same flags:
+
+  --since DATE     first capture date to process (inclusive)
+  --until DATE     last capture date to process (inclusive)
+  --vendor NAME    only process this vendor (repeatable)
+
+DATE may be MM/DD/YYYY (as in the input CSVs), MM_DD_YYYY (as the date
+directories are named) or YYYY-MM-DD. Scripts check the partition before
+opening anything: a vendor that is not selected exits right away, input rows
+outside the window are dropped as they are read, and only date directories
+inside the window are loaded. With no flags everything is processed, exactly
+as before; with a date window, rows whose date cannot be parsed are dropped.
+"""
+import argparse
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+DATE_FORMATS = ("%m/%d/%Y", "%m_%d_%Y", "%Y-%m-%d")
+
+
+def parse_date(value: str) -> Optional[date]:
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value.strip(), fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def date_arg(value: str) -> date:
+    d = parse_date(value)
+    if d is None:
+        raise argparse.ArgumentTypeError(f"invalid date '{value}' (expected MM/DD/YYYY, MM_DD_YYYY or YYYY-MM-DD)")
+    return d
+
+
+class Partition:
+    """A vendor selection and an inclusive date window; None means unbounded."""
+
+    def __init__(self, since: Optional[date] = None, until: Optional[date] = None,
+                 vendors: Optional[Iterable[str]] = None) -> None:
+        if since and until and since > until:
+            raise ValueError(f"--since {since} is after --until {until}")
+        self.since = since
+        self.until = until
+        self.vendors: Optional[Set[str]] = set(vendors) if vendors else None
+        self._date_cache: Dict[str, bool] = {}
+
+    @property
+    def has_window(self) -> bool:
+        return self.since is not None or self.until is not None
+
+    def describe(self) -> str:
+        parts = []
+        if self.since:
+            parts.append(f"since {self.since.isoformat()}")
+        if self.until:
+            parts.append(f"until {self.until.isoformat()}")
+        if self.vendors:
+            parts.append("vendors " + ",".join(sorted(self.vendors)))
+        return ", ".join(parts) if parts else "everything"
+
+    def wants_vendor(self, vendor: str) -> bool:
+        return self.vendors is None or vendor in self.vendors
+
+    def wants_day(self, d: date) -> bool:
+        if self.since and d < self.since:
+            return False
+        if self.until and d > self.until:
+            return False
+        return True
+
+    def wants_date(self, value: str) -> bool:
+        """
+        True if a date string (MM/DD/YYYY or MM_DD_YYYY) is inside the window.
+        Each distinct string is parsed once.
+        """
+        if not self.has_window:
+            return True
+        keep = self._date_cache.get(value)
+        if keep is None:
+            d = parse_date(value)
+            keep = d is not None and self.wants_day(d)
+            self._date_cache[value] = keep
+        return keep
+
+    def filter_rows(self, rows: Iterable[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        """Keep (date_str, ip) rows inside the window."""
+        if not self.has_window:
+            return list(rows)
+        return [row for row in rows if self.wants_date(row[0])]
+
+
+def add_partition_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--since", type=date_arg, default=None,
+                        help="first date to process, inclusive (MM/DD/YYYY, MM_DD_YYYY or YYYY-MM-DD)")
+    parser.add_argument("--until", type=date_arg, default=None,
+                        help="last date to process, inclusive")
+    parser.add_argument("--vendor", action="append", default=None, metavar="NAME",
+                        help="only process this vendor, e.g. com.nordvpn.android (repeatable)")
+
+
+def partition_from_args(args: argparse.Namespace) -> Partition:
+    try:
+        return Partition(args.since, args.until, args.vendor)
+    except ValueError as e:
+        raise SystemExit(str(e))
+
+
+def parse_partition_args(description: str = "", argv: Optional[Sequence[str]] = None) -> Partition:
+    """Parse just the partition flags (for scripts that take no other arguments)."""
+    parser = argparse.ArgumentParser(description=description)
+    add_partition_args(parser)
+    return partition_from_args(parser.parse_args(argv))
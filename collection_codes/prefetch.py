@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Bounded background prefetch of per-date inputs for the attribution scripts.
+
+Each script alternates between loading one date (disk reads, JSON decode, log
+scans) and joining that date's rows. Prefetcher keeps the next `depth` dates
+loading on a background pool while the current one is being joined and
+written, so I/O and compute overlap without holding more than depth + 1
+parsed dates in memory.
+"""
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, Generic, Hashable, Iterable, List, Optional, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+DEFAULT_DEPTH = 1
+
+
+class Prefetcher(Generic[K, V]):
+    """
+    Load keys in order on a background pool, at most `depth` ahead of the
+    consumer.
+
+      with Prefetcher(date_dirs, load_date_maps, depth=2) as pf:
+          for date_dir in date_dirs:
+              maps = pf.get(date_dir)
+
+    get() may be called in any order; a key that was not prefetched is loaded
+    on demand. Use processes=True only for CPU-bound loaders whose result is
+    plain data (no protocol masks: bits allocated by protocol_bit() in a
+    worker process are unknown to the parent); the loader and its result must
+    then be picklable (a module-level function).
+    """
+
+    def __init__(self, keys: Iterable[K], loader: Callable[[K], V],
+                 depth: int = DEFAULT_DEPTH, processes: bool = False) -> None:
+        if depth < 0:
+            raise ValueError("depth must be >= 0")
+        self.keys: List[K] = list(keys)
+        self.loader = loader
+        self.depth = depth
+        self.processes = processes
+        self._index: Dict[K, int] = {k: i for i, k in enumerate(self.keys)}
+        self._futures: Dict[K, Future] = {}
+        self._next = 0
+        self._executor: Optional[Executor] = None
+
+    def __enter__(self) -> "Prefetcher[K, V]":
+        if self.depth > 0:
+            pool = ProcessPoolExecutor if self.processes else ThreadPoolExecutor
+            self._executor = pool(max_workers=self.depth)
+            self._fill()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        for fut in self._futures.values():
+            fut.cancel()
+        self._futures.clear()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def _fill(self) -> None:
+        while (self._executor is not None and len(self._futures) < self.depth
+               and self._next < len(self.keys)):
+            key = self.keys[self._next]
+            self._next += 1
+            if key not in self._futures:
+                self._futures[key] = self._executor.submit(self.loader, key)
+
+    def get(self, key: K) -> V:
+        fut = self._futures.pop(key, None)
+        idx = self._index.get(key)
+        if idx is not None:
+            self._next = max(self._next, idx + 1)
+        self._fill()
+        if fut is None:
+            return self.loader(key)
+        return fut.result()
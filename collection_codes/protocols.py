@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Shared protocol taxonomy and compact keys for the attribution maps.
+
+Attribution maps used to be Dict[str, Set[str]]: one IP string and one small
+set of protocol strings per server. Here every protocol name is a bit in an
+int mask, and IPs are packed into ints, so a map becomes Dict[int, int] and
+set unions become a bitwise OR.
+
+The canonical protocols get fixed bits. Vendor labels outside that list
+(the normalizers keep unknown labels) are given the next free bit the first
+time they are seen. Masks are only meaningful inside the process that built
+them, so convert back to names with protocol_names()/format_mask() before
+handing them to another process or writing them out.
+"""
+import socket
+import threading
+from typing import Dict, Iterable, List, Mapping, Optional, TypeVar, Union
+
+# Bit order is fixed for the canonical names; do not reorder.
+CANONICAL_PROTOCOLS = (
+    "openvpn",
+    "wireguard",
+    "ikev2",
+    "shadowsocks",
+    "nordwhisper",
+    "xray",
+    "proxy",
+    "socks",
+    "ipsec",
+    "udp",
+    "tcp",
+    "dtls",
+    "shadowsocksr",
+    "v2ray",
+    "vmess",
+)
+
+PROTOCOL_BITS: Dict[str, int] = {name: 1 << i for i, name in enumerate(CANONICAL_PROTOCOLS)}
+BIT_NAMES: Dict[int, str] = {bit: name for name, bit in PROTOCOL_BITS.items()}
+# Serialises the allocation of new bits; loaders call protocol_bit() from threads
+_BIT_LOCK = threading.Lock()
+
+# mask -> "a,b,c" (sorted names), filled lazily; distinct masks are few
+FORMAT_CACHE: Dict[int, str] = {0: ""}
+# the reverse, for names coming from another process or a file
+PARSE_CACHE: Dict[str, int] = {"": 0}
+
+IPV6_TAG = 1 << 128
+
+IPKey = Union[int, str]
+K = TypeVar("K")
+
+
+def protocol_bit(name: Optional[str]) -> int:
+    """Bit for one protocol name; unknown names get a new bit. None/'' -> 0."""
+    if not name:
+        return 0
+    bit = PROTOCOL_BITS.get(name)
+    if bit is not None:
+        return bit
+    with _BIT_LOCK:
+        bit = PROTOCOL_BITS.get(name)
+        if bit is None:
+            bit = 1 << len(PROTOCOL_BITS)
+            # name the bit before publishing it, so any mask holding it formats
+            BIT_NAMES[bit] = name
+            PROTOCOL_BITS[name] = bit
+    return bit
+
+
+def protocol_mask(names: Iterable[Optional[str]]) -> int:
+    mask = 0
+    for name in names:
+        mask |= protocol_bit(name)
+    return mask
+
+
+def protocol_names(mask: int) -> List[str]:
+    """Sorted protocol names for a mask."""
+    names: List[str] = []
+    while mask:
+        low = mask & -mask
+        names.append(BIT_NAMES[low])
+        mask ^= low
+    names.sort()
+    return names
+
+
+def format_mask(mask: int) -> str:
+    """Same string as ','.join(sorted(names)) for the equivalent name set."""
+    out = FORMAT_CACHE.get(mask)
+    if out is None:
+        out = ",".join(protocol_names(mask))
+        FORMAT_CACHE[mask] = out
+    return out
+
+
+def parse_mask(names: str) -> int:
+    """Mask of a format_mask() string ("a,b,c"), built with this process's bits."""
+    mask = PARSE_CACHE.get(names)
+    if mask is None:
+        mask = protocol_mask(names.split(","))
+        PARSE_CACHE[names] = mask
+    return mask
+
+
+def mask_names(masks: Mapping[K, int]) -> Dict[K, str]:
+    """key -> format_mask() string, to hand a mask map to another process."""
+    return {key: format_mask(mask) for key, mask in masks.items()}
+
+
+def name_masks(names: Mapping[K, str]) -> Dict[K, int]:
+    """The inverse of mask_names(), in the receiving process."""
+    return {key: parse_mask(value) for key, value in names.items()}
+
+
+def pack_ip(ip: str) -> IPKey:
+    """
+    Pack an IP string into an int key:
+      IPv4 -> 0 .. 2**32 - 1
+      IPv6 -> IPV6_TAG | 128-bit value (only for the canonical spelling)
+    Anything else (or a non-canonical IPv6 spelling) is kept as the string,
+    so lookups match exactly the strings they matched before.
+    """
+    try:
+        return int.from_bytes(socket.inet_pton(socket.AF_INET, ip), "big")
+    except OSError:
+        pass
+    try:
+        packed = socket.inet_pton(socket.AF_INET6, ip)
+    except OSError:
+        return ip
+    if socket.inet_ntop(socket.AF_INET6, packed) != ip:
+        return ip
+    return IPV6_TAG | int.from_bytes(packed, "big")
+
+
+def unpack_ip(key: IPKey) -> str:
+    if isinstance(key, str):
+        return key
+    if key >= IPV6_TAG:
+        return socket.inet_ntop(socket.AF_INET6, (key ^ IPV6_TAG).to_bytes(16, "big"))
+    return socket.inet_ntop(socket.AF_INET, key.to_bytes(4, "big"))
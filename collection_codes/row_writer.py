@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Shared output stage for the attribution scripts.
+
+RowWriter takes rows as they are produced and writes them in batches. With
+sort=True the output is sorted with a bounded-memory external merge sort:
+rows are buffered up to max_rows_in_memory, each full buffer is sorted and
+spilled to a temporary run file, and the runs are merged with heapq.merge
+when the writer is closed. The sort is stable, so rows with equal keys keep
+the order they were written in.
+
+An output path ending in .gz is written gzip-compressed.
+
+Rows go to a temporary file next to the output, which replaces it only when
+the writer is closed without an error: an exception leaves the previous
+output (if any) in place instead of a partial CSV.
+
+Rows must be sequences of strings (they round-trip through CSV run files).
+"""
+import csv
+import gzip
+import heapq
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, Callable, IO, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+DEFAULT_BATCH_SIZE = 10_000
+DEFAULT_MAX_ROWS_IN_MEMORY = 1_000_000
+
+Row = Tuple[str, ...]
+
+
+def open_text(path: Path, mode: str = "r") -> IO[str]:
+    """Open a CSV for text reading/writing, gzip-compressed if path ends in .gz."""
+    if path.suffix == ".gz":
+        return gzip.open(path, mode + "t", encoding="utf-8", newline="")
+    return path.open(mode, encoding="utf-8", newline="")
+
+
+def partial_path(path: Path) -> Path:
+    """Temporary name of an output being written (same suffix, so .gz stays compressed)."""
+    return path.with_name(f"{path.stem}.tmp{path.suffix}")
+
+
+def read_run(path: Path) -> Iterator[Row]:
+    with path.open("r", encoding="utf-8", newline="") as f:
+        for row in csv.reader(f):
+            yield tuple(row)
+
+
+class RowWriter:
+    """
+    Batched (optionally externally sorted) CSV writer.
+
+      with RowWriter(OUT_CSV, ["date", "ip", "protocols"], sort=True) as out:
+          out.write((date_str, ip, prots))
+
+    key works as in sorted(); by default whole rows are compared.
+    """
+
+    def __init__(self, path: Path, header: Optional[Sequence[str]] = None, sort: bool = False,
+                 key: Optional[Callable[[Row], Any]] = None,
+                 batch_size: int = DEFAULT_BATCH_SIZE,
+                 max_rows_in_memory: int = DEFAULT_MAX_ROWS_IN_MEMORY,
+                 tmp_dir: Optional[Path] = None) -> None:
+        if batch_size < 1 or max_rows_in_memory < 1:
+            raise ValueError("batch_size and max_rows_in_memory must be >= 1")
+        self.path = path
+        self.header = header
+        self.sort = sort
+        self.key = key
+        self.batch_size = batch_size
+        self.max_rows_in_memory = max_rows_in_memory
+        self.tmp_dir = tmp_dir
+        self.rows_written = 0
+        self._buffer: List[Row] = []
+        self._runs: List[Path] = []
+        self._tmp: Optional[tempfile.TemporaryDirectory] = None
+        self._out: Optional[IO[str]] = None
+        self._writer: Any = None
+
+    def __enter__(self) -> "RowWriter":
+        self._out = open_text(partial_path(self.path), "w")
+        self._writer = csv.writer(self._out)
+        if self.header is not None:
+            self._writer.writerow(self.header)
+        return self
+
+    def __exit__(self, exc_type, *exc) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self._cleanup(keep=False)
+
+    @property
+    def n_runs(self) -> int:
+        return len(self._runs)
+
+    def write(self, row: Sequence[str]) -> None:
+        self._buffer.append(tuple(row))
+        if self.sort:
+            if len(self._buffer) >= self.max_rows_in_memory:
+                self._spill()
+        elif len(self._buffer) >= self.batch_size:
+            self._flush()
+
+    def write_many(self, rows: Iterable[Sequence[str]]) -> None:
+        for row in rows:
+            self.write(row)
+
+    def _flush(self) -> None:
+        self._writer.writerows(self._buffer)
+        self.rows_written += len(self._buffer)
+        self._buffer = []
+
+    def _spill(self) -> None:
+        if self._tmp is None:
+            self._tmp = tempfile.TemporaryDirectory(prefix="rows_", dir=self.tmp_dir)
+        self._buffer.sort(key=self.key)
+        run_path = Path(self._tmp.name) / f"run_{len(self._runs):05d}.csv"
+        with run_path.open("w", encoding="utf-8", newline="") as f:
+            csv.writer(f).writerows(self._buffer)
+        self._runs.append(run_path)
+        self._buffer = []
+
+    def _write_sorted(self, rows: Iterable[Row]) -> None:
+        batch: List[Row] = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                self._writer.writerows(batch)
+                self.rows_written += len(batch)
+                batch = []
+        self._writer.writerows(batch)
+        self.rows_written += len(batch)
+
+    def close(self) -> None:
+        if self._out is None:
+            return
+        done = False
+        try:
+            if not self.sort:
+                self._flush()
+            else:
+                self._buffer.sort(key=self.key)
+                if not self._runs:
+                    self._write_sorted(self._buffer)
+                else:
+                    # in-memory rows were written last, so they go last for stability
+                    runs = [read_run(p) for p in self._runs]
+                    self._write_sorted(heapq.merge(*runs, self._buffer, key=self.key))
+                self._buffer = []
+            done = True
+        finally:
+            self._cleanup(keep=done)
+
+    def _cleanup(self, keep: bool) -> None:
+        """Close the output; keep moves it into place, otherwise it is removed."""
+        if self._out is not None:
+            self._out.close()
+            self._out = None
+            if keep:
+                os.replace(partial_path(self.path), self.path)
+            else:
+                partial_path(self.path).unlink(missing_ok=True)
+        if self._tmp is not None:
+            self._tmp.cleanup()
+            self._tmp = None
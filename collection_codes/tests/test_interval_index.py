@@ -0,0 +1,84 @@
+import io
+import sys
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from interval_index import IntervalIndex, dirname_to_ordinal, load_or_build_index
+from protocols import pack_ip, protocol_bit
+
+OPENVPN = protocol_bit("openvpn")
+WIREGUARD = protocol_bit("wireguard")
+
+# date dir -> ip -> mask; 11_03 is missing, 11_05 has no usable capture
+CAPTURES = {
+    "11_01_2025": {"10.0.0.1": OPENVPN},
+    "11_02_2025": {"10.0.0.1": OPENVPN},
+    "11_04_2025": {"10.0.0.1": WIREGUARD, "10.0.0.2": OPENVPN},
+    "11_05_2025": None,
+    "11_06_2025": {"10.0.0.1": WIREGUARD},
+}
+
+
+def day(name):
+    return dirname_to_ordinal(name)
+
+
+class IntervalIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.base = Path(self.tmp.name)
+        for name in CAPTURES:
+            (self.base / name).mkdir()
+        self.loaded = []
+
+    def loader(self, date_dir):
+        self.loaded.append(date_dir.name)
+        capture = CAPTURES[date_dir.name]
+        if capture is None:
+            return None
+        return [(pack_ip(ip), mask) for ip, mask in capture.items()]
+
+    def build(self, first=None, last=None):
+        with redirect_stdout(io.StringIO()):
+            return load_or_build_index(self.base / "index.json", self.base, self.loader, "test", first, last)
+
+    def test_runs_and_lookups(self):
+        index = IntervalIndex.build(self.base, self.loader)
+        self.assertEqual(index.lookup_range("10.0.0.1", day("11_01_2025"), day("11_06_2025")),
+                         [(day("11_01_2025"), day("11_02_2025"), OPENVPN),
+                          (day("11_04_2025"), day("11_06_2025"), WIREGUARD)])
+        self.assertEqual(index.lookup("10.0.0.2", day("11_04_2025")), OPENVPN)
+        self.assertEqual(index.lookup("10.0.0.2", day("11_06_2025")), 0)
+        self.assertIsNone(index.lookup("10.0.0.1", day("11_03_2025")))
+        # a tie between 11_02 and 11_04 goes to the earlier capture
+        self.assertEqual(index.lookup("10.0.0.1", day("11_03_2025"), 1), OPENVPN)
+        self.assertFalse(index.captured_on(day("11_05_2025")))
+        self.assertEqual(index.lookup("10.0.0.1", day("11_05_2025"), 1), WIREGUARD)
+
+    def test_saved_index_is_reused_for_a_narrower_window(self):
+        self.build()
+        self.loaded.clear()
+        index = self.build(day("11_04_2025"), day("11_06_2025"))
+        self.assertEqual(self.loaded, [])
+        self.assertEqual(index.lookup("10.0.0.1", day("11_01_2025")), OPENVPN)
+
+    def test_window_build_and_rebuild(self):
+        self.build(day("11_04_2025"), None)
+        self.assertEqual(self.loaded, ["11_04_2025", "11_05_2025", "11_06_2025"])
+        self.loaded.clear()
+        # a wider window than the saved index covers
+        self.build()
+        self.assertEqual(len(self.loaded), len(CAPTURES))
+        self.loaded.clear()
+        (self.base / "11_02_2025" / "late.json").write_text("[]")
+        self.build(day("11_01_2025"), day("11_02_2025"))
+        self.assertEqual(self.loaded, ["11_01_2025", "11_02_2025"])
+
+
+if __name__ == "__main__":
+    unittest.main()
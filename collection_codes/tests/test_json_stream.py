@@ -0,0 +1,109 @@
+import io
+import json
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import json_stream
+from json_stream import build_value, find_all_by_key, iter_items, iter_values_by_key, parse_events
+
+DOCS = [
+    {"servers": [{"ip": "10.0.0.1", "name": "de-1", "load": 12.5, "tags": []},
+                 {"ip": "10.0.0.2", "name": "de-2é\\\"quoted\"", "ok": True, "extra": None}],
+     "meta": {"ip": "not-a-server", "n": -12345678901234567890, "exp": 1.5e-7}},
+    [{"ip": "::1", "nested": [[{"ip": "1.2.3.4"}], {}], "long": "x" * 300}],
+    {"DE": ["1.1.1.1", "2.2.2.2"], "FR": [], "emoji": "\U0001f600 \\u0041"},
+    "just a string",
+    0,
+    [],
+]
+# chunk sizes that cut tokens, escapes and surrogate pairs at every position
+CHUNK_SIZES = (1, 2, 3, 7, 64)
+
+
+def events_value(text, chunk_size):
+    events = parse_events(io.StringIO(text), chunk_size)
+    _, event, value = next(events)
+    return build_value(events, event, value)
+
+
+class ParseEventsTest(unittest.TestCase):
+    def test_matches_json_loads(self):
+        for doc in DOCS:
+            for text in (json.dumps(doc), json.dumps(doc, indent=2), json.dumps(doc, ensure_ascii=False)):
+                for chunk_size in CHUNK_SIZES:
+                    with self.subTest(text=text[:30], chunk_size=chunk_size):
+                        self.assertEqual(events_value(text, chunk_size), json.loads(text))
+
+    def test_prefixes(self):
+        text = '{"a": [1, {"b": null}], "c": true}'
+        self.assertEqual(list(parse_events(io.StringIO(text), 2)), [
+            ("", "start_map", None),
+            ("", "map_key", "a"),
+            ("a", "start_array", None),
+            ("a.item", "number", 1),
+            ("a.item", "start_map", None),
+            ("a.item", "map_key", "b"),
+            ("a.item.b", "null", None),
+            ("a.item", "end_map", None),
+            ("a", "end_array", None),
+            ("", "map_key", "c"),
+            ("c", "boolean", True),
+            ("", "end_map", None),
+        ])
+
+    def test_literals_across_chunks(self):
+        text = '[-Infinity, Infinity, false, null, 10, 1e3]'
+        for chunk_size in CHUNK_SIZES:
+            self.assertEqual(events_value(text, chunk_size), [float("-inf"), float("inf"), False, None, 10, 1000.0])
+
+    def test_malformed(self):
+        for text in ('{"a": 1', '[1, 2,]', '{"a" 1}', '[1] 2', '{"a": tru}', '"open'):
+            for chunk_size in (1, 64):
+                with self.subTest(text=text, chunk_size=chunk_size):
+                    with self.assertRaises(ValueError):
+                        list(parse_events(io.StringIO(text), chunk_size))
+
+
+class StreamedFileTest(unittest.TestCase):
+    """The streamed paths of iter_items / iter_values_by_key against the json.load ones."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.paths = []
+        for i, doc in enumerate(DOCS):
+            path = Path(self.tmp.name) / f"doc_{i}.json"
+            path.write_text(json.dumps(doc), encoding="utf-8")
+            self.paths.append(path)
+
+    def streamed(self, chunk_size):
+        def open_events(path):
+            f = path.open("r", encoding="utf-8")
+            return f, parse_events(f, chunk_size)
+        return mock.patch.multiple(json_stream, STREAM_MIN_BYTES=0, open_events=open_events)
+
+    def test_values_by_key(self):
+        for path, doc in zip(self.paths, DOCS):
+            expected = list(find_all_by_key(doc, "ip"))
+            self.assertEqual(list(iter_values_by_key(path, "ip")), expected)
+            for chunk_size in CHUNK_SIZES:
+                with self.subTest(path=path.name, chunk_size=chunk_size), self.streamed(chunk_size):
+                    self.assertEqual(list(iter_values_by_key(path, "ip")), expected)
+
+    def test_items(self):
+        for item_path in ("servers.item", "servers.item.ip", "item.nested.item.item", "*.item", "*", ""):
+            for path in self.paths:
+                expected = list(iter_items(path, item_path))
+                for chunk_size in (1, 7):
+                    with self.subTest(item_path=item_path, path=path.name, chunk_size=chunk_size), \
+                            self.streamed(chunk_size):
+                        self.assertEqual(list(iter_items(path, item_path)), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import random
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from logscan import scan_log_file, scan_logs_ip_to_host, scan_text_fallback
+
+SAMPLE = (
+    "Logging every 10 seconds for 3600 seconds...\n"
+    "[2025-11-07 10:00:00] nslookup result for DE-FRA.Example.com:\n"
+    "Server:\t\t127.0.0.53\n"
+    "Address:\t127.0.0.53#53\n"
+    "\n"
+    "Non-authoritative answer:\n"
+    "Name:\tde-fra.example.com\n"
+    "Address: 185.1.2.3\n"
+    "[2025-11-07 10:00:00] Resolved IP: 185.1.2.3\n"
+    "[2025-11-07 10:00:10] nslookup result for us-nyc.example.com :\r\n"
+    "Address: 10.0.0.1\r\n"
+    "Address: 1234.5.6.7 and 9.8.7.6\r"
+    "Address: 1.2.3.4.5\n"
+    "x1.2.3.4 _5.6.7.8 (11.12.13.14)\n"
+)
+
+
+class LogScanTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name, data):
+        path = self.dir / name
+        path.write_bytes(data if isinstance(data, bytes) else data.encode("ascii"))
+        return path
+
+    def assert_same(self, path):
+        self.assertEqual(scan_log_file(path), scan_text_fallback(path))
+
+    def test_sample(self):
+        path = self.write("a.txt", SAMPLE)
+        result = scan_log_file(path)
+        self.assertEqual(result, scan_text_fallback(path))
+        self.assertEqual(result["185.1.2.3"], "de-fra.example.com")
+        self.assertEqual(result["10.0.0.1"], "us-nyc.example.com")
+
+    def test_separator_whitespace(self):
+        # \s also matches \x1c-\x1f, which text mode does not split lines on
+        for ch in "\x1c\x1d\x1e\x1f\x0b\x0c":
+            path = self.write("b.txt", f"nslookup result for{ch}host{ch}:\nAddress:{ch}1.2.3.4\n")
+            self.assert_same(path)
+            self.assertEqual(scan_log_file(path), {"1.2.3.4": "host"})
+
+    def test_non_ascii_falls_back(self):
+        path = self.write("c.txt", "nslookup result for hé.example:\nAddress: 1.2.3.4\n".encode("utf-8"))
+        self.assert_same(path)
+
+    def test_random_logs(self):
+        rng = random.Random(1)
+        alphabet = ["nslookup result for", "NSLookup Result For", "address:", "server:", " ", "\t", ":",
+                    ".", "-", "_", "\x1c", "\x1f", "\x0b", "\r", "\r\n", "\n", "a", "Z", "host", "1", "12",
+                    "123", "1234", "255.255.255.255", "0.0.0.0"]
+        for i in range(300):
+            text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 200)))
+            path = self.write(f"r{i}.txt", text)
+            self.assertEqual(scan_log_file(path), scan_text_fallback(path), repr(text))
+
+    def test_merge_keeps_first_file(self):
+        self.write("1.txt", "nslookup result for first:\nAddress: 1.1.1.1\n")
+        self.write("2.txt", "nslookup result for second:\nAddress: 1.1.1.1\nAddress: 2.2.2.2\n")
+        expected = {"1.1.1.1": "first", "2.2.2.2": "second"}
+        self.assertEqual(scan_logs_ip_to_host(self.dir, workers=1), expected)
+        self.assertEqual(scan_logs_ip_to_host(self.dir, workers=2), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from parallel_load import load_files
+from protocols import format_mask, mask_names, name_masks, pack_ip, protocol_mask
+
+
+def load_names(path: Path):
+    """ip -> protocol names of a test payload, with the pid that decoded it."""
+    with path.open("r", encoding="utf-8") as f:
+        servers = json.load(f)
+    masks = {pack_ip(s["ip"]): protocol_mask(s["protocols"]) for s in servers}
+    return os.getpid(), mask_names(masks)
+
+
+class LoadFilesTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.payloads = [
+            [{"ip": "10.0.0.1", "protocols": ["openvpn", "test-worker-only-a"]}],
+            [{"ip": "10.0.0.2", "protocols": ["test-worker-only-b"]}, {"ip": "::1", "protocols": ["wireguard"]}],
+            [],
+        ]
+        self.paths = []
+        for i, servers in enumerate(self.payloads):
+            path = Path(self.tmp.name) / f"servers_{i}.json"
+            path.write_text(json.dumps(servers), encoding="utf-8")
+            self.paths.append(path)
+
+    def check(self, results):
+        self.assertEqual(len(results), len(self.payloads))
+        for (_, names), servers in zip(results, self.payloads):
+            masks = name_masks(names)
+            expected = {pack_ip(s["ip"]): ",".join(sorted(s["protocols"])) for s in servers}
+            self.assertEqual({key: format_mask(mask) for key, mask in masks.items()}, expected)
+
+    def test_threads_below_threshold(self):
+        results = load_files(self.paths, load_names)
+        self.assertEqual({pid for pid, _ in results}, {os.getpid()})
+        self.check(results)
+
+    def test_processes_return_names_readable_in_parent(self):
+        results = load_files(self.paths, load_names, min_process_bytes=0)
+        self.assertNotIn(os.getpid(), {pid for pid, _ in results})
+        self.check(results)
+
+
+if __name__ == "__main__":
+    unittest.main()
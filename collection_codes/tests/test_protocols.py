@@ -0,0 +1,60 @@
+import sys
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import protocols
+from protocols import BIT_NAMES, PROTOCOL_BITS, format_mask, protocol_bit, protocol_mask
+
+
+class SlowBits(dict):
+    """Widens the window between reading the bit count and storing a new bit."""
+
+    def __len__(self):
+        time.sleep(0.001)
+        return super().__len__()
+
+
+class ProtocolBitTest(unittest.TestCase):
+    def test_canonical_bits_are_stable(self):
+        self.assertEqual(protocol_bit("openvpn"), PROTOCOL_BITS["openvpn"])
+        self.assertEqual(protocol_bit(""), 0)
+        self.assertEqual(protocol_bit(None), 0)
+
+    def test_concurrent_allocation(self):
+        names = [f"test-proto-{i}" for i in range(40)]
+        threads = 16
+        barrier = threading.Barrier(threads)
+        seen = [None] * threads
+        slow = SlowBits(PROTOCOL_BITS)
+
+        def work(slot):
+            barrier.wait()
+            # every thread asks for every name, in a different order
+            order = names[slot:] + names[:slot]
+            seen[slot] = {name: protocol_bit(name) for name in order}
+
+        with mock.patch.object(protocols, "PROTOCOL_BITS", slow):
+            workers = [threading.Thread(target=work, args=(i,)) for i in range(threads)]
+            for w in workers:
+                w.start()
+            for w in workers:
+                w.join()
+        PROTOCOL_BITS.update(slow)
+
+        for bits in seen[1:]:
+            self.assertEqual(bits, seen[0])
+        bits = list(seen[0].values())
+        self.assertEqual(len(set(bits)), len(names))
+        for name, bit in seen[0].items():
+            self.assertEqual(bin(bit).count("1"), 1)
+            self.assertEqual(BIT_NAMES[bit], name)
+        self.assertEqual(format_mask(protocol_mask(names)), ",".join(sorted(names)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+import gzip
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from row_writer import RowWriter, partial_path
+
+
+class RowWriterTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.dir = Path(self.tmp.name)
+
+    def test_external_sort_is_stable(self):
+        path = self.dir / "out.csv"
+        with RowWriter(path, ["k", "v"], sort=True, key=lambda r: r[0], max_rows_in_memory=2) as out:
+            out.write_many([("b", "1"), ("a", "1"), ("b", "2"), ("a", "2"), ("a", "3")])
+            self.assertEqual(out.n_runs, 2)
+        self.assertEqual(path.read_text(encoding="utf-8").split(), ["k,v", "a,1", "a,2", "a,3", "b,1", "b,2"])
+
+    def test_output_replaced_only_on_success(self):
+        path = self.dir / "out.csv"
+        path.write_text("old\n", encoding="utf-8")
+        with self.assertRaises(RuntimeError):
+            with RowWriter(path, ["ip"], batch_size=1) as out:
+                out.write(("10.0.0.1",))
+                self.assertTrue(partial_path(path).exists())
+                raise RuntimeError("loader failed")
+        self.assertEqual(path.read_text(encoding="utf-8"), "old\n")
+        self.assertFalse(partial_path(path).exists())
+        with RowWriter(path, ["ip"]) as out:
+            out.write(("10.0.0.1",))
+        self.assertEqual(path.read_text(encoding="utf-8").split(), ["ip", "10.0.0.1"])
+        self.assertEqual(sorted(p.name for p in self.dir.iterdir()), ["out.csv"])
+
+    def test_gzip_output(self):
+        path = self.dir / "out.csv.gz"
+        self.assertEqual(partial_path(path).name, "out.csv.tmp.gz")
+        with RowWriter(path, ["ip"]) as out:
+            out.write(("10.0.0.1",))
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            self.assertEqual(f.read().split(), ["ip", "10.0.0.1"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,29 +1,95 @@
+import argparse
 import csv
-import json
-import requests
 import time
 from datetime import datetime
 import os
 import sys
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "collection_codes"))
+from partition import add_partition_args, partition_from_args
+from censys_client import (DEFAULT_BATCH_SIZE, DEFAULT_CONCURRENCY, DEFAULT_RATE, MAX_BATCH_SIZE, CensysClient,
+                           RateController, fetch_all)
+from censys_retry import DEFAULT_MAX_ATTEMPTS, RetryQueue, is_retryable
+from censys_checkpoint import NOT_FOUND, SAVED, Checkpoint, split_done
+from censys_cache import (DEFAULT_BUCKET_DAYS, DEFAULT_CACHE_DIR, DEFAULT_MAX_AGE_DAYS, DEFAULT_MAX_MB,
+                          SnapshotCache)
+from censys_window import DEFAULT_WINDOW_DAYS, window_lookups, write_row_map
+from censys_plan import (DEFAULT_STALE_DAYS, NEW, PlanState, count_reasons, plan_changes,
+                         read_declared_protocols, select_lookups)
+from censys_schedule import USAGE_NAME, Budget, UsageLedger, prioritize, tier_counts, write_deferred
+from censys_store import (FORMATS, PROJECTED_NAME, SUFFIXES, RecordStore, block_ending_at, ensure_index,
+                          project_services, records_within, require_format)
+
+parser = argparse.ArgumentParser(description="Fetch Censys host snapshots for the (ip, date) pairs of a CSV.")
+parser.add_argument("filename", help="path without extension: reads <filename>.csv, writes <filename>.json")
+parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                    help=f"requests in flight at once (default {DEFAULT_CONCURRENCY})")
+parser.add_argument("--rate", type=float, default=DEFAULT_RATE,
+                    help=f"starting request rate per second, the plan's quota (default {DEFAULT_RATE})")
+parser.add_argument("--max-rate", type=float, default=None,
+                    help="ceiling the rate may grow to while responses succeed (default: --rate)")
+parser.add_argument("--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS,
+                    help=f"attempts per failed or throttled lookup before it is given up (default {DEFAULT_MAX_ATTEMPTS})")
+parser.add_argument("--resume", action="store_true",
+                    help="keep the output of an earlier run and skip the lookups it finished (see <filename>.done)")
+parser.add_argument("--cache-dir", type=Path, default=DEFAULT_CACHE_DIR,
+                    help=f"snapshot cache shared by all vendors (default $CENSYS_CACHE_DIR or {DEFAULT_CACHE_DIR})")
+parser.add_argument("--no-cache", action="store_true", help="always fetch from the API")
+parser.add_argument("--cache-max-age", type=float, default=DEFAULT_MAX_AGE_DAYS,
+                    help=f"days a cached snapshot stays fresh (default {DEFAULT_MAX_AGE_DAYS:g})")
+parser.add_argument("--cache-max-mb", type=int, default=DEFAULT_MAX_MB,
+                    help=f"cache size kept after a run, least recently used evicted first (default {DEFAULT_MAX_MB})")
+parser.add_argument("--cache-bucket-days", type=int, default=DEFAULT_BUCKET_DAYS,
+                    help=f"lookups of an IP within one bucket of this many days share a snapshot (default {DEFAULT_BUCKET_DAYS})")
+parser.add_argument("--window-days", type=int, default=DEFAULT_WINDOW_DAYS,
+                    help=f"one snapshot per IP per this many days of its dates (default {DEFAULT_WINDOW_DAYS}: every date)")
+parser.add_argument("--changed-only", action="store_true",
+                    help="only look up IPs that are new, changed protocols or went stale since the last run "
+                         "(see <filename>.state.json; implies --resume)")
+parser.add_argument("--protocols", type=Path, default=None,
+                    help="date,ip,protocols CSV of the vendor's ip_to_protocol.py, for --changed-only")
+parser.add_argument("--stale-days", type=float, default=DEFAULT_STALE_DAYS,
+                    help=f"--changed-only refreshes IPs last answered this many days ago (default {DEFAULT_STALE_DAYS:g})")
+parser.add_argument("--budget", type=int, default=None,
+                    help="host lookups this run may send to the API; the rest are deferred (default: no limit)")
+parser.add_argument("--daily-budget", type=int, default=None,
+                    help="host lookups all runs sharing --cache-dir may send per UTC day (default: no limit)")
+parser.add_argument("--output-format", choices=FORMATS, default="ndjson",
+                    help="ndjson (default) or one gzip/zstd frame per record, in <filename>.json[.gz|.zst] "
+                         "with an ip index in <output>.idx")
+parser.add_argument("--project", action="store_true",
+                    help=f"also write <filename>.{PROJECTED_NAME}.json[.gz|.zst] with only ip and services[] "
+                         "port/protocol/labels/ike")
+parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                    help=f"hosts per request through the multi-host endpoint, at most {MAX_BATCH_SIZE} "
+                         f"(default {DEFAULT_BATCH_SIZE}: one request per host)")
+add_partition_args(parser)
+args = parser.parse_args()
+if args.changed_only:
+    args.resume = True
+partition = partition_from_args(args)
 
 API_TOKEN = os.environ["CENSYS_API_TOKEN"]
 ORG_ID = os.environ["CENSYS_ORG_ID"]
 
-if len(sys.argv) < 2:
-    print(f"Usage: python3 {sys.argv[0]} <filename>")
-    exit(1)
-
-base_path = sys.argv[1]
+base_path = args.filename
 INPUT_CSV = f"{base_path}.csv"
-OUTPUT_FILE = f"{base_path}.json"
-
-BASE_URL = "https://api.platform.censys.io/v3/global/asset/host/{ip}"
-
-HEADERS = {
-    "Authorization": f"Bearer {API_TOKEN}",
-    "X-Organization-ID": f"{ORG_ID}",
-    "Accept": "application/vnd.censys.api.v3.host.v1+json"
-}
+OUTPUT_FILE = f"{base_path}.json{SUFFIXES[args.output_format]}"
+# the fields analyze.ipynb reads, with --project
+PROJECTED_FILE = f"{base_path}.{PROJECTED_NAME}.json{SUFFIXES[args.output_format]}"
+# failed/throttled lookups still to retry, kept across runs
+RETRY_FILE = f"{base_path}.retry.jsonl"
+# lookups with a saved snapshot or a 404, for --resume
+DONE_FILE = f"{base_path}.done"
+# (ip, date) row -> the snapshot lookup answering it
+MAP_FILE = f"{base_path}.snapshots.csv"
+# per-IP protocols and answer time of the previous run, for --changed-only
+STATE_FILE = f"{base_path}.state.json"
+# lookups left unsent when the budget ran out
+DEFERRED_FILE = f"{base_path}.deferred.csv"
+# vendor = file name, e.g. data/com.nordvpn.android/com.nordvpn.android -> com.nordvpn.android
+VENDOR = os.path.basename(base_path.rstrip("/"))
 
 def format_date_rfc3339(date_str):
     try:
@@ -35,6 +101,24 @@ def format_date_rfc3339(date_str):
         return None
 
 def main():
+    if not partition.wants_vendor(VENDOR):
+        print(f"Skipping {VENDOR}: not selected by --vendor")
+        return
+    if partition.has_window:
+        print(f"Partition: {partition.describe()}")
+    if args.concurrency < 1 or args.rate <= 0:
+        raise SystemExit("--concurrency must be >= 1 and --rate > 0")
+    if args.cache_bucket_days < 1 or args.window_days < 1:
+        raise SystemExit("--cache-bucket-days and --window-days must be >= 1")
+    if (args.budget is not None and args.budget < 0) or (args.daily_budget is not None and args.daily_budget < 0):
+        raise SystemExit("--budget and --daily-budget must be >= 0")
+    if not 1 <= args.batch_size <= MAX_BATCH_SIZE:
+        raise SystemExit(f"--batch-size must be between 1 and {MAX_BATCH_SIZE}")
+    try:
+        require_format(args.output_format)
+    except RuntimeError as e:
+        raise SystemExit(str(e))
+
     unique_entries = set()
 
     with open(INPUT_CSV, newline="", encoding="utf-8-sig") as f:
@@ -43,45 +127,198 @@ def main():
             if len(row) >= 2:
                 ip = row[0].strip()
                 raw_date = row[1].strip()
-                if ip and raw_date:
+                if ip and raw_date and partition.wants_date(raw_date):
                     unique_entries.add((ip, raw_date))
 
     print(f"Found {len(unique_entries)} unique IP/date pairs.")
 
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as out:
-        for idx, (ip, raw_date) in enumerate(unique_entries, 1):
-            rfc_date = format_date_rfc3339(raw_date)
-            if not rfc_date:
-                continue
+    row_map = window_lookups(unique_entries, args.window_days, format_date_rfc3339)
+    # deterministic order: a resumed run picks up where the last one stopped
+    lookups = sorted(set(row_map.values()), key=lambda key: (key[1], key[0]))
+    all_lookups = lookups
+    if args.window_days > 1:
+        print(f"{len(lookups)} lookups cover them with a {args.window_days}-day window.")
+
+    checkpoint = Checkpoint(Path(DONE_FILE))
+    store = RecordStore(Path(OUTPUT_FILE), args.output_format)
+    projected = RecordStore(Path(PROJECTED_FILE), args.output_format) if args.project else None
+    if args.resume:
+        checkpoint.load()
+        try:
+            ensure_index(Path(OUTPUT_FILE))
+        except RuntimeError as e:
+            raise SystemExit(str(e))
+        # a crash while the last block's lookups were being recorded: fetch that block again
+        start, in_block = block_ending_at(Path(OUTPUT_FILE), checkpoint.end)
+        if checkpoint.last_saved < in_block:
+            checkpoint.rewind(start)
+        dropped = checkpoint.truncate_output(Path(OUTPUT_FILE))
+        if dropped:
+            print(f"Dropped {dropped} bytes written to {OUTPUT_FILE} after the last checkpoint.")
+        keep = records_within(Path(OUTPUT_FILE), checkpoint.end)
+        store.open(keep)
+        if projected is not None:
+            projected.open(keep)
+            if projected.records + projected.buffered < keep:
+                print(f"WARN: {PROJECTED_FILE} holds {projected.records} of the {keep} records already saved")
+    else:
+        checkpoint.reset()
+        store.open()
+        if projected is not None:
+            projected.open()
+
+    state = None
+    refresh = []
+    # IPs an earlier run has answered, for the priority tiers
+    known_ips = {ip for ip, _ in checkpoint.done}
+    # ip -> time of this run's snapshot or 404
+    answered = {}
+    if args.changed_only:
+        state = PlanState(Path(STATE_FILE), VENDOR).load()
+        known_ips = set(state.ips)
+        declared = read_declared_protocols(args.protocols) if args.protocols else None
+        now = time.time()
+        reasons = plan_changes({ip for ip, _ in lookups}, state, declared, args.stale_days * 86400, now)
+        print(f"Plan: {len(reasons)} of {len({ip for ip, _ in lookups})} IPs to look up ({count_reasons(reasons)}).")
+        lookups, refresh = select_lookups(lookups, reasons, checkpoint)
+        if refresh:
+            print(f"Refreshing the latest lookup of {len(refresh)} changed or stale IPs.")
+        # new IPs whose lookups an earlier run already finished start their staleness clock now
+        pending_ips = {ip for ip, _ in lookups}
+        answered.update((ip, now) for ip, reason in reasons.items() if reason == NEW and ip not in pending_ips)
+        lookups += refresh
+    elif args.resume:
+        lookups, skipped = split_done(lookups, checkpoint)
+        if skipped:
+            print(f"Resuming: {skipped} lookups already done "
+                  f"({checkpoint.saved} snapshots, {checkpoint.not_found} not found in total).")
+
+    retry = RetryQueue(Path(RETRY_FILE), args.max_attempts)
+    # lookups left over by an interrupted run, inside the current partition
+    wanted = set(lookups)
+    carried = [key for key in retry.pending()
+               if key not in wanted and key not in checkpoint and partition.wants_date(key[1][:10])]
+    if carried:
+        print(f"Retrying {len(carried)} lookups left in {RETRY_FILE} by an earlier run.")
+        lookups.extend(carried)
+    # the retry drain stays within this run's lookups
+    scope = wanted.union(carried)
 
-            print(f"[{idx}/{len(unique_entries)}] Fetching {ip} at {rfc_date}...")
+    cache = None
+    if not args.no_cache:
+        cache = SnapshotCache(args.cache_dir, args.cache_max_age, args.cache_max_mb << 20, args.cache_bucket_days)
 
-            params = {"at_time": rfc_date}
+    budget = Budget(args.budget, args.daily_budget, UsageLedger(args.cache_dir / USAGE_NAME))
+    deferred = []
 
-            resp = requests.get(
-                BASE_URL.format(ip=ip),
-                headers=HEADERS,
-                params=params
-            )
+    client = CensysClient(API_TOKEN, ORG_ID)
+    controller = RateController(args.rate, args.max_rate)
+    done = 0
+    total = len(lookups)
 
-            if resp.status_code == 200:
-                out.write(json.dumps(resp.json()) + "\n")
+    with client, store, retry, checkpoint:
+        def record_saved(saved):
+            """Checkpoint the lookups whose snapshots just reached the disk."""
+            if not saved:
+                return
+            # the projected records of a checkpointed block are on disk too
+            if projected is not None:
+                projected.flush()
+            checkpoint.record_all(SAVED, saved, store.size)
+
+        def on_result(lookup, result):
+            nonlocal done
+            done += 1
+            ip, rfc_date = lookup
+            if result.cached:
+                print(f"[{done}/{total}] Cached {ip} at {rfc_date}")
+            else:
+                print(f"[{done}/{total}] Fetched {ip} at {rfc_date} ({result.elapsed:.2f}s)")
+                if cache is not None:
+                    cache.put(lookup, result)
+
+            if result.ok and result.body is not None:
+                if projected is not None:
+                    projected.write(ip, project_services(result.body))
+                # recorded once the snapshot's block is on disk: a crash in between refetches it
+                record_saved(store.write(ip, result.body, lookup))
+                answered[ip] = time.time()
+                retry.resolve(lookup)
                 print(" -> snapshot saved (includes ports/services)")
-            elif resp.status_code == 404:
+            elif result.status == 404:
+                checkpoint.record(NOT_FOUND, lookup, store.size)
+                answered[ip] = time.time()
+                retry.resolve(lookup)
                 print(" -> host not found at that time")
-            elif resp.status_code == 429:
-                print(" -> rate limited — sleeping 60s")
-                time.sleep(60)
+            elif is_retryable(result):
+                if retry.push(lookup, result):
+                    print(f" -> {result.status or 'connection error'}, queued for retry")
+                else:
+                    print(f" -> {result.status or 'connection error'}, giving up after {args.max_attempts} attempts")
             else:
-                try:
-                    print(" -> error", resp.status_code, resp.json())
-                except:
-                    print(" -> error", resp.status_code, resp.text)
+                print(" -> error", result.status, result.body if result.body is not None else result.error)
+
+        try:
+            if cache is not None:
+                hits, lookups = cache.split(lookups)
+                for lookup, result in hits:
+                    on_result(lookup, result)
+
+            queue = prioritize(lookups, all_lookups, set(refresh), known_ips, checkpoint.done, SAVED)
+            if queue:
+                print(f"Queued {len(queue)} lookups: {tier_counts(queue)}.")
+            lookups, _ = budget.take([key for _, key in queue])
+            deferred = queue[len(lookups):]
+            total = done + len(lookups)
 
-            time.sleep(1)
+            # throttled lookups go through the retry queue, which counts their attempts
+            fetch_all(lookups, client.fetch, controller, args.concurrency, on_result, throttle_retries=0,
+                      fetch_batch=client.fetch_batch, batch_size=args.batch_size)
 
+            # drain the retry queue before exiting
+            while True:
+                wait = retry.seconds_until_next(scope)
+                if wait is None or budget.exhausted:
+                    break
+                if wait > 0:
+                    print(f"{len(retry.pending(scope))} lookups waiting for retry, next in {wait:.0f}s")
+                    time.sleep(wait)
+                due, _ = budget.take(retry.due(scope))
+                total += len(due)
+                fetch_all(due, client.fetch, controller, args.concurrency, on_result, throttle_retries=0,
+                          fetch_batch=client.fetch_batch, batch_size=args.batch_size)
+        finally:
+            # the last, partly filled block
+            record_saved(store.flush())
+
+        given_up = [r for r in retry.given_up() if (r["ip"], r["at_time"]) in scope]
+        retry.compact()
+    if projected is not None:
+        projected.close()
+
+    statuses = {SAVED: "saved", NOT_FOUND: "not_found"}
+    write_row_map(MAP_FILE, row_map, lambda lookup: statuses.get(checkpoint.status(lookup), ""))
+    if state is not None:
+        state.update({ip for ip, _ in row_map}, declared or {}, answered)
+        state.save()
+
+    print(controller.describe())
+    if cache is not None:
+        print(cache.describe())
+        removed, freed = cache.evict()
+        if removed:
+            print(f"Evicted {removed} cache entries ({freed >> 20} MB) to stay under {args.cache_max_mb} MB.")
+    if given_up:
+        print(f"{len(given_up)} lookups were given up; they stay in {RETRY_FILE} for the next run.")
+    print(budget.describe())
+    write_deferred(DEFERRED_FILE, deferred)
+    if deferred:
+        print(f"Budget exhausted: deferred {len(deferred)} lookups ({tier_counts(deferred)}), "
+              f"listed in {DEFERRED_FILE}; run again with --resume to continue.")
+    waiting = retry.pending(scope)
+    if budget.exhausted and waiting:
+        print(f"{len(waiting)} lookups still wait for a retry in {RETRY_FILE}.")
     print("Done.")
 
 if __name__ == "__main__":
     main()
-
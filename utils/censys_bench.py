@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark of the Censys fetch loop against censys_standin.py.
+
+Starts a stand-in on a free local port (or uses --url), looks up --hosts
+synthetic IPs through CensysClient and fetch_all() with the given
+concurrency and rate, and reports the completion time, requests per second
+and the outcome counts. Every stand-in fault flag is accepted, e.g.
+
+  python3 censys_bench.py --hosts 2000 --concurrency 16 --rate 200 --latency 50 --jitter 20
+  python3 censys_bench.py --hosts 500 --concurrency 8 --rate 100 --quota 40 --error-rate 0.02
+"""
+import argparse
+import ipaddress
+import threading
+import time
+from typing import Dict, List, Sequence, Tuple
+
+from censys_client import (DEFAULT_BATCH_SIZE, DEFAULT_CONCURRENCY, CensysClient, FetchResult, Lookup,
+                           RateController, fetch_all)
+from censys_standin import add_standin_args, base_url, serve, standin_from_args
+
+DEFAULT_HOSTS = 1000
+FIRST_IP = ipaddress.IPv4Address("10.0.0.1")
+AT_TIME = "2025-01-01T23:59:59Z"
+
+
+def synthetic_lookups(n: int) -> List[Lookup]:
+    return [(str(FIRST_IP + i), AT_TIME) for i in range(n)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the Censys fetch loop against a local stand-in.")
+    parser.add_argument("--hosts", type=int, default=DEFAULT_HOSTS, help=f"lookups to run (default {DEFAULT_HOSTS})")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--rate", type=float, default=100.0, help="starting request rate per second (default 100)")
+    parser.add_argument("--max-rate", type=float, default=None)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="hosts per request")
+    parser.add_argument("--url", default=None,
+                        help="benchmark a running stand-in, e.g. http://127.0.0.1:8080/v3/global/asset/host/{ip}")
+    add_standin_args(parser)
+    args = parser.parse_args()
+
+    server = None
+    url = args.url
+    if url is None:
+        server = serve(standin_from_args(args))
+        url = base_url(server)
+
+    client = CensysClient("bench", "bench", base_url=url)
+    controller = RateController(args.rate, args.max_rate)
+    counts: Dict[str, int] = {}
+    latencies: List[float] = []
+    requests_sent = 0
+    lock = threading.Lock()
+
+    # fetch and fetch_batch run on the worker threads
+    def fetch(ip: str, at_time: str) -> FetchResult:
+        nonlocal requests_sent
+        with lock:
+            requests_sent += 1
+        return client.fetch(ip, at_time)
+
+    def fetch_batch(ips: Sequence[str], at_time: str) -> Tuple[FetchResult, Dict[str, FetchResult]]:
+        nonlocal requests_sent
+        with lock:
+            requests_sent += 1
+        return client.fetch_batch(ips, at_time)
+
+    def on_result(lookup: Lookup, result: FetchResult) -> None:
+        key = str(result.status or "error")
+        counts[key] = counts.get(key, 0) + 1
+        latencies.append(result.elapsed)
+
+    lookups = synthetic_lookups(args.hosts)
+    start = time.monotonic()
+    with client:
+        fetch_all(lookups, fetch, controller, args.concurrency, on_result,
+                  fetch_batch=fetch_batch, batch_size=args.batch_size)
+    elapsed = time.monotonic() - start
+
+    if server is not None:
+        server.shutdown()
+
+    latencies.sort()
+    print(f"{len(lookups)} lookups against {url}")
+    print(f"  completion time  {elapsed:.2f} s")
+    print(f"  requests         {requests_sent} ({requests_sent / elapsed:.1f} req/s)")
+    print(f"  lookups/s        {len(lookups) / elapsed:.1f}")
+    if latencies:
+        print(f"  latency p50/p95  {latencies[len(latencies) // 2] * 1000:.1f} / "
+              f"{latencies[int(len(latencies) * 0.95)] * 1000:.1f} ms")
+    print(f"  outcomes         {', '.join(f'{k}: {v}' for k, v in sorted(counts.items()))}")
+    print(f"  {controller.describe()}")
+
+
+if __name__ == "__main__":
+    main()
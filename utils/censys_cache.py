@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Compressed on-disk cache of Censys host snapshots, shared by every vendor.
+
+The same IP shows up in several vendors' CSVs (and in reruns of one vendor),
+and each censys3.py run used to fetch its snapshot again. Lookups now go
+through a SnapshotCache first; only misses reach the API.
+
+Entries are keyed by (ip, bucket of at_time): with bucket_days=1 (the
+default) every lookup of an IP on the same day shares one entry, wider
+buckets let nearby dates share a snapshot too. One gzip'd JSON file per
+entry, sharded by IP:
+
+  <cache>/<ip>/<bucket start YYYY-MM-DD>.json.gz
+      {"ip": ..., "at_time": ..., "status": 200 | 404, "fetched_at": <epoch>, "body": ...}
+
+Both snapshots and 404s are cached. An entry is fresh while it is younger
+than max_age and was fetched after the at_time it answers (a snapshot taken
+before the end of its day may still change). Files are written to a temp
+name and renamed, so several runs can share the directory; a hit refreshes
+the file's mtime and evict() removes the least recently used files until
+the cache fits in max_bytes.
+"""
+import gzip
+import json
+import os
+import time
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from censys_client import FetchResult, Lookup
+
+DEFAULT_CACHE_DIR = Path(os.environ.get("CENSYS_CACHE_DIR", "~/.cache/censys")).expanduser()
+DEFAULT_MAX_AGE_DAYS = 30.0
+DEFAULT_MAX_MB = 1024
+DEFAULT_BUCKET_DAYS = 1
+CACHED_STATUSES = (200, 404)
+SUFFIX = ".json.gz"
+EPOCH = date(1970, 1, 1)
+
+
+def parse_at_time(at_time: str) -> Optional[datetime]:
+    try:
+        return datetime.strptime(at_time, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc)
+    except ValueError:
+        return None
+
+
+def bucket_start(day: date, bucket_days: int) -> date:
+    """First day of the bucket_days-wide bucket (counted from the epoch) holding day."""
+    n = (day - EPOCH).days
+    return EPOCH + timedelta(days=n - n % bucket_days)
+
+
+class SnapshotCache:
+    """(ip, at_time bucket) -> FetchResult of a 200 or 404 lookup."""
+
+    def __init__(self, root: Path = DEFAULT_CACHE_DIR, max_age_days: float = DEFAULT_MAX_AGE_DAYS,
+                 max_bytes: int = DEFAULT_MAX_MB << 20, bucket_days: int = DEFAULT_BUCKET_DAYS,
+                 clock: Callable[[], float] = time.time) -> None:
+        if bucket_days < 1:
+            raise ValueError("bucket_days must be >= 1")
+        self.root = root
+        self.max_age = max_age_days * 86400
+        self.max_bytes = max_bytes
+        self.bucket_days = bucket_days
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    def entry_path(self, lookup: Lookup) -> Optional[Path]:
+        ip, at_time = lookup
+        when = parse_at_time(at_time)
+        if when is None or not ip or "/" in ip or ip.startswith("."):
+            return None
+        start = bucket_start(when.date(), self.bucket_days)
+        return self.root / ip / f"{start.isoformat()}{SUFFIX}"
+
+    def fresh(self, entry: Dict[str, Any]) -> bool:
+        fetched_at = entry.get("fetched_at")
+        if not isinstance(fetched_at, (int, float)) or self.clock() - fetched_at > self.max_age:
+            return False
+        when = parse_at_time(entry.get("at_time", ""))
+        return when is not None and fetched_at >= when.timestamp()
+
+    def get(self, lookup: Lookup) -> Optional[FetchResult]:
+        path = self.entry_path(lookup)
+        entry = None
+        if path is not None:
+            try:
+                with gzip.open(path, "rt", encoding="utf-8") as f:
+                    entry = json.load(f)
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError, EOFError) as e:
+                print(f"WARN: dropping unreadable cache entry {path}: {e}")
+                path.unlink(missing_ok=True)
+        if not isinstance(entry, dict) or entry.get("status") not in CACHED_STATUSES or not self.fresh(entry):
+            self.misses += 1
+            return None
+        self.hits += 1
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return FetchResult(entry["status"], entry.get("body"), cached=True)
+
+    def put(self, lookup: Lookup, result: FetchResult) -> None:
+        """Store a snapshot or a 404; other outcomes are not cached."""
+        path = self.entry_path(lookup)
+        if path is None or result.status not in CACHED_STATUSES or result.cached:
+            return
+        if result.status == 200 and result.body is None:
+            return
+        entry = {"ip": lookup[0], "at_time": lookup[1], "status": result.status,
+                 "fetched_at": self.clock(), "body": result.body}
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        try:
+            with gzip.open(tmp, "wt", encoding="utf-8") as f:
+                json.dump(entry, f)
+            os.replace(tmp, path)
+            self.stores += 1
+        except OSError as e:
+            print(f"WARN: could not write cache entry {path}: {e}")
+            tmp.unlink(missing_ok=True)
+
+    def _entries(self) -> List[Tuple[float, int, Path]]:
+        """(mtime, size, path) of every entry file."""
+        out = []
+        if not self.root.is_dir():
+            return out
+        with os.scandir(self.root) as shards:
+            for shard in shards:
+                if not shard.is_dir():
+                    continue
+                with os.scandir(shard.path) as files:
+                    for entry in files:
+                        if entry.name.endswith(SUFFIX):
+                            st = entry.stat()
+                            out.append((st.st_mtime, st.st_size, Path(entry.path)))
+        return out
+
+    def evict(self) -> Tuple[int, int]:
+        """Drop the least recently used entries beyond max_bytes; returns (files, bytes) removed."""
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        removed = freed = 0
+        for _, size, path in sorted(entries, key=lambda e: e[0]):
+            if total <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+            freed += size
+            try:
+                path.parent.rmdir()
+            except OSError:
+                pass  # the shard still holds other buckets
+        return removed, freed
+
+    def split(self, lookups: List[Lookup]) -> Tuple[List[Tuple[Lookup, FetchResult]], List[Lookup]]:
+        """(cached (lookup, result) pairs, lookups to fetch)."""
+        hits, misses = [], []
+        for lookup in lookups:
+            result = self.get(lookup)
+            if result is None:
+                misses.append(lookup)
+            else:
+                hits.append((lookup, result))
+        return hits, misses
+
+    def describe(self) -> str:
+        return f"cache {self.root}: {self.hits} hits, {self.misses} misses, {self.stores} stored"
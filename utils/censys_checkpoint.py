@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+On-disk checkpoint of the (ip, at_time) lookups a Censys run has finished.
+
+censys3.py appends every snapshot to the output (see censys_store.py) and
+records the lookup in <base>.done, one tab-separated line per finished key,
+once the block holding its snapshot is on disk:
+
+  S<TAB>ip<TAB>at_time<TAB>end   snapshot written; output is `end` bytes long
+  N<TAB>ip<TAB>at_time<TAB>end   host not found at that time (404)
+
+With --resume the keys are loaded into a dict, so each finished lookup is
+skipped with one membership test, and the output is truncated to the last
+recorded end: a snapshot written just before a crash but not recorded (or
+still buffered in an unwritten block, or a torn last line) is dropped and
+fetched again, never duplicated. The lines of one block are written
+together; if a crash still leaves fewer of them than the block holds
+records, rewind() forgets them and the block is dropped and fetched again.
+Without --resume both files start empty, as the output always did.
+"""
+from pathlib import Path
+from typing import IO, Dict, List, Optional, Sequence, Tuple
+
+from censys_client import Lookup
+
+SAVED = "S"
+NOT_FOUND = "N"
+
+
+class Checkpoint:
+    """Finished lookups of one output file."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        # lookup -> SAVED | NOT_FOUND
+        self.done: Dict[Lookup, str] = {}
+        self.saved = 0
+        self.not_found = 0
+        self.end = 0
+        self._f: Optional[IO[str]] = None
+        # snapshots recorded with the last end (one block), and where their lines start
+        self._tail: List[Lookup] = []
+        self._tail_at = 0
+
+    def __enter__(self) -> "Checkpoint":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self.done)
+
+    def __contains__(self, lookup: Lookup) -> bool:
+        return lookup in self.done
+
+    def status(self, lookup: Lookup) -> Optional[str]:
+        return self.done.get(lookup)
+
+    def close(self) -> None:
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+    def load(self) -> None:
+        """Read the finished keys of an earlier run."""
+        if not self.path.exists():
+            return
+        offset = 0
+        with self.path.open("rb") as f:
+            for raw in f:
+                line_at, offset = offset, offset + len(raw)
+                parts = raw.decode("utf-8", "replace").rstrip("\n").split("\t")
+                if len(parts) != 4 or parts[0] not in (SAVED, NOT_FOUND) or not parts[3].isdigit():
+                    continue  # a torn last line
+                lookup, end = (parts[1], parts[2]), int(parts[3])
+                self._add(parts[0], lookup)
+                if end != self.end or not self._tail:
+                    self._tail, self._tail_at = [], line_at
+                if parts[0] == SAVED:
+                    self._tail.append(lookup)
+                self.end = end
+
+    @property
+    def last_saved(self) -> int:
+        """Snapshots recorded with the last end."""
+        return len(self._tail)
+
+    def rewind(self, end: int) -> None:
+        """
+        Forget the snapshots recorded with the last end, and go back to end:
+        their block is on disk but not all of its lookups were recorded.
+        """
+        for lookup in self._tail:
+            if self.done.get(lookup) == SAVED:
+                del self.done[lookup]
+                self.saved -= 1
+        self.close()
+        with self.path.open("r+b") as f:
+            f.truncate(self._tail_at)
+        self._tail = []
+        self.end = end
+
+    def reset(self) -> None:
+        """Forget every finished key (a run without --resume)."""
+        self.close()
+        self.path.unlink(missing_ok=True)
+        self.done.clear()
+        self._tail = []
+        self.saved = self.not_found = self.end = 0
+
+    def truncate_output(self, output: Path) -> int:
+        """Cut output back to the last recorded end; returns the bytes dropped."""
+        if not output.exists():
+            return 0
+        size = output.stat().st_size
+        if size <= self.end:
+            return 0
+        with output.open("r+b") as f:
+            f.truncate(self.end)
+        return size - self.end
+
+    def _add(self, status: str, lookup: Lookup) -> None:
+        """The last record of a lookup wins: a refresh can turn a 404 into a snapshot."""
+        previous = self.done.get(lookup)
+        if previous == status:
+            return
+        if previous == SAVED:
+            self.saved -= 1
+        elif previous == NOT_FOUND:
+            self.not_found -= 1
+        self.done[lookup] = status
+        if status == SAVED:
+            self.saved += 1
+        else:
+            self.not_found += 1
+
+    def record(self, status: str, lookup: Lookup, end: int) -> None:
+        """Mark a lookup finished; end is the output size once its snapshot (if any) is flushed."""
+        self.record_all(status, [lookup], end)
+
+    def record_all(self, status: str, lookups: Sequence[Lookup], end: int) -> None:
+        """Mark the lookups of one block finished, in a single write."""
+        if not lookups:
+            return
+        if self._f is None:
+            self._f = self.path.open("a", encoding="utf-8")
+        self._f.write("".join(f"{status}\t{ip}\t{at_time}\t{end}\n" for ip, at_time in lookups))
+        self._f.flush()
+        for lookup in lookups:
+            self._add(status, lookup)
+        self.end = end
+
+
+def split_done(lookups: Sequence[Lookup], checkpoint: Checkpoint) -> Tuple[List[Lookup], int]:
+    """(lookups still to fetch, number skipped as already finished)."""
+    todo = [key for key in lookups if key not in checkpoint]
+    return todo, len(lookups) - len(todo)
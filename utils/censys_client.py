@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+Censys host lookups for censys3.py: the HTTP client, an adaptive rate
+controller and a bounded concurrent fetch loop.
+
+censys3.py used to fetch one (ip, date) at a time with a fixed one second
+sleep and a blind 60 s sleep on 429. fetch_all() instead keeps up to
+`concurrency` requests in flight (asyncio on the main thread, the blocking
+requests calls on a thread pool) and paces request starts with a
+RateController:
+
+  - it starts at the plan's quota (--rate, requests per second),
+  - every successful response adds `increase` req/s per second of traffic
+    (additive increase), up to max_rate,
+  - a 429 halves the rate (multiplicative decrease, down to min_rate) and
+    pauses every worker for the Retry-After delay,
+  - X-RateLimit-* / RateLimit-* headers reporting an exhausted window pause
+    the workers until the window resets.
+
+Throttled lookups are retried in the same run (at most throttle_retries
+times each, MAX_THROTTLE_RETRIES by default); every other outcome is handed
+to the caller's callback.
+
+Each worker thread keeps one requests.Session, so lookups reuse a pooled
+keep-alive connection instead of opening one per IP. With batch_size > 1,
+lookups of the same at_time are sent batch_size hosts per request to the
+platform's multi-host endpoint (GET .../asset/host?host_ids=...&at_time=...)
+and the response is split back into one single-host record per IP. A host
+missing from it is not taken as a 404 (the request may have been cut short):
+it is looked up again on its own, and that answer is the one reported.
+"""
+import asyncio
+import ipaddress
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+import requests
+
+# CENSYS_BASE_URL points the client elsewhere, e.g. at censys_standin.py
+BASE_URL = os.environ.get("CENSYS_BASE_URL", "https://api.platform.censys.io/v3/global/asset/host/{ip}")
+ACCEPT = "application/vnd.censys.api.v3.host.v1+json"
+
+DEFAULT_RATE = 1.0          # requests per second, the old fixed pacing
+DEFAULT_CONCURRENCY = 1
+MIN_RATE = 0.05
+RATE_INCREASE = 0.1         # req/s gained per second of successful traffic
+RATE_DECREASE = 0.5         # factor applied on every 429
+# Pause on a 429 that carries no Retry-After
+DEFAULT_RETRY_AFTER = 10.0
+MAX_RETRY_AFTER = 3600.0
+MAX_THROTTLE_RETRIES = 5
+REQUEST_TIMEOUT = 60
+DEFAULT_BATCH_SIZE = 1
+# host_ids per multi-host request accepted by the platform
+MAX_BATCH_SIZE = 100
+
+# (ip, at_time)
+Lookup = Tuple[str, str]
+
+
+class FetchResult:
+    """Outcome of one lookup: HTTP status (0 on a transport error), decoded body, headers."""
+
+    def __init__(self, status: int, body: Any = None, headers: Optional[Mapping[str, str]] = None,
+                 error: str = "", elapsed: float = 0.0, cached: bool = False) -> None:
+        self.status = status
+        self.body = body
+        self.headers: Mapping[str, str] = headers or {}
+        self.error = error
+        self.elapsed = elapsed
+        # served from censys_cache.SnapshotCache, not the API
+        self.cached = cached
+
+    @property
+    def ok(self) -> bool:
+        return self.status == 200
+
+    @property
+    def throttled(self) -> bool:
+        return self.status == 429
+
+
+def normalize_ip(ip: str) -> str:
+    try:
+        return str(ipaddress.ip_address(ip.strip()))
+    except ValueError:
+        return ip
+
+
+class CensysClient:
+    """Blocking host lookups against the Censys platform API, one pooled session per thread."""
+
+    def __init__(self, api_token: str, org_id: str, base_url: str = BASE_URL,
+                 timeout: float = REQUEST_TIMEOUT) -> None:
+        self.base_url = base_url
+        self.timeout = timeout
+        self.headers = {
+            "Authorization": f"Bearer {api_token}",
+            "X-Organization-ID": f"{org_id}",
+            "Accept": ACCEPT,
+        }
+        self._local = threading.local()
+        self._sessions: List[requests.Session] = []
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> "CensysClient":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def session(self) -> requests.Session:
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.headers.update(self.headers)
+            self._local.session = session
+            with self._lock:
+                self._sessions.append(session)
+        return session
+
+    def close(self) -> None:
+        with self._lock:
+            for session in self._sessions:
+                session.close()
+            self._sessions.clear()
+
+    def _get(self, url: str, params: Any) -> FetchResult:
+        start = time.monotonic()
+        try:
+            resp = self.session().get(url, params=params, timeout=self.timeout)
+        except requests.RequestException as e:
+            return FetchResult(0, error=str(e), elapsed=time.monotonic() - start)
+        elapsed = time.monotonic() - start
+        try:
+            body = resp.json()
+        except ValueError:
+            body = None
+        error = "" if resp.status_code in (200, 404) else (resp.text[:500] if body is None else "")
+        return FetchResult(resp.status_code, body, resp.headers, error, elapsed)
+
+    def fetch(self, ip: str, at_time: str) -> FetchResult:
+        return self._get(self.base_url.format(ip=ip), {"at_time": at_time})
+
+    def batch_url(self) -> str:
+        """The multi-host endpoint: the single-host URL without its /{ip}."""
+        return self.base_url.replace("/{ip}", "").replace("{ip}", "")
+
+    def fetch_batch(self, ips: Sequence[str], at_time: str) -> Tuple[FetchResult, Dict[str, FetchResult]]:
+        """
+        (the request's result, ip -> single-host result). Records are shaped
+        like fetch()'s; when the request itself failed, every ip gets its result.
+        IPs missing from a successful response are left out of the map.
+        """
+        result = self._get(self.batch_url(), [("host_ids", ip) for ip in ips] + [("at_time", at_time)])
+        resources = result.body.get("result") if result.ok and isinstance(result.body, dict) else None
+        if not isinstance(resources, list):
+            if result.ok:
+                result = FetchResult(0, result.body, result.headers, "unexpected multi-host response", result.elapsed)
+            return result, {ip: result for ip in ips}
+        by_ip: Dict[str, Any] = {}
+        for entry in resources:
+            resource = entry.get("resource") if isinstance(entry, dict) else None
+            if isinstance(resource, dict) and resource.get("ip"):
+                by_ip[normalize_ip(str(resource["ip"]))] = resource
+        out = {}
+        for ip in ips:
+            resource = by_ip.get(normalize_ip(ip))
+            if resource is not None:
+                out[ip] = FetchResult(200, {"result": {"resource": resource}}, result.headers, elapsed=result.elapsed)
+        return result, out
+
+
+def parse_retry_after(value: Optional[str], now: Optional[float] = None) -> Optional[float]:
+    """Seconds to wait from a Retry-After value (delta seconds or an HTTP date)."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    now = time.time() if now is None else now
+    return max(0.0, when.timestamp() - now)
+
+
+def header(headers: Mapping[str, str], *names: str) -> Optional[str]:
+    """First present header among names (requests' headers are case-insensitive; plain dicts are not)."""
+    for name in names:
+        value = headers.get(name)
+        if value is None:
+            value = headers.get(name.lower())
+        if value is not None:
+            return value
+    return None
+
+
+def parse_reset(value: Optional[str], now: Optional[float] = None) -> Optional[float]:
+    """Seconds until a rate-limit window resets: delta seconds, or an epoch timestamp."""
+    if not value:
+        return None
+    try:
+        reset = float(value.strip())
+    except ValueError:
+        return None
+    now = time.time() if now is None else now
+    # epoch seconds are far larger than any window length
+    return max(0.0, reset - now) if reset > 1e9 else max(0.0, reset)
+
+
+class RateController:
+    """
+    AIMD pacing of request starts, driven from one event loop.
+
+    reserve() books the next start slot and returns how long the caller has
+    to wait for it; observe() adjusts the rate from each response.
+    """
+
+    def __init__(self, rate: float = DEFAULT_RATE, max_rate: Optional[float] = None,
+                 min_rate: float = MIN_RATE, increase: float = RATE_INCREASE,
+                 decrease: float = RATE_DECREASE, clock: Callable[[], float] = time.monotonic) -> None:
+        if rate <= 0:
+            raise ValueError("rate must be > 0")
+        self.max_rate = max(rate, max_rate or rate)
+        self.min_rate = min(min_rate, rate)
+        self.rate = rate
+        self.increase = increase
+        self.decrease = decrease
+        self.clock = clock
+        self.paused_until = 0.0
+        self._next_start = 0.0
+        self.throttles = 0
+
+    def reserve(self) -> float:
+        now = self.clock()
+        start = max(now, self._next_start, self.paused_until)
+        self._next_start = start + 1.0 / self.rate
+        return start - now
+
+    def pause(self, seconds: float) -> None:
+        seconds = min(seconds, MAX_RETRY_AFTER)
+        self.paused_until = max(self.paused_until, self.clock() + seconds)
+
+    def observe(self, result: FetchResult) -> None:
+        if result.throttled:
+            self.throttles += 1
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            retry_after = parse_retry_after(header(result.headers, "Retry-After"))
+            self.pause(DEFAULT_RETRY_AFTER if retry_after is None else retry_after)
+            return
+
+        remaining = header(result.headers, "X-RateLimit-Remaining", "RateLimit-Remaining")
+        if remaining is not None and remaining.strip() in ("0", "0.0"):
+            reset = parse_reset(header(result.headers, "X-RateLimit-Reset", "RateLimit-Reset"))
+            if reset is not None:
+                self.pause(reset)
+
+        if result.status and result.status < 500:
+            # additive increase: `increase` req/s per second of traffic at the current rate
+            self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+
+    def describe(self) -> str:
+        return f"rate {self.rate:.2f} req/s (max {self.max_rate:.2f}), {self.throttles} throttled responses"
+
+
+# fetch_batch(ips, at_time) -> (request result, ip -> result), see CensysClient.fetch_batch
+BatchFetch = Callable[[Sequence[str], str], Tuple[FetchResult, Dict[str, FetchResult]]]
+
+
+def batch_lookups(lookups: Iterable[Lookup], batch_size: int) -> List[List[Lookup]]:
+    """Runs of consecutive lookups with one at_time, at most batch_size each; order is kept."""
+    batches: List[List[Lookup]] = []
+    for lookup in lookups:
+        if batches and len(batches[-1]) < batch_size and batches[-1][0][1] == lookup[1]:
+            batches[-1].append(lookup)
+        else:
+            batches.append([lookup])
+    return batches
+
+
+async def fetch_async(lookups: Iterable[Lookup], fetch: Callable[[str, str], FetchResult],
+                      controller: RateController, concurrency: int,
+                      on_result: Callable[[Lookup, FetchResult], None],
+                      throttle_retries: int = MAX_THROTTLE_RETRIES,
+                      fetch_batch: Optional[BatchFetch] = None, batch_size: int = DEFAULT_BATCH_SIZE) -> None:
+    """
+    Run fetch(ip, at_time) for every lookup, at most `concurrency` at a
+    time, paced by controller. With fetch_batch and batch_size > 1, one
+    request covers a batch (see batch_lookups) and pacing, throttling and
+    retries apply per request; a lookup missing from its batch's response
+    is queued again as a single-host fetch. on_result runs on the event
+    loop thread, one call at a time.
+    """
+    batched = fetch_batch is not None and batch_size > 1
+    units = batch_lookups(lookups, batch_size) if batched else [[lookup] for lookup in lookups]
+    # (lookups, throttled attempts so far, sent through fetch_batch); None tells a worker to stop
+    queue: "asyncio.Queue[Optional[Tuple[List[Lookup], int, bool]]]" = asyncio.Queue()
+    for unit in units:
+        queue.put_nowait((unit, 0, batched))
+    loop = asyncio.get_running_loop()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        async def run(unit: List[Lookup], attempt: int, as_batch: bool) -> None:
+            delay = controller.reserve()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if as_batch:
+                request, results = await loop.run_in_executor(
+                    executor, fetch_batch, [ip for ip, _ in unit], unit[0][1])
+            else:
+                request = await loop.run_in_executor(executor, fetch, *unit[0])
+                results = {unit[0][0]: request}
+            controller.observe(request)
+            if request.throttled and attempt < throttle_retries:
+                queue.put_nowait((unit, attempt + 1, as_batch))
+                return
+            for lookup in unit:
+                result = results.get(lookup[0])
+                if result is None:
+                    queue.put_nowait(([lookup], 0, False))
+                else:
+                    on_result(lookup, result)
+
+        async def worker() -> None:
+            # a momentarily empty queue is not the end: retries and refetches are queued by other workers
+            while True:
+                item = await queue.get()
+                try:
+                    if item is None:
+                        return
+                    await run(*item)
+                finally:
+                    queue.task_done()
+
+        workers = [asyncio.ensure_future(worker()) for _ in range(max(1, concurrency))]
+        drained = asyncio.ensure_future(queue.join())
+        try:
+            # workers only end early by raising
+            await asyncio.wait([drained, *workers], return_when=asyncio.FIRST_COMPLETED)
+            for task in workers:
+                if task.done():
+                    task.result()
+            for _ in workers:
+                queue.put_nowait(None)
+            await asyncio.gather(*workers)
+        finally:
+            drained.cancel()
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(drained, *workers, return_exceptions=True)
+
+def fetch_all(lookups: Iterable[Lookup], fetch: Callable[[str, str], FetchResult],
+              controller: RateController, concurrency: int = DEFAULT_CONCURRENCY,
+              on_result: Callable[[Lookup, FetchResult], None] = lambda lookup, result: None,
+              throttle_retries: int = MAX_THROTTLE_RETRIES,
+              fetch_batch: Optional[BatchFetch] = None, batch_size: int = DEFAULT_BATCH_SIZE) -> None:
+    """Blocking wrapper around fetch_async()."""
+    asyncio.run(fetch_async(lookups, fetch, controller, concurrency, on_result, throttle_retries,
+                            fetch_batch, batch_size))
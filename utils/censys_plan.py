@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Change-driven planning for censys3.py --changed-only.
+
+Every run used to look up every (ip, date) of the vendor CSV, although most
+IPs and the protocols the vendor declares for them do not change from one
+day to the next. The planner keeps what the previous run saw per vendor in
+<base>.state.json:
+
+  {"version": 1, "vendor": ..., "ips": {ip: {"protocols": "openvpn,wireguard", "fetched_at": <epoch>}}}
+
+and selects only the IPs that are
+  new        not in the state,
+  protocols  declared with a different protocol set (--protocols, the
+             date,ip,protocols CSV written by the vendor's ip_to_protocol.py),
+  stale      last answered (snapshot or 404) more than --stale-days ago.
+
+All not yet finished lookups of a selected IP are fetched; a changed or
+stale IP whose lookups are all finished gets its latest one fetched again. Other IPs
+keep the snapshots the output already holds, so --changed-only implies
+--resume. The state is rewritten at the end of the run.
+"""
+import csv
+import json
+import os
+from pathlib import Path
+from typing import Any, Container, Dict, Iterable, List, Mapping, Optional, Sequence, Set, Tuple
+
+from censys_client import Lookup
+
+STATE_VERSION = 1
+DEFAULT_STALE_DAYS = 30.0
+
+NEW = "new"
+PROTOCOLS = "protocols"
+STALE = "stale"
+
+
+def read_declared_protocols(path: Path) -> Dict[str, str]:
+    """ip -> sorted union of the protocols declared on any date, comma separated."""
+    names: Dict[str, Set[str]] = {}
+    with path.open("r", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        for row in reader:
+            if len(row) < 3 or not row[1].strip():
+                continue
+            prots = names.setdefault(row[1].strip(), set())
+            prots.update(p.strip() for p in row[2].split(",") if p.strip())
+    return {ip: ",".join(sorted(prots)) for ip, prots in names.items()}
+
+
+class PlanState:
+    """ip -> declared protocols and last answer time, as of the previous run."""
+
+    def __init__(self, path: Path, vendor: str) -> None:
+        self.path = path
+        self.vendor = vendor
+        self.ips: Dict[str, Dict[str, Any]] = {}
+
+    def load(self) -> "PlanState":
+        if not self.path.exists():
+            return self
+        try:
+            with self.path.open("r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"WARN: could not read {self.path}, planning from scratch: {e}")
+            return self
+        if isinstance(data, dict) and data.get("version") == STATE_VERSION and isinstance(data.get("ips"), dict):
+            self.ips = data["ips"]
+        return self
+
+    def save(self) -> None:
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            json.dump({"version": STATE_VERSION, "vendor": self.vendor, "ips": self.ips}, f, sort_keys=True)
+        os.replace(tmp, self.path)
+
+    def update(self, ips: Iterable[str], declared: Mapping[str, str], answered: Mapping[str, float]) -> None:
+        """Record this run's protocols, and answer times for the IPs that got one."""
+        for ip in ips:
+            rec = self.ips.setdefault(ip, {"protocols": "", "fetched_at": None})
+            if ip in declared:
+                rec["protocols"] = declared[ip]
+            if ip in answered:
+                rec["fetched_at"] = answered[ip]
+
+
+def plan_changes(ips: Iterable[str], state: PlanState, declared: Optional[Mapping[str, str]],
+                 stale_seconds: float, now: float) -> Dict[str, str]:
+    """ip -> why it is looked up again (NEW, PROTOCOLS, STALE); unchanged IPs are left out."""
+    reasons: Dict[str, str] = {}
+    for ip in ips:
+        rec = state.ips.get(ip)
+        if rec is None:
+            reasons[ip] = NEW
+        elif declared is not None and ip in declared and declared[ip] != rec.get("protocols", ""):
+            reasons[ip] = PROTOCOLS
+        elif rec.get("fetched_at") is None or now - rec["fetched_at"] > stale_seconds:
+            reasons[ip] = STALE
+    return reasons
+
+
+def select_lookups(lookups: Sequence[Lookup], reasons: Mapping[str, str],
+                   finished: Container[Lookup]) -> Tuple[List[Lookup], List[Lookup]]:
+    """
+    (lookups to fetch, finished lookups to fetch again) for the planned IPs,
+    in the order of lookups.
+    """
+    todo = [key for key in lookups if key[0] in reasons and key not in finished]
+    pending_ips = {ip for ip, _ in todo}
+    latest: Dict[str, Lookup] = {}
+    for key in lookups:
+        ip = key[0]
+        if reasons.get(ip) in (PROTOCOLS, STALE) and ip not in pending_ips:
+            if ip not in latest or key[1] > latest[ip][1]:
+                latest[ip] = key
+    refresh = [key for key in lookups if latest.get(key[0]) == key]
+    return todo, refresh
+
+
+def count_reasons(reasons: Mapping[str, str]) -> str:
+    counts: Dict[str, int] = {}
+    for reason in reasons.values():
+        counts[reason] = counts.get(reason, 0) + 1
+    return ", ".join(f"{counts[r]} {r}" for r in (NEW, PROTOCOLS, STALE) if r in counts) or "nothing changed"
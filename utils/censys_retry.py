@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Persistent retry queue for Censys lookups that were throttled or failed.
+
+censys3.py used to print the error of a failed lookup and move on, so a
+second run over a diffed "Recollect" CSV (IP_checker.ipynb) was needed for
+full coverage. Lookups whose outcome is worth retrying (429, 408, 5xx,
+connection errors) now go into a RetryQueue with an attempt count and a
+next-attempt time, and the run drains the queue before it exits.
+
+The queue is an append-only journal next to the output, <base>.retry.jsonl:
+
+  {"ip": ..., "at_time": ..., "attempts": 2, "next_at": 1700000000.0, "status": 429, "error": ""}
+  {"ip": ..., "at_time": ..., "done": true}
+
+The last line of a key wins. A run that is interrupted leaves the journal
+behind and the next run starts with its pending lookups; compact() rewrites
+it with only the pending and given-up keys once a run has drained it.
+
+Backoff is exponential (RETRY_BASE * 2**(attempts-1), at most RETRY_MAX),
+or the response's Retry-After when that is longer. A key is given up after
+max_attempts; given-up keys stay in the journal (reported, not retried in
+that run) and start a fresh attempt count when a later run fails them again.
+"""
+import json
+import os
+import time
+from pathlib import Path
+from typing import IO, AbstractSet, Any, Callable, Dict, List, Optional
+
+from censys_client import FetchResult, Lookup, header, parse_retry_after
+
+RETRY_BASE = 5.0
+RETRY_MAX = 600.0
+DEFAULT_MAX_ATTEMPTS = 8
+
+
+def is_retryable(result: FetchResult) -> bool:
+    """Throttling, timeouts, server errors and transport errors; not 404 or client errors."""
+    return result.status in (0, 408, 429) or result.status >= 500
+
+
+def backoff(attempts: int, retry_after: Optional[float] = None) -> float:
+    delay = min(RETRY_MAX, RETRY_BASE * (2 ** max(0, attempts - 1)))
+    return max(delay, retry_after or 0.0)
+
+
+class RetryQueue:
+    """(ip, at_time) -> retry state, journaled to path."""
+
+    def __init__(self, path: Path, max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+                 clock: Callable[[], float] = time.time) -> None:
+        self.path = path
+        self.max_attempts = max_attempts
+        self.clock = clock
+        self.items: Dict[Lookup, Dict[str, Any]] = {}
+        self._f: Optional[IO[str]] = None
+        self._load()
+
+    def __enter__(self) -> "RetryQueue":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+    def _load(self) -> None:
+        if not self.path.exists():
+            return
+        with self.path.open("r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                    key = (rec["ip"], rec["at_time"])
+                except (ValueError, KeyError, TypeError):
+                    continue  # a torn last line of an interrupted run
+                if rec.get("done"):
+                    self.items.pop(key, None)
+                else:
+                    self.items[key] = rec
+
+    def _append(self, rec: Dict[str, Any]) -> None:
+        if self._f is None:
+            self._f = self.path.open("a", encoding="utf-8")
+        self._f.write(json.dumps(rec) + "\n")
+        self._f.flush()
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def __contains__(self, lookup: Lookup) -> bool:
+        return lookup in self.items
+
+    def gave_up(self, rec: Dict[str, Any]) -> bool:
+        return rec["attempts"] >= self.max_attempts
+
+    def push(self, lookup: Lookup, result: FetchResult) -> bool:
+        """Record a failed attempt; False once the key has used up its attempts."""
+        prev = self.items.get(lookup)
+        attempts = 1 if prev is None or self.gave_up(prev) else prev["attempts"] + 1
+        retry_after = parse_retry_after(header(result.headers, "Retry-After"))
+        rec = {
+            "ip": lookup[0],
+            "at_time": lookup[1],
+            "attempts": attempts,
+            "next_at": self.clock() + backoff(attempts, retry_after),
+            "status": result.status,
+            "error": result.error[:200],
+        }
+        self.items[lookup] = rec
+        self._append(rec)
+        return not self.gave_up(rec)
+
+    def resolve(self, lookup: Lookup) -> None:
+        """The key got a final answer (snapshot or 404)."""
+        if self.items.pop(lookup, None) is not None:
+            self._append({"ip": lookup[0], "at_time": lookup[1], "done": True})
+
+    def pending(self, scope: Optional[AbstractSet[Lookup]] = None) -> List[Lookup]:
+        """Keys still to retry (within scope, if given), due or not, earliest due first."""
+        recs = [r for key, r in self.items.items()
+                if not self.gave_up(r) and (scope is None or key in scope)]
+        return [(r["ip"], r["at_time"]) for r in sorted(recs, key=lambda r: (r["next_at"], r["ip"], r["at_time"]))]
+
+    def due(self, scope: Optional[AbstractSet[Lookup]] = None) -> List[Lookup]:
+        now = self.clock()
+        return [key for key in self.pending(scope) if self.items[key]["next_at"] <= now]
+
+    def seconds_until_next(self, scope: Optional[AbstractSet[Lookup]] = None) -> Optional[float]:
+        """Wait until the next pending key (within scope) is due; None when nothing is pending."""
+        times = [self.items[key]["next_at"] for key in self.pending(scope)]
+        return max(0.0, min(times) - self.clock()) if times else None
+
+    def given_up(self) -> List[Dict[str, Any]]:
+        return [r for r in self.items.values() if self.gave_up(r)]
+
+    def compact(self) -> None:
+        """Rewrite the journal with one line per remaining key; removed when empty."""
+        self.close()
+        if not self.items:
+            self.path.unlink(missing_ok=True)
+        else:
+            tmp = self.path.with_name(self.path.name + ".tmp")
+            with tmp.open("w", encoding="utf-8") as f:
+                for rec in self.items.values():
+                    f.write(json.dumps(rec) + "\n")
+            os.replace(tmp, self.path)
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Priority order and request budget for censys3.py.
+
+The Censys quota is fixed, and lookups used to be spent in input order, so
+repeat lookups could use it up before newly seen IPs were reached. Lookups
+are now ranked into tiers and fetched tier by tier:
+
+  0 new        IPs no earlier run has answered (or, with --changed-only,
+               IPs missing from the previous run's state)
+  1 missing    IPs with no snapshot in the output yet (only 404s or failures)
+  2 coverage   everything else, dates with the lowest share of finished
+               lookups first
+  3 refresh    latest lookups of changed or stale IPs fetched again
+
+--budget caps the host lookups one run sends to the API (a multi-host
+request counts each of its hosts); --daily-budget caps the lookups of all
+runs sharing a cache directory on one (UTC) day, which every run counts in
+<cache>/usage.json. Cache hits are free. When the budget runs out,
+the lookups that were not sent are reported per tier and listed in
+<base>.deferred.csv; they are not checkpointed, so the next --resume run
+starts with them.
+"""
+import csv
+import json
+import os
+import time
+from pathlib import Path
+from typing import Callable, Container, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+from censys_client import Lookup
+
+NEW_IP = 0
+MISSING = 1
+COVERAGE = 2
+REFRESH = 3
+TIER_NAMES = ("new", "missing", "coverage", "refresh")
+
+USAGE_NAME = "usage.json"
+DEFERRED_HEADER = ["ip", "at_time", "tier"]
+
+
+def prioritize(lookups: Sequence[Lookup], all_lookups: Sequence[Lookup], refresh: Container[Lookup],
+               known_ips: Container[str], status: Mapping[Lookup, str], saved: str) -> List[Tuple[int, Lookup]]:
+    """
+    (tier, lookup) for lookups, highest priority first. all_lookups is every
+    lookup of the run, finished or not (for date coverage); status maps the
+    finished ones to their checkpoint status.
+    """
+    with_snapshot = {ip for (ip, _), s in status.items() if s == saved}
+    per_date: Dict[str, List[int]] = {}
+    for key in all_lookups:
+        counts = per_date.setdefault(key[1], [0, 0])
+        counts[0] += key in status
+        counts[1] += 1
+
+    def rank(key: Lookup) -> Tuple[int, float, str, str]:
+        ip, at_time = key
+        if key in refresh:
+            tier = REFRESH
+        elif ip not in known_ips:
+            tier = NEW_IP
+        elif ip not in with_snapshot:
+            tier = MISSING
+        else:
+            tier = COVERAGE
+        done, total = per_date.get(at_time, (0, 1))
+        return tier, (done / total if tier == COVERAGE else 0.0), at_time, ip
+
+    ranked = sorted((rank(key), key) for key in lookups)
+    return [(r[0], key) for r, key in ranked]
+
+
+def tier_counts(items: Iterable[Tuple[int, Lookup]]) -> str:
+    counts = [0] * len(TIER_NAMES)
+    for tier, _ in items:
+        counts[tier] += 1
+    return ", ".join(f"{n} {TIER_NAMES[t]}" for t, n in enumerate(counts) if n)
+
+
+class UsageLedger:
+    """Lookups sent per UTC day, shared by every run using one cache directory."""
+
+    def __init__(self, path: Path, clock: Callable[[], float] = time.time) -> None:
+        self.path = path
+        self.clock = clock
+
+    def today(self) -> str:
+        return time.strftime("%Y-%m-%d", time.gmtime(self.clock()))
+
+    def _read(self) -> Dict[str, int]:
+        try:
+            with self.path.open("r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            print(f"WARN: could not read {self.path}, counting from zero: {e}")
+            return {}
+        return {k: v for k, v in data.items() if isinstance(v, int)} if isinstance(data, dict) else {}
+
+    def used(self) -> int:
+        return self._read().get(self.today(), 0)
+
+    def add(self, n: int) -> None:
+        if n <= 0:
+            return
+        data = self._read()
+        day = self.today()
+        data[day] = data.get(day, 0) + n
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            json.dump(data, f, sort_keys=True)
+        os.replace(tmp, self.path)
+
+
+class Budget:
+    """Lookups this run may still send: the lower of --budget and what --daily-budget leaves."""
+
+    def __init__(self, limit: Optional[int] = None, daily: Optional[int] = None,
+                 ledger: Optional[UsageLedger] = None) -> None:
+        self.ledger = ledger
+        self.remaining: Optional[int] = limit
+        if daily is not None and ledger is not None:
+            left = max(0, daily - self.ledger.used())
+            self.remaining = left if self.remaining is None else min(self.remaining, left)
+        self.spent = 0
+
+    @property
+    def exhausted(self) -> bool:
+        return self.remaining is not None and self.remaining <= 0
+
+    def take(self, items: Sequence[Lookup]) -> Tuple[List[Lookup], List[Lookup]]:
+        """(lookups to send now, lookups deferred) and charge the budget for the former."""
+        n = len(items) if self.remaining is None else min(len(items), self.remaining)
+        sent, deferred = list(items[:n]), list(items[n:])
+        if self.remaining is not None:
+            self.remaining -= n
+        self.spent += n
+        if self.ledger is not None:
+            self.ledger.add(n)
+        return sent, deferred
+
+    def describe(self) -> str:
+        left = "unlimited" if self.remaining is None else f"{self.remaining} left"
+        return f"budget: {self.spent} lookups sent, {left}"
+
+
+def write_deferred(path: str, items: Sequence[Tuple[int, Lookup]]) -> None:
+    """List the lookups left for a later run; removes the file when there are none."""
+    if not items:
+        Path(path).unlink(missing_ok=True)
+        return
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(DEFERRED_HEADER)
+        for tier, (ip, at_time) in items:
+            writer.writerow([ip, at_time, TIER_NAMES[tier]])
+    os.replace(tmp, path)
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Censys host lookup API, for offline runs of censys3.py.
+
+Serves GET /v3/global/asset/host/<ip>?at_time=... the way the platform API
+does, from a fixture corpus (an output of censys3.py in any format
+censys_store.py reads; the last record of an IP wins) or from a synthetic
+generator that derives a stable record from the IP. Faults can be injected:
+
+  --latency MS / --jitter MS   delay of every response
+  --not-found P                share of IPs answered 404 (stable per IP;
+                               with fixtures, IPs missing from them are 404)
+  --throttle P                 share of requests answered 429 with Retry-After
+  --quota N                    requests per second before answering 429
+  --error-rate P               share of requests answered 500/502/503
+  --retry-after S              the Retry-After of a 429
+
+The multi-host form, GET /v3/global/asset/host?host_ids=<ip>&host_ids=...,
+answers {"result": [{"resource": ...}, ...]} with the hosts that were found;
+each host gets the latency, and one 429 or 5xx roll decides the request.
+GET /stats returns the counts per status. Point censys3.py at it with:
+
+  python3 censys_standin.py --port 8080 &
+  CENSYS_BASE_URL=http://127.0.0.1:8080/v3/global/asset/host/{ip} \\
+      CENSYS_API_TOKEN=x CENSYS_ORG_ID=x python3 censys3.py <base>
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from censys_store import iter_records, record_ip
+
+HOST_PATH = "/v3/global/asset/host/"
+DEFAULT_PORT = 8080
+DEFAULT_RETRY_AFTER = 1
+
+# (port, protocol) pairs the synthetic generator picks services from
+SYNTHETIC_SERVICES = (
+    (22, "SSH"), (80, "HTTP"), (443, "HTTP"), (500, "IKE"), (1194, "OPENVPN"),
+    (1701, "L2TP"), (1723, "PPTP"), (4500, "IKE"), (8443, "HTTP"), (51820, "UNKNOWN"),
+)
+
+
+def ip_fraction(ip: str, salt: str) -> float:
+    """A stable number in [0, 1) for ip, so per-IP choices repeat across runs."""
+    digest = hashlib.sha256(f"{salt}:{ip}".encode()).digest()
+    return int.from_bytes(digest[:8], "big") / 2 ** 64
+
+
+def synthetic_record(ip: str) -> Dict[str, Any]:
+    rng = random.Random(ip)
+    services = []
+    for port, protocol in sorted(rng.sample(SYNTHETIC_SERVICES, rng.randint(1, 4))):
+        service: Dict[str, Any] = {"port": port, "protocol": protocol, "transport_protocol": "tcp"}
+        if protocol == "IKE":
+            service["ike"] = {"v1": {"accepted_proposal": rng.random() < 0.5}, "v2": {}}
+        if protocol in ("OPENVPN", "L2TP", "PPTP", "IKE"):
+            service["labels"] = [{"value": "VPN"}]
+        services.append(service)
+    return {"result": {"resource": {"ip": ip, "services": services}}}
+
+
+def load_fixtures(path: Path) -> Dict[str, Any]:
+    out = {}
+    for record in iter_records(path):
+        ip = record_ip(record)
+        if ip:
+            out[ip] = record
+    return out
+
+
+class StandIn:
+    """Response policy and counters shared by the request handler threads."""
+
+    def __init__(self, fixtures: Optional[Dict[str, Any]] = None, latency: float = 0.0, jitter: float = 0.0,
+                 not_found: float = 0.0, throttle: float = 0.0, quota: Optional[float] = None,
+                 error_rate: float = 0.0, retry_after: int = DEFAULT_RETRY_AFTER, seed: Optional[int] = None) -> None:
+        self.fixtures = fixtures
+        self.latency = latency
+        self.jitter = jitter
+        self.not_found = not_found
+        self.throttle = throttle
+        self.quota = quota
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counts: Dict[str, int] = {}
+        self._window = (0, 0)  # (second, requests in it)
+
+    def count(self, status: int) -> None:
+        with self.lock:
+            self.counts[str(status)] = self.counts.get(str(status), 0) + 1
+
+    def over_quota(self) -> bool:
+        if self.quota is None:
+            return False
+        with self.lock:
+            second = int(time.monotonic())
+            start, n = self._window
+            n = n + 1 if start == second else 1
+            self._window = (second, n)
+            return n > self.quota
+
+    def record(self, ip: str) -> Optional[Dict[str, Any]]:
+        if self.fixtures is not None:
+            return self.fixtures.get(ip)
+        return None if ip_fraction(ip, "404") < self.not_found else synthetic_record(ip)
+
+    def fault(self, hosts: int) -> Optional[Tuple[int, Dict[str, str], Any]]:
+        """Sleep the latency of hosts lookups, then the injected 429/5xx response, if any."""
+        with self.lock:
+            delay = max(0.0, self.latency + self.rng.uniform(-self.jitter, self.jitter)) * hosts
+            roll_throttle, roll_error = self.rng.random(), self.rng.random()
+            error_status = self.rng.choice((500, 502, 503))
+        time.sleep(delay)
+        if self.over_quota() or roll_throttle < self.throttle:
+            return 429, {"Retry-After": str(self.retry_after)}, {"error": "rate limit exceeded"}
+        if roll_error < self.error_rate:
+            return error_status, {}, {"error": "injected server error"}
+        return None
+
+    def answer(self, ip: str) -> Tuple[int, Dict[str, str], Any]:
+        """(status, headers, body) for one lookup."""
+        fault = self.fault(1)
+        if fault is not None:
+            return fault
+        record = self.record(ip)
+        if record is None:
+            return 404, {}, {"error": "host not found"}
+        return 200, {}, record
+
+    def answer_batch(self, ips: List[str]) -> Tuple[int, Dict[str, str], Any]:
+        """(status, headers, body) for one multi-host lookup."""
+        fault = self.fault(len(ips))
+        if fault is not None:
+            return fault
+        resources = []
+        for ip in ips:
+            record = self.record(ip)
+            if record is not None:
+                resources.append({"resource": record["result"]["resource"]})
+        return 200, {}, {"result": resources}
+
+
+def make_handler(standin: StandIn):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # keep-alive responses are written in two parts; do not hold the second for an ACK
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args) -> None:
+            pass
+
+        def send_json(self, status: int, body: Any, headers: Optional[Dict[str, str]] = None) -> None:
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self) -> None:
+            url = urlsplit(self.path)
+            if url.path == "/stats":
+                with standin.lock:
+                    self.send_json(200, dict(standin.counts))
+                return
+            batch = url.path.rstrip("/") == HOST_PATH.rstrip("/")
+            if not batch and not url.path.startswith(HOST_PATH):
+                self.send_json(404, {"error": "unknown path"})
+                return
+            if not self.headers.get("Authorization"):
+                standin.count(401)
+                self.send_json(401, {"error": "missing Authorization"})
+                return
+            # at_time is accepted but ignored: a stand-in host looks the same at any time
+            if batch:
+                status, headers, body = standin.answer_batch(parse_qs(url.query).get("host_ids", []))
+            else:
+                status, headers, body = standin.answer(url.path[len(HOST_PATH):])
+            standin.count(status)
+            self.send_json(status, body, headers)
+
+    return Handler
+
+
+def serve(standin: StandIn, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """Start serving on a daemon thread; port 0 picks a free port (see server.server_port)."""
+    server = ThreadingHTTPServer((host, port), make_handler(standin))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def base_url(server: ThreadingHTTPServer) -> str:
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}{HOST_PATH}{{ip}}"
+
+
+def add_standin_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--fixtures", type=Path, default=None,
+                        help="censys3.py output to serve records from (default: synthetic records)")
+    parser.add_argument("--latency", type=float, default=0.0, help="response delay in ms")
+    parser.add_argument("--jitter", type=float, default=0.0, help="+/- random ms added to the delay")
+    parser.add_argument("--not-found", type=float, default=0.0, help="share of IPs answered 404")
+    parser.add_argument("--throttle", type=float, default=0.0, help="share of requests answered 429")
+    parser.add_argument("--quota", type=float, default=None, help="requests per second before answering 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered 5xx")
+    parser.add_argument("--retry-after", type=int, default=DEFAULT_RETRY_AFTER, help="Retry-After of a 429, seconds")
+    parser.add_argument("--seed", type=int, default=None, help="seed of the injected faults")
+
+
+def standin_from_args(args: argparse.Namespace) -> StandIn:
+    fixtures = load_fixtures(args.fixtures) if args.fixtures else None
+    if fixtures is not None:
+        print(f"Serving {len(fixtures)} fixture records from {args.fixtures}")
+    return StandIn(fixtures, args.latency / 1000, args.jitter / 1000, args.not_found, args.throttle,
+                   args.quota, args.error_rate, args.retry_after, args.seed)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local stand-in for the Censys host lookup API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    add_standin_args(parser)
+    args = parser.parse_args()
+
+    server = serve(standin_from_args(args), args.host, args.port)
+    print(f"Serving {base_url(server)} (Ctrl-C to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
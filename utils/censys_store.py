@@ -0,0 +1,422 @@
+#!/usr/bin/env python3
+"""
+Compressed, indexed record files for censys3.py output.
+
+censys3.py writes one full host record per line to <base>.json, and
+analyze.ipynb parses every record to read a few fields of it. With
+--output-format gzip or zstd the records go to <base>.json.gz / .json.zst
+instead, compressed in blocks of up to BLOCK_RECORDS records (one gzip
+member / zstd frame per block, so the records of a block are compressed
+together),
+and:
+
+  - the file is still one valid stream: zcat / zstdcat print the NDJSON,
+  - a record can be read on its own: <file>.idx lists, one line per record,
+        ip<TAB>block offset<TAB>block length<TAB>offset<TAB>length
+    (the block's place in the file, then the record's place in the
+    decompressed block), and StoreReader.get(ip) decodes only that block.
+
+The plain NDJSON output (the default) is indexed the same way, each line
+being a block of its own. Index lines of the older one-frame-per-record
+files (ip<TAB>offset<TAB>length) are still read.
+
+--project additionally writes <base>.services.json[.gz|.zst] (same format,
+same index) holding only what the analysis reads: result.resource.ip and
+services[].port / protocol / labels / ike.v1 / ike.v2. The raw record stays
+in the main file. load_services() is the analysis side: it reads the
+projected file when there is one, the main file otherwise, and decodes only
+the blocks holding the IPs asked for.
+
+A compressed block is written once it is full (or when the store is
+closed); write() returns the records that reached the disk with it, and
+censys3.py checkpoints them then, after their index lines. Resuming keeps
+the first K records of each file, K being the main records inside the
+checkpoint; records still buffered when a run dies are fetched again.
+
+Reading records back (all of them, or those of some IPs):
+
+  python3 censys_store.py <file> [ip ...]
+"""
+import gzip
+import io
+import json
+import os
+import sys
+from pathlib import Path
+from typing import IO, Any, Container, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+FORMATS = ("ndjson", "gzip", "zstd")
+SUFFIXES = {"ndjson": "", "gzip": ".gz", "zstd": ".zst"}
+INDEX_SUFFIX = ".idx"
+PROJECTED_NAME = "services"
+
+# Records per compressed block, and the uncompressed bytes that close a block early
+BLOCK_RECORDS = 64
+BLOCK_BYTES = 1 << 20
+
+
+class Entry(NamedTuple):
+    """Where one record is: its block in the file, then its bytes in the decoded block."""
+    ip: str
+    block_offset: int
+    block_length: int
+    offset: int
+    length: int  # -1: the whole block (one-frame-per-record index lines)
+
+    @property
+    def block_end(self) -> int:
+        return self.block_offset + self.block_length
+
+
+def format_of(path: Path) -> str:
+    for fmt, suffix in SUFFIXES.items():
+        if suffix and path.name.endswith(suffix):
+            return fmt
+    return "ndjson"
+
+
+def require_format(fmt: str) -> None:
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown output format {fmt!r} (expected one of {', '.join(FORMATS)})")
+    if fmt == "zstd" and zstandard is None:
+        raise RuntimeError("zstd output needs the zstandard package (pip install zstandard)")
+
+
+def encode_line(record: Any) -> bytes:
+    return (json.dumps(record) + "\n").encode("utf-8")
+
+
+def compress(fmt: str, data: bytes) -> bytes:
+    if fmt == "gzip":
+        return gzip.compress(data, mtime=0)
+    if fmt == "zstd":
+        return zstandard.ZstdCompressor().compress(data)
+    return data
+
+
+def decompress(fmt: str, block: bytes) -> bytes:
+    if fmt == "gzip":
+        return gzip.decompress(block)
+    if fmt == "zstd":
+        return zstandard.ZstdDecompressor().decompress(block)
+    return block
+
+
+def project_services(record: Any) -> Dict[str, Any]:
+    """The fields analyze.ipynb reads, in the record's own shape."""
+    try:
+        resource = record["result"]["resource"]
+    except (KeyError, TypeError):
+        resource = None
+    if not isinstance(resource, dict):
+        resource = {}
+    services = []
+    for service in resource.get("services") or []:
+        if not isinstance(service, dict):
+            continue
+        kept = {key: service[key] for key in ("port", "protocol", "labels") if key in service}
+        ike = service.get("ike")
+        if isinstance(ike, dict):
+            kept["ike"] = {key: ike[key] for key in ("v1", "v2") if key in ike}
+        services.append(kept)
+    return {"result": {"resource": {"ip": resource.get("ip"), "services": services}}}
+
+
+def index_path(path: Path) -> Path:
+    return path.with_name(path.name + INDEX_SUFFIX)
+
+
+def format_entry(entry: Entry) -> str:
+    return "\t".join(str(part) for part in entry) + "\n"
+
+
+def read_index(path: Path) -> List[Entry]:
+    """One Entry per record, in file order; a torn last line is dropped."""
+    out = []
+    try:
+        with index_path(path).open("r", encoding="utf-8") as f:
+            for line in f:
+                parts = line.rstrip("\n").split("\t")
+                try:
+                    numbers = [int(part) for part in parts[1:]]
+                except ValueError:
+                    continue
+                if len(parts) == 5:
+                    out.append(Entry(parts[0], *numbers))
+                elif len(parts) == 3:
+                    out.append(Entry(parts[0], numbers[0], numbers[1], 0, -1))
+    except FileNotFoundError:
+        pass
+    return out
+
+
+class RecordStore:
+    """Append-only record file, compressed in blocks of records, with its index."""
+
+    def __init__(self, path: Path, fmt: str, block_records: int = BLOCK_RECORDS) -> None:
+        require_format(fmt)
+        self.path = path
+        self.fmt = fmt
+        # plain NDJSON gains nothing from blocks: every line goes out as it comes
+        self.block_records = 1 if fmt == "ndjson" else max(1, block_records)
+        self.records = 0
+        self._f: Optional[IO[bytes]] = None
+        self._idx: Optional[IO[str]] = None
+        # records of the block being filled: (ip, encoded line, tag)
+        self._pending: List[Tuple[str, bytes, Any]] = []
+        self._pending_bytes = 0
+
+    def __enter__(self) -> "RecordStore":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def open(self, keep: Optional[int] = None) -> "RecordStore":
+        """Start empty, or (keep given) continue after the first keep records."""
+        carried: List[Tuple[Entry, bytes]] = []
+        if keep is None:
+            self.path.unlink(missing_ok=True)
+            index_path(self.path).unlink(missing_ok=True)
+        else:
+            full = read_index(self.path)
+            entries = full[:keep]
+            if entries and keep < len(full) and full[keep].block_offset == entries[-1].block_offset:
+                # keep falls inside a block: its first records go out again with the next block
+                start = entries[-1].block_offset
+                block = [e for e in entries if e.block_offset == start]
+                carried = list(zip(block, self._read_lines(block)))
+                entries = entries[:len(entries) - len(block)]
+            end = entries[-1].block_end if entries else 0
+            if self.path.exists() and self.path.stat().st_size > end:
+                with self.path.open("r+b") as f:
+                    f.truncate(end)
+            with index_path(self.path).open("w", encoding="utf-8") as f:
+                f.writelines(format_entry(e) for e in entries)
+            self.records = len(entries)
+        self._f = self.path.open("ab")
+        self._idx = index_path(self.path).open("a", encoding="utf-8")
+        for entry, line in carried:
+            self._pending.append((entry.ip, line, None))
+            self._pending_bytes += len(line)
+        return self
+
+    def _read_lines(self, entries: List[Entry]) -> List[bytes]:
+        """The encoded lines of entries, all from one block."""
+        with self.path.open("rb") as f:
+            f.seek(entries[0].block_offset)
+            data = decompress(self.fmt, f.read(entries[0].block_length))
+        return [data[e.offset:e.offset + e.length] if e.length >= 0 else data for e in entries]
+
+    @property
+    def buffered(self) -> int:
+        """Records waiting for their block to be written."""
+        return len(self._pending)
+
+    @property
+    def size(self) -> int:
+        """Bytes on disk, buffered records excluded."""
+        return self._f.tell()
+
+    def write(self, ip: str, record: Any, tag: Any = None) -> List[Any]:
+        """
+        Add one record. Returns the tags of the records that reached the
+        disk with it (none while its block is still filling).
+        """
+        line = encode_line(record)
+        self._pending.append((ip, line, tag))
+        self._pending_bytes += len(line)
+        if len(self._pending) >= self.block_records or self._pending_bytes >= BLOCK_BYTES:
+            return self.flush()
+        return []
+
+    def flush(self) -> List[Any]:
+        """Write the buffered records as one block; returns their tags."""
+        if not self._pending:
+            return []
+        data = b"".join(line for _, line, _ in self._pending)
+        block = compress(self.fmt, data)
+        block_offset = self._f.tell()
+        self._f.write(block)
+        self._f.flush()
+        offset = 0
+        for ip, line, _ in self._pending:
+            self._idx.write(format_entry(Entry(ip, block_offset, len(block), offset, len(line))))
+            offset += len(line)
+        self._idx.flush()
+        tags = [tag for _, _, tag in self._pending if tag is not None]
+        self.records += len(self._pending)
+        self._pending = []
+        self._pending_bytes = 0
+        return tags
+
+    def close(self) -> List[Any]:
+        """Flush the last block and close; returns the tags flushed."""
+        tags = self.flush() if self._f is not None else []
+        for f in (self._f, self._idx):
+            if f is not None:
+                f.close()
+        self._f = self._idx = None
+        return tags
+
+
+def record_ip(record: Any) -> str:
+    try:
+        return str(record["result"]["resource"]["ip"])
+    except (KeyError, TypeError):
+        return ""
+
+
+def ensure_index(path: Path) -> None:
+    """
+    Index an NDJSON output written before indexes existed. Compressed files
+    are always written with their index; one without it cannot be resumed.
+    """
+    if not path.exists() or index_path(path).exists():
+        return
+    fmt = format_of(path)
+    if fmt != "ndjson":
+        raise RuntimeError(f"{path} has no index {index_path(path)}; move it away to start over")
+    tmp = index_path(path).with_name(index_path(path).name + ".tmp")
+    offset = 0
+    with path.open("rb") as f, tmp.open("w", encoding="utf-8") as out:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break  # a torn last line
+            try:
+                ip = record_ip(json.loads(line))
+            except ValueError:
+                ip = ""
+            out.write(format_entry(Entry(ip, offset, len(line), 0, len(line))))
+            offset += len(line)
+    os.replace(tmp, index_path(path))
+
+
+def records_within(path: Path, end: int) -> int:
+    """How many records of path's index lie in its first end bytes."""
+    return sum(1 for e in read_index(path) if e.block_end <= end)
+
+
+def block_ending_at(path: Path, end: int) -> Tuple[int, int]:
+    """(offset, records) of the block of path's index that ends at byte end; (end, 0) if none does."""
+    block = [e for e in read_index(path) if e.block_end == end]
+    return (block[0].block_offset, len(block)) if block else (end, 0)
+
+
+class StoreReader:
+    """Random access by IP to a RecordStore file."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.fmt = format_of(path)
+        require_format(self.fmt)
+        self.index: Dict[str, List[Entry]] = {}
+        for entry in read_index(path):
+            self.index.setdefault(entry.ip, []).append(entry)
+        self._f: IO[bytes] = path.open("rb")
+        # the last decoded block: records of one IP are often neighbours
+        self._block: Tuple[int, bytes] = (-1, b"")
+
+    def __enter__(self) -> "StoreReader":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._f.close()
+
+    def __contains__(self, ip: str) -> bool:
+        return ip in self.index
+
+    def read(self, entry: Entry) -> Any:
+        if self._block[0] != entry.block_offset:
+            self._f.seek(entry.block_offset)
+            self._block = (entry.block_offset, decompress(self.fmt, self._f.read(entry.block_length)))
+        data = self._block[1]
+        return json.loads(data if entry.length < 0 else data[entry.offset:entry.offset + entry.length])
+
+    def get(self, ip: str) -> List[Any]:
+        """Every record of ip, in the order they were written."""
+        return [self.read(entry) for entry in self.index.get(ip, ())]
+
+    def iter_latest(self, ips: Optional[Container[str]] = None) -> Iterator[Tuple[str, Any]]:
+        """
+        (ip, last record of ip) for every ip of the index (or of ips), in
+        file order; each block holding one of them is decoded once.
+        """
+        latest = [entries[-1] for ip, entries in self.index.items() if ips is None or ip in ips]
+        latest.sort(key=lambda e: (e.block_offset, e.offset))
+        for entry in latest:
+            yield entry.ip, self.read(entry)
+
+
+def iter_records(path: Path) -> Iterator[Any]:
+    """Every record of a file in any of the formats, read sequentially."""
+    fmt = format_of(path)
+    require_format(fmt)
+    if fmt == "gzip":
+        f = gzip.open(path, "rb")
+    elif fmt == "zstd":
+        f = zstandard.ZstdDecompressor().stream_reader(path.open("rb"), read_across_frames=True, closefd=True)
+    else:
+        f = path.open("rb")
+    with f:
+        for line in io.TextIOWrapper(f, encoding="utf-8"):
+            if line.strip():
+                yield json.loads(line)
+
+
+def find_output(base: str, projected: bool = False) -> Optional[Path]:
+    """The censys3.py output of <base> in whichever format it was written, if any."""
+    stem = f"{base}.{PROJECTED_NAME}.json" if projected else f"{base}.json"
+    for fmt in FORMATS:
+        path = Path(stem + SUFFIXES[fmt])
+        if path.exists() and (fmt != "zstd" or zstandard is not None):
+            return path
+    return None
+
+
+def load_services(base: str, ips: Optional[Container[str]] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    ip -> result.resource (ip and the services fields of project_services())
+    of the censys3.py output of <base>, the last record of an IP winning;
+    only the given ips when ips is not None. Reads <base>.services.json*
+    when --project wrote one, else the main output, and goes through the
+    index when the file has one.
+    """
+    path = find_output(base, projected=True) or find_output(base)
+    if path is None:
+        raise FileNotFoundError(f"no Censys output for {base}")
+    out: Dict[str, Dict[str, Any]] = {}
+    if index_path(path).exists():
+        with StoreReader(path) as reader:
+            for ip, record in reader.iter_latest(ips):
+                out[ip] = project_services(record)["result"]["resource"]
+        return out
+    for record in iter_records(path):
+        ip = record_ip(record)
+        if ips is None or ip in ips:
+            out[ip] = project_services(record)["result"]["resource"]
+    return out
+
+
+def main() -> None:
+    if len(sys.argv) < 2:
+        print(f"Usage: python3 {sys.argv[0]} <file> [ip ...]")
+        sys.exit(1)
+    path = Path(sys.argv[1])
+    if len(sys.argv) == 2:
+        for record in iter_records(path):
+            print(json.dumps(record))
+        return
+    with StoreReader(path) as reader:
+        for ip in sys.argv[2:]:
+            for record in reader.get(ip):
+                print(json.dumps(record))
+
+
+if __name__ == "__main__":
+    main()
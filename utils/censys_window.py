@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Tolerance window for censys3.py: one snapshot per IP per N days.
+
+A server IP is typically listed on many consecutive capture dates, and a
+Censys snapshot from a day or two away describes it just as well. With
+--window-days N each IP's dates are grouped greedily, starting at its
+earliest date, into windows of at most N days; one lookup is made per
+window, at the latest date in it. N=1 (the default) keeps one lookup per
+(ip, date), as before.
+
+Rows are mapped back to the lookup that answers them in <base>.snapshots.csv:
+
+  ip,date,at_time,status      status: saved | not_found | (empty: not fetched yet)
+"""
+import csv
+import os
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from censys_client import Lookup
+
+DEFAULT_WINDOW_DAYS = 1
+DATE_FORMAT = "%m/%d/%Y"
+MAP_HEADER = ["ip", "date", "at_time", "status"]
+
+# (ip, date as written in the CSV)
+Row = Tuple[str, str]
+
+
+def window_lookups(rows: Iterable[Row], window_days: int,
+                   to_at_time: Callable[[str], Optional[str]]) -> Dict[Row, Lookup]:
+    """(ip, date) row -> the (ip, at_time) lookup answering it; unparseable dates are left out."""
+    if window_days < 1:
+        raise ValueError("window_days must be >= 1")
+    by_ip: Dict[str, List[Tuple[datetime, str]]] = {}
+    for ip, raw_date in rows:
+        try:
+            day = datetime.strptime(raw_date, DATE_FORMAT)
+        except ValueError:
+            to_at_time(raw_date)  # reports the invalid date
+            continue
+        by_ip.setdefault(ip, []).append((day, raw_date))
+
+    span = timedelta(days=window_days)
+    out: Dict[Row, Lookup] = {}
+    for ip, dates in by_ip.items():
+        dates.sort()
+        i = 0
+        while i < len(dates):
+            j = i
+            while j + 1 < len(dates) and dates[j + 1][0] - dates[i][0] < span:
+                j += 1
+            at_time = to_at_time(dates[j][1])
+            for _, raw_date in dates[i:j + 1]:
+                out[(ip, raw_date)] = (ip, at_time)
+            i = j + 1
+    return out
+
+
+def write_row_map(path: str, row_map: Mapping[Row, Lookup], status: Callable[[Lookup], str]) -> None:
+    """Write the row -> lookup map, sorted by ip then date, atomically."""
+    def key(row: Row) -> Tuple[str, datetime]:
+        return row[0], datetime.strptime(row[1], DATE_FORMAT)
+
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(MAP_HEADER)
+        for row in sorted(row_map, key=key):
+            lookup = row_map[row]
+            writer.writerow([row[0], row[1], lookup[1], status(lookup)])
+    os.replace(tmp, path)
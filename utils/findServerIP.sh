@@ -6,6 +6,7 @@ DURATION=3600              # total duration in seconds (1 hour)
 ITERATIONS=$((DURATION / INTERVAL))
 NEW_IP_TIMEOUT=120         # seconds
 MASTER_FILE=$2  # Shared list of new IPs
+POST_SCRIPT=$3  # Optional: python script run on the capture dir once logging is done
 LOG_DIR=$(dirname "$MASTER_FILE")/logs
 
 # Clear or create master file at the beginning
@@ -97,4 +98,13 @@ done < "$SERVER_FILE"
 
 # Wait for all background jobs to finish
 wait
+# capture_attribution.logs_complete() looks for this line before trusting the logs
 echo "All DNS tracking completed."
+
+# Rebuild the capture-time attribution table with the logged IPs
+if [ -n "$POST_SCRIPT" ]; then
+    python3 "$POST_SCRIPT" "$(dirname "$MASTER_FILE")"
+fi
+
+# Refresh the capture manifest now that the logs are complete
+python3 "$(dirname "$0")/../collection_codes/manifest.py" "$(dirname "$MASTER_FILE")"
@@ -0,0 +1,92 @@
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from censys_cache import SnapshotCache
+from censys_client import FetchResult
+
+DAY = 86400
+# 2025-11-01T23:59:59Z
+AT_TIME = 1762041599.0
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = AT_TIME + 60
+
+    def __call__(self):
+        return self.now
+
+
+class SnapshotCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.root = Path(self.tmp.name)
+        self.clock = FakeClock()
+
+    def cache(self, **kwargs):
+        return SnapshotCache(self.root, clock=self.clock, **kwargs)
+
+    def test_round_trip(self):
+        cache = self.cache()
+        body = {"result": {"resource": {"ip": "10.0.0.1", "services": []}}}
+        cache.put(("10.0.0.1", "2025-11-01T23:59:59Z"), FetchResult(200, body))
+        cache.put(("10.0.0.2", "2025-11-01T23:59:59Z"), FetchResult(404))
+        cache.put(("10.0.0.3", "2025-11-01T23:59:59Z"), FetchResult(429))
+        # another run, and another lookup time of the same day
+        other = self.cache()
+        hit = other.get(("10.0.0.1", "2025-11-01T12:00:00Z"))
+        self.assertEqual((hit.status, hit.body, hit.cached), (200, body, True))
+        self.assertEqual(other.get(("10.0.0.2", "2025-11-01T23:59:59Z")).status, 404)
+        self.assertIsNone(other.get(("10.0.0.3", "2025-11-01T23:59:59Z")))
+        self.assertIsNone(other.get(("10.0.0.1", "2025-11-02T23:59:59Z")))
+        self.assertEqual((other.hits, other.misses), (2, 2))
+
+    def test_buckets(self):
+        cache = self.cache(bucket_days=7)
+        cache.put(("10.0.0.1", "2025-11-01T23:59:59Z"), FetchResult(404))
+        self.assertEqual(cache.entry_path(("10.0.0.1", "2025-11-01T23:59:59Z")),
+                         cache.entry_path(("10.0.0.1", "2025-10-31T23:59:59Z")))
+        self.assertIsNone(cache.entry_path(("../x", "2025-11-01T23:59:59Z")))
+        self.assertIsNone(cache.entry_path(("10.0.0.1", "11/01/2025")))
+
+    def test_freshness(self):
+        cache = self.cache(max_age_days=1)
+        lookup = ("10.0.0.1", "2025-11-01T23:59:59Z")
+        cache.put(lookup, FetchResult(404))
+        self.clock.now += 2 * DAY
+        self.assertIsNone(cache.get(lookup))
+        # fetched before the end of the day it answers
+        self.clock.now = AT_TIME - 3600
+        cache.put(lookup, FetchResult(404))
+        self.assertIsNone(cache.get(lookup))
+
+    def test_unreadable_entry_is_dropped(self):
+        cache = self.cache()
+        lookup = ("10.0.0.1", "2025-11-01T23:59:59Z")
+        path = cache.entry_path(lookup)
+        path.parent.mkdir(parents=True)
+        path.write_bytes(b"not gzip")
+        self.assertIsNone(cache.get(lookup))
+        self.assertFalse(path.exists())
+
+    def test_evict_least_recently_used(self):
+        cache = self.cache()
+        lookups = [(f"10.0.0.{i}", "2025-11-01T23:59:59Z") for i in range(3)]
+        for i, lookup in enumerate(lookups):
+            cache.put(lookup, FetchResult(200, {"pad": "x" * 100}))
+            os.utime(cache.entry_path(lookup), (1000 + i, 1000 + i))
+        os.utime(cache.entry_path(lookups[0]), (2000, 2000))
+        cache.max_bytes = sum(cache.entry_path(lookup).stat().st_size for lookup in lookups[:2])
+        self.assertEqual(cache.evict()[0], 1)
+        self.assertEqual([cache.entry_path(lookup).exists() for lookup in lookups], [True, False, True])
+        self.assertFalse((self.root / "10.0.0.1").exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
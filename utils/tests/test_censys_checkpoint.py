@@ -0,0 +1,70 @@
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from censys_checkpoint import NOT_FOUND, SAVED, Checkpoint, split_done
+
+A = ("10.0.0.1", "2025-11-01T23:59:59Z")
+B = ("10.0.0.2", "2025-11-01T23:59:59Z")
+C = ("10.0.0.3", "2025-11-01T23:59:59Z")
+
+
+class CheckpointTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = Path(self.tmp.name) / "app.done"
+        self.output = Path(self.tmp.name) / "app.json"
+
+    def reload(self):
+        checkpoint = Checkpoint(self.path)
+        checkpoint.load()
+        return checkpoint
+
+    def test_resume_skips_finished_lookups(self):
+        with Checkpoint(self.path) as checkpoint:
+            checkpoint.record(SAVED, A, 100)
+            checkpoint.record(NOT_FOUND, B, 100)
+        with self.path.open("a", encoding="utf-8") as f:
+            f.write("S\t10.0.0.3\t2025-11-01T23:5")  # torn last line
+        checkpoint = self.reload()
+        self.assertEqual((checkpoint.saved, checkpoint.not_found, checkpoint.end), (1, 1, 100))
+        self.assertEqual(split_done([A, B, C], checkpoint), ([C], 2))
+
+    def test_output_is_truncated_to_the_last_end(self):
+        self.output.write_bytes(b"x" * 150)
+        with Checkpoint(self.path) as checkpoint:
+            checkpoint.record(SAVED, A, 100)
+        checkpoint = self.reload()
+        self.assertEqual(checkpoint.truncate_output(self.output), 50)
+        self.assertEqual(self.output.stat().st_size, 100)
+        self.assertEqual(checkpoint.truncate_output(self.output), 0)
+
+    def test_last_record_wins(self):
+        with Checkpoint(self.path) as checkpoint:
+            checkpoint.record(NOT_FOUND, A, 0)
+            checkpoint.record(SAVED, A, 100)
+            self.assertEqual((checkpoint.status(A), checkpoint.saved, checkpoint.not_found), (SAVED, 1, 0))
+        checkpoint = self.reload()
+        self.assertEqual((checkpoint.status(A), checkpoint.saved, checkpoint.not_found), (SAVED, 1, 0))
+
+    def test_rewind_a_partly_recorded_block(self):
+        with Checkpoint(self.path) as checkpoint:
+            checkpoint.record_all(SAVED, [A], 100)
+            checkpoint.record_all(SAVED, [B, C], 250)
+        # the crash left only the first line of the second block
+        lines = self.path.read_text(encoding="utf-8").splitlines(keepends=True)
+        self.path.write_text("".join(lines[:2]), encoding="utf-8")
+        checkpoint = self.reload()
+        self.assertEqual((checkpoint.end, checkpoint.last_saved), (250, 1))
+        checkpoint.rewind(100)
+        self.assertEqual((checkpoint.end, checkpoint.saved, B in checkpoint), (100, 1, False))
+        checkpoint = self.reload()
+        self.assertEqual((checkpoint.end, list(checkpoint.done)), (100, [A]))
+
+
+if __name__ == "__main__":
+    unittest.main()
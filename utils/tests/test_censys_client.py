@@ -0,0 +1,160 @@
+import sys
+import threading
+import time
+import unittest
+from email.utils import formatdate
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from censys_client import (DEFAULT_RETRY_AFTER, FetchResult, RateController, fetch_all, parse_reset,
+                           parse_retry_after)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class RateControllerTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.controller = RateController(rate=2.0, max_rate=4.0, min_rate=0.5, increase=1.0, decrease=0.5,
+                                         clock=self.clock)
+
+    def test_reserve_paces_starts(self):
+        self.assertEqual([self.controller.reserve() for _ in range(3)], [0.0, 0.5, 1.0])
+        self.clock.now += 2.0
+        self.assertEqual(self.controller.reserve(), 0.0)
+
+    def test_additive_increase_up_to_max_rate(self):
+        self.controller.observe(FetchResult(200))
+        self.assertAlmostEqual(self.controller.rate, 2.5)
+        self.controller.observe(FetchResult(404))
+        self.assertAlmostEqual(self.controller.rate, 2.9)
+        for _ in range(20):
+            self.controller.observe(FetchResult(200))
+        self.assertEqual(self.controller.rate, 4.0)
+        # server and transport errors leave the rate alone
+        self.controller.rate = 2.0
+        self.controller.observe(FetchResult(503))
+        self.controller.observe(FetchResult(0, error="reset"))
+        self.assertEqual(self.controller.rate, 2.0)
+
+    def test_throttle_halves_the_rate_and_pauses(self):
+        self.controller.observe(FetchResult(429, headers={"Retry-After": "30"}))
+        self.assertEqual((self.controller.rate, self.controller.throttles), (1.0, 1))
+        self.assertEqual(self.controller.reserve(), 30.0)
+        self.controller.observe(FetchResult(429))
+        self.controller.observe(FetchResult(429))
+        self.assertEqual(self.controller.rate, 0.5)
+        # a shorter pause never cuts a longer one
+        self.assertEqual(self.controller.paused_until, self.clock.now + 30.0)
+        self.controller.paused_until = 0.0
+        self.controller.observe(FetchResult(429))
+        self.assertEqual(self.controller.paused_until, self.clock.now + DEFAULT_RETRY_AFTER)
+
+    def test_exhausted_window_pauses(self):
+        self.controller.observe(FetchResult(200, headers={"x-ratelimit-remaining": "0", "x-ratelimit-reset": "12"}))
+        self.assertEqual(self.controller.paused_until, self.clock.now + 12.0)
+        self.controller.observe(FetchResult(200, headers={"RateLimit-Remaining": "3", "RateLimit-Reset": "99"}))
+        self.assertEqual(self.controller.paused_until, self.clock.now + 12.0)
+
+
+class HeaderParsingTest(unittest.TestCase):
+    def test_retry_after(self):
+        self.assertEqual(parse_retry_after("17"), 17.0)
+        self.assertEqual(parse_retry_after(" 2.5 "), 2.5)
+        self.assertEqual(parse_retry_after("-3"), 0.0)
+        self.assertIsNone(parse_retry_after(""))
+        self.assertIsNone(parse_retry_after("soon"))
+        now = 1_700_000_000.0
+        self.assertEqual(parse_retry_after(formatdate(now + 90, usegmt=True), now), 90.0)
+        self.assertEqual(parse_retry_after(formatdate(now - 90, usegmt=True), now), 0.0)
+
+    def test_reset(self):
+        now = 1_700_000_000.0
+        self.assertEqual(parse_reset("60", now), 60.0)
+        self.assertEqual(parse_reset(str(now + 45), now), 45.0)
+        self.assertIsNone(parse_reset("later", now))
+
+
+class FetchAllTest(unittest.TestCase):
+    def test_throttled_lookups_are_retried(self):
+        calls = []
+
+        def fetch(ip, at_time):
+            calls.append(ip)
+            if ip == "10.0.0.2" and calls.count(ip) < 3:
+                return FetchResult(429, headers={"Retry-After": "0"})
+            return FetchResult(200, {"ip": ip})
+
+        results = {}
+        controller = RateController(rate=1000.0)
+        fetch_all([("10.0.0.1", "t"), ("10.0.0.2", "t")], fetch, controller, 2,
+                  lambda lookup, result: results.setdefault(lookup, result.status))
+        self.assertEqual(results, {("10.0.0.1", "t"): 200, ("10.0.0.2", "t"): 200})
+        self.assertEqual(calls.count("10.0.0.2"), 3)
+        self.assertEqual(controller.throttles, 2)
+
+    def test_throttle_retries_run_out(self):
+        results = {}
+        fetch_all([("10.0.0.1", "t")], lambda ip, at_time: FetchResult(429, headers={"Retry-After": "0"}),
+                  RateController(rate=1000.0), 1, lambda lookup, result: results.setdefault(lookup, result.status),
+                  throttle_retries=1)
+        self.assertEqual(results, {("10.0.0.1", "t"): 429})
+
+    def test_hosts_missing_from_a_batch_are_fetched_alone(self):
+        batches, singles, results = [], [], {}
+
+        def fetch_batch(ips, at_time):
+            batches.append(list(ips))
+            # the response was cut short: only the first host came back
+            return FetchResult(200), {ips[0]: FetchResult(200, {"ip": ips[0]})}
+
+        def fetch(ip, at_time):
+            singles.append(ip)
+            return FetchResult(404 if ip == "10.0.0.3" else 200)
+
+        lookups = [("10.0.0.1", "t"), ("10.0.0.2", "t"), ("10.0.0.3", "t"), ("10.0.0.4", "u")]
+        fetch_all(lookups, fetch, RateController(rate=1000.0), 2,
+                  lambda lookup, result: results.setdefault(lookup, result.status),
+                  fetch_batch=fetch_batch, batch_size=3)
+        self.assertEqual(batches, [["10.0.0.1", "10.0.0.2", "10.0.0.3"], ["10.0.0.4"]])
+        self.assertEqual(sorted(singles), ["10.0.0.2", "10.0.0.3"])
+        self.assertEqual(results, {("10.0.0.1", "t"): 200, ("10.0.0.2", "t"): 200, ("10.0.0.3", "t"): 404,
+                                   ("10.0.0.4", "u"): 200})
+
+    def test_refetches_use_every_worker(self):
+        lock = threading.Lock()
+        in_flight = [0, 0]  # (now, most)
+
+        def fetch(ip, at_time):
+            with lock:
+                in_flight[0] += 1
+                in_flight[1] = max(in_flight[1], in_flight[0])
+            time.sleep(0.05)
+            with lock:
+                in_flight[0] -= 1
+            return FetchResult(200)
+
+        lookups = [(f"10.0.0.{i}", "t") for i in range(4)]
+        # one batch request, whose hosts all come back missing while the other workers are idle
+        fetch_all(lookups, fetch, RateController(rate=1000.0), 4,
+                  fetch_batch=lambda ips, at_time: (FetchResult(200), {}), batch_size=4)
+        self.assertEqual(in_flight[1], 4)
+
+    def test_callback_error_stops_the_run(self):
+        def on_result(lookup, result):
+            raise RuntimeError("disk full")
+
+        with self.assertRaises(RuntimeError):
+            fetch_all([(f"10.0.0.{i}", "t") for i in range(3)], lambda ip, at_time: FetchResult(200),
+                      RateController(rate=1000.0), 2, on_result)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import io
+import sys
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from censys_plan import NEW, PROTOCOLS, STALE, PlanState, plan_changes, read_declared_protocols, select_lookups
+
+DAY = 86400.0
+NOW = 1_762_000_000.0
+
+
+class PlanTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.dir = Path(self.tmp.name)
+
+    def test_declared_protocols(self):
+        path = self.dir / "protocols.csv"
+        path.write_text("date,ip,protocols\n11/01/2025,10.0.0.1,wireguard\n"
+                        "11/02/2025,10.0.0.1,\"openvpn, wireguard\"\n11/02/2025,,openvpn\n", encoding="utf-8")
+        self.assertEqual(read_declared_protocols(path), {"10.0.0.1": "openvpn,wireguard"})
+
+    def test_state_round_trip_and_reasons(self):
+        state = PlanState(self.dir / "app.state.json", "app")
+        state.update(["10.0.0.1", "10.0.0.2", "10.0.0.3"], {"10.0.0.1": "openvpn", "10.0.0.2": "openvpn"},
+                     {"10.0.0.1": NOW - DAY, "10.0.0.2": NOW - 40 * DAY})
+        state.save()
+        state = PlanState(self.dir / "app.state.json", "app").load()
+        reasons = plan_changes(["10.0.0.1", "10.0.0.2", "10.0.0.3", "10.0.0.4"], state,
+                               {"10.0.0.1": "openvpn", "10.0.0.2": "openvpn,wireguard"}, 30 * DAY, NOW)
+        self.assertEqual(reasons, {"10.0.0.2": PROTOCOLS, "10.0.0.3": STALE, "10.0.0.4": NEW})
+        self.assertEqual(plan_changes(["10.0.0.2"], state, None, 30 * DAY, NOW), {"10.0.0.2": STALE})
+
+    def test_unreadable_state_plans_from_scratch(self):
+        path = self.dir / "app.state.json"
+        path.write_text("{", encoding="utf-8")
+        with redirect_stdout(io.StringIO()):
+            self.assertEqual(PlanState(path, "app").load().ips, {})
+
+    def test_select_lookups(self):
+        lookups = [("10.0.0.1", "2025-11-01"), ("10.0.0.1", "2025-11-02"), ("10.0.0.2", "2025-11-01"),
+                   ("10.0.0.2", "2025-11-02"), ("10.0.0.3", "2025-11-01")]
+        finished = {("10.0.0.1", "2025-11-01"), ("10.0.0.1", "2025-11-02"), ("10.0.0.2", "2025-11-01")}
+        todo, refresh = select_lookups(lookups, {"10.0.0.1": STALE, "10.0.0.2": PROTOCOLS}, finished)
+        # 10.0.0.2 still has an unfinished lookup, so nothing of it is fetched again
+        self.assertEqual(todo, [("10.0.0.2", "2025-11-02")])
+        self.assertEqual(refresh, [("10.0.0.1", "2025-11-02")])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from censys_client import FetchResult
+from censys_retry import RETRY_BASE, RETRY_MAX, RetryQueue, backoff, is_retryable
+
+A = ("10.0.0.1", "2025-11-01T23:59:59Z")
+B = ("10.0.0.2", "2025-11-01T23:59:59Z")
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class RetryQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = Path(self.tmp.name) / "app.retry.jsonl"
+        self.clock = FakeClock()
+
+    def queue(self, max_attempts=3):
+        queue = RetryQueue(self.path, max_attempts, self.clock)
+        self.addCleanup(queue.close)
+        return queue
+
+    def test_retryable(self):
+        for status in (0, 408, 429, 500, 503):
+            self.assertTrue(is_retryable(FetchResult(status)))
+        for status in (200, 400, 401, 404):
+            self.assertFalse(is_retryable(FetchResult(status)))
+
+    def test_backoff(self):
+        self.assertEqual([backoff(n) for n in (1, 2, 3)], [RETRY_BASE, 2 * RETRY_BASE, 4 * RETRY_BASE])
+        self.assertEqual(backoff(30), RETRY_MAX)
+        self.assertEqual(backoff(1, 120.0), 120.0)
+
+    def test_due_after_backoff(self):
+        queue = self.queue()
+        self.assertTrue(queue.push(A, FetchResult(503)))
+        self.assertTrue(queue.push(B, FetchResult(429, headers={"Retry-After": "60"})))
+        self.assertEqual(queue.due(), [])
+        self.assertEqual(queue.seconds_until_next(), RETRY_BASE)
+        self.clock.now += RETRY_BASE
+        self.assertEqual(queue.due(), [A])
+        self.assertEqual(queue.due({B}), [])
+        self.clock.now += 60
+        self.assertEqual(queue.due(), [A, B])
+        queue.resolve(A)
+        self.assertEqual(queue.pending(), [B])
+
+    def test_give_up_after_max_attempts(self):
+        queue = self.queue()
+        self.assertEqual([queue.push(A, FetchResult(500)) for _ in range(3)], [True, True, False])
+        self.assertEqual(queue.pending(), [])
+        self.assertIsNone(queue.seconds_until_next())
+        self.assertEqual([(r["ip"], r["attempts"]) for r in queue.given_up()], [(A[0], 3)])
+        # a later failure starts a fresh count
+        self.assertTrue(queue.push(A, FetchResult(500)))
+        self.assertEqual(queue.items[A]["attempts"], 1)
+
+    def test_journal_survives_a_restart(self):
+        queue = self.queue()
+        queue.push(A, FetchResult(500))
+        queue.push(B, FetchResult(500))
+        queue.push(B, FetchResult(500))
+        queue.resolve(A)
+        queue.close()
+        with self.path.open("a", encoding="utf-8") as f:
+            f.write('{"ip": "10.0.0.3", "at_ti')  # torn last line
+        reloaded = self.queue()
+        self.assertEqual(list(reloaded.items), [B])
+        self.assertEqual(reloaded.items[B]["attempts"], 2)
+        reloaded.compact()
+        self.assertEqual(len(self.path.read_text(encoding="utf-8").splitlines()), 1)
+        reloaded.resolve(B)
+        reloaded.compact()
+        self.assertFalse(self.path.exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
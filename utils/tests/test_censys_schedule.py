@@ -0,0 +1,65 @@
+import csv
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from censys_schedule import COVERAGE, MISSING, NEW_IP, REFRESH, Budget, UsageLedger, prioritize, write_deferred
+
+SAVED = "S"
+
+
+class PrioritizeTest(unittest.TestCase):
+    def test_tiers_and_coverage_order(self):
+        all_lookups = [("a", "d1"), ("a", "d2"), ("b", "d1"), ("b", "d2"), ("c", "d1"), ("d", "d2")]
+        status = {("a", "d1"): SAVED, ("b", "d1"): "N", ("d", "d2"): SAVED}
+        todo = [("a", "d2"), ("b", "d2"), ("c", "d1"), ("d", "d2")]
+        ranked = prioritize(todo, all_lookups, {("d", "d2")}, {"a", "b", "d"}, status, SAVED)
+        self.assertEqual(ranked, [(NEW_IP, ("c", "d1")), (MISSING, ("b", "d2")), (COVERAGE, ("a", "d2")),
+                                  (REFRESH, ("d", "d2"))])
+
+    def test_least_covered_date_first(self):
+        all_lookups = [("a", "d1"), ("b", "d1"), ("a", "d2"), ("b", "d2")]
+        status = {("a", "d1"): SAVED, ("b", "d1"): SAVED, ("a", "d2"): SAVED}
+        # d1 is fully covered, d2 half
+        ranked = prioritize([("a", "d1"), ("b", "d2")], all_lookups, set(), {"a", "b"}, status, SAVED)
+        self.assertEqual([key for _, key in ranked], [("b", "d2"), ("a", "d1")])
+
+
+class BudgetTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.dir = Path(self.tmp.name)
+        self.now = 1_762_000_000.0
+        self.ledger = UsageLedger(self.dir / "usage.json", clock=lambda: self.now)
+
+    def test_run_budget(self):
+        budget = Budget(3)
+        self.assertEqual(budget.take([("a", "t"), ("b", "t")]), ([("a", "t"), ("b", "t")], []))
+        self.assertEqual(budget.take([("c", "t"), ("d", "t")]), ([("c", "t")], [("d", "t")]))
+        self.assertTrue(budget.exhausted)
+        self.assertFalse(Budget().exhausted)
+
+    def test_daily_budget_is_shared_by_runs(self):
+        Budget(daily=5, ledger=self.ledger).take([("a", "t")] * 4)
+        second = Budget(10, daily=5, ledger=self.ledger)
+        self.assertEqual(second.remaining, 1)
+        self.assertEqual(len(second.take([("b", "t")] * 3)[0]), 1)
+        self.assertEqual(self.ledger.used(), 5)
+        self.now += 86400
+        self.assertEqual(Budget(daily=5, ledger=self.ledger).remaining, 5)
+
+    def test_deferred_file(self):
+        path = str(self.dir / "app.deferred.csv")
+        write_deferred(path, [(NEW_IP, ("a", "t"))])
+        with open(path, newline="", encoding="utf-8") as f:
+            self.assertEqual(list(csv.reader(f)), [["ip", "at_time", "tier"], ["a", "t", "new"]])
+        write_deferred(path, [])
+        self.assertFalse(Path(path).exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+import json
+import sys
+import unittest
+import urllib.request
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from censys_client import CensysClient
+from censys_standin import StandIn, base_url, serve, synthetic_record
+
+AT_TIME = "2025-11-01T23:59:59Z"
+
+
+class StandInTest(unittest.TestCase):
+    def start(self, standin):
+        server = serve(standin)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        client = CensysClient("token", "org", base_url(server))
+        self.addCleanup(client.close)
+        return server, client
+
+    def test_synthetic_records_are_stable(self):
+        self.assertEqual(synthetic_record("10.0.0.1"), synthetic_record("10.0.0.1"))
+        _, client = self.start(StandIn())
+        result = client.fetch("10.0.0.1", AT_TIME)
+        self.assertEqual((result.status, result.body), (200, synthetic_record("10.0.0.1")))
+
+    def test_fixtures_and_batches(self):
+        fixtures = {ip: synthetic_record(ip) for ip in ("10.0.0.1", "10.0.0.2")}
+        server, client = self.start(StandIn(fixtures))
+        self.assertEqual(client.fetch("10.0.0.9", AT_TIME).status, 404)
+        request, results = client.fetch_batch(["10.0.0.1", "10.0.0.9", "10.0.0.2"], AT_TIME)
+        self.assertEqual(request.status, 200)
+        self.assertEqual(sorted(results), ["10.0.0.1", "10.0.0.2"])
+        self.assertEqual(results["10.0.0.2"].body, fixtures["10.0.0.2"])
+        host, port = server.server_address[:2]
+        with urllib.request.urlopen(f"http://{host}:{port}/stats") as resp:
+            self.assertEqual(json.load(resp), {"404": 1, "200": 1})
+
+    def test_injected_throttle(self):
+        _, client = self.start(StandIn(throttle=1.0, retry_after=7))
+        result = client.fetch("10.0.0.1", AT_TIME)
+        self.assertEqual((result.status, result.headers.get("Retry-After")), (429, "7"))
+        request, results = client.fetch_batch(["10.0.0.1", "10.0.0.2"], AT_TIME)
+        self.assertTrue(request.throttled)
+        self.assertEqual({ip: r.status for ip, r in results.items()}, {"10.0.0.1": 429, "10.0.0.2": 429})
+
+
+if __name__ == "__main__":
+    unittest.main()
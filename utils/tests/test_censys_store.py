@@ -0,0 +1,95 @@
+import json
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from censys_store import (RecordStore, StoreReader, ensure_index, index_path, iter_records, load_services,
+                          read_index, records_within)
+
+
+def record(ip, port, extra="x"):
+    return {"result": {"resource": {"ip": ip, "services": [{"port": port, "protocol": "OPENVPN", "banner": extra}]}}}
+
+
+class RecordStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.base = Path(self.tmp.name)
+
+    def write(self, path, fmt, records, block_records=3):
+        store = RecordStore(path, fmt, block_records).open()
+        flushed = []
+        for i, rec in enumerate(records):
+            flushed += store.write(rec["result"]["resource"]["ip"], rec, i)
+        flushed += store.close()
+        return flushed
+
+    def test_round_trip_in_blocks(self):
+        records = [record(f"10.0.0.{i % 4}", 1000 + i) for i in range(8)]
+        for fmt, name in (("gzip", "out.json.gz"), ("ndjson", "out.json")):
+            with self.subTest(fmt=fmt):
+                path = self.base / name
+                self.assertEqual(self.write(path, fmt, records), list(range(8)))
+                entries = read_index(path)
+                self.assertEqual(len(entries), 8)
+                blocks = {e.block_offset for e in entries}
+                self.assertEqual(len(blocks), 3 if fmt == "gzip" else 8)
+                self.assertEqual(list(iter_records(path)), records)
+                with StoreReader(path) as reader:
+                    self.assertEqual(reader.get("10.0.0.1"), [records[1], records[5]])
+                    self.assertEqual(dict(reader.iter_latest({"10.0.0.2", "10.0.0.3"})),
+                                     {"10.0.0.2": records[6], "10.0.0.3": records[7]})
+
+    def test_write_returns_tags_once_the_block_is_on_disk(self):
+        store = RecordStore(self.base / "out.json.gz", "gzip", 2).open()
+        self.assertEqual(store.write("10.0.0.1", record("10.0.0.1", 1), "a"), [])
+        self.assertEqual(store.buffered, 1)
+        self.assertEqual(store.size, 0)
+        self.assertEqual(store.write("10.0.0.2", record("10.0.0.2", 2), "b"), ["a", "b"])
+        self.assertGreater(store.size, 0)
+        self.assertEqual(store.close(), [])
+
+    def test_resume_inside_a_block(self):
+        path = self.base / "out.json.gz"
+        records = [record(f"10.0.0.{i}", i) for i in range(5)]
+        self.write(path, "gzip", records)
+        store = RecordStore(path, "gzip", 3).open(keep=4)
+        # the second block's first record is carried into the next one
+        self.assertEqual((store.records, store.buffered), (3, 1))
+        store.write("10.0.0.9", record("10.0.0.9", 9))
+        store.close()
+        self.assertEqual(list(iter_records(path)), records[:4] + [record("10.0.0.9", 9)])
+        self.assertEqual([e.ip for e in read_index(path)], ["10.0.0.0", "10.0.0.1", "10.0.0.2", "10.0.0.3", "10.0.0.9"])
+        self.assertEqual(records_within(path, read_index(path)[2].block_end), 3)
+
+    def test_legacy_index_lines(self):
+        path = self.base / "out.json"
+        lines = [json.dumps(record(f"10.0.0.{i}", i)) + "\n" for i in range(3)]
+        path.write_text("".join(lines), encoding="utf-8")
+        ensure_index(path)
+        self.assertEqual(len(read_index(path)), 3)
+        # one-frame-per-record index lines: ip, offset, length
+        offset = 0
+        with index_path(path).open("w", encoding="utf-8") as f:
+            for i, line in enumerate(lines):
+                f.write(f"10.0.0.{i}\t{offset}\t{len(line)}\n")
+                offset += len(line)
+        with StoreReader(path) as reader:
+            self.assertEqual(reader.get("10.0.0.2"), [record("10.0.0.2", 2)])
+
+    def test_load_services_prefers_the_projected_file(self):
+        base = str(self.base / "app")
+        self.write(Path(base + ".json.gz"), "gzip", [record("10.0.0.1", 1, "raw")])
+        self.assertEqual(load_services(base)["10.0.0.1"]["services"], [{"port": 1, "protocol": "OPENVPN"}])
+        projected = {"result": {"resource": {"ip": "10.0.0.1", "services": [{"port": 2}]}}}
+        self.write(Path(base + ".services.json.gz"), "gzip", [projected])
+        self.assertEqual(load_services(base, {"10.0.0.1"}), {"10.0.0.1": {"ip": "10.0.0.1", "services": [{"port": 2}]}})
+        self.assertEqual(load_services(base, {"10.0.0.7"}), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import csv
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from censys_window import MAP_HEADER, window_lookups, write_row_map
+
+
+def at(date_str):
+    """format_date_rfc3339 of censys3.py: None for an invalid date."""
+    parts = date_str.split("/")
+    if len(parts) != 3:
+        return None
+    month, day, year = parts
+    return f"{year}-{month}-{day}T23:59:59Z"
+
+
+ROWS = [("10.0.0.1", d) for d in ("11/01/2025", "11/02/2025", "11/03/2025", "11/05/2025")] + \
+       [("10.0.0.2", "11/02/2025"), ("10.0.0.2", "bad")]
+
+
+class WindowLookupsTest(unittest.TestCase):
+    def test_one_day_keeps_every_date(self):
+        row_map = window_lookups(ROWS, 1, at)
+        self.assertEqual(len(row_map), 5)
+        self.assertEqual(row_map[("10.0.0.1", "11/02/2025")], ("10.0.0.1", at("11/02/2025")))
+
+    def test_windows_start_at_the_earliest_date(self):
+        row_map = window_lookups(ROWS, 3, at)
+        self.assertEqual({row_map[("10.0.0.1", d)][1] for d in ("11/01/2025", "11/02/2025", "11/03/2025")},
+                         {at("11/03/2025")})
+        self.assertEqual(row_map[("10.0.0.1", "11/05/2025")], ("10.0.0.1", at("11/05/2025")))
+        self.assertEqual(len(set(row_map.values())), 3)
+        self.assertNotIn(("10.0.0.2", "bad"), row_map)
+        with self.assertRaises(ValueError):
+            window_lookups(ROWS, 0, at)
+
+    def test_row_map_file(self):
+        row_map = window_lookups(ROWS, 3, at)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = str(Path(tmp) / "app.snapshots.csv")
+            write_row_map(path, row_map, lambda lookup: "saved" if lookup[0] == "10.0.0.1" else "")
+            with open(path, newline="", encoding="utf-8") as f:
+                rows = list(csv.reader(f))
+        self.assertEqual(rows[0], MAP_HEADER)
+        self.assertEqual(rows[1], ["10.0.0.1", "11/01/2025", at("11/03/2025"), "saved"])
+        self.assertEqual(rows[-1], ["10.0.0.2", "11/02/2025", at("11/02/2025"), ""])
+
+
+if __name__ == "__main__":
+    unittest.main()